@@ -124,27 +124,23 @@ if __name__ == "__main__":
         collected_nk_files = collected_dmp[1]
         collected_psd_files = collected_dmp[2]
 
-        try:
-            for exr in collected_exr_files:
-                publish_name = os.path.basename(exr)
-                sg_pub.validate(publish_name)
-                sg_pub.publish(exr, publish_version, "dmp", args.description)
-        except Exception as e:
-            print(traceback.format_exc())
-
-        try:
-            for nk in collected_nk_files:
-                publish_name = os.path.basename(nk)
-                sg_pub.validate(publish_name)
-                sg_pub.publish(nk, publish_version, "dmp", args.description)
-        except Exception as e:
-            print(traceback.format_exc())
+        # Publish every EXR, NK and PSD in a few batched Shotgun requests
+        collected_files = [path for path in collected_exr_files + collected_nk_files + collected_psd_files if path]
 
         try:
-            for psd_file in collected_psd_files:
-                publish_name = os.path.basename(psd_file)
-                sg_pub.validate(publish_name)
-                sg_pub.publish(psd_file, publish_version, "dmp", args.description)
+            batcher = sg_pub.batch()
+            conflicts = batcher.validate([os.path.basename(path) for path in collected_files])
+
+            for path in collected_files:
+                if os.path.basename(path) in conflicts:
+                    continue
+                batcher.add(path, publish_version, "dmp", args.description)
+
+            for item in batcher.submit():
+                if item["error"]:
+                    print("\nFailed to publish {}: {}".format(item["source_path"], item["error"]))
+                else:
+                    print("\nPublished {}".format(item["published_file"]["code"]))
         except Exception as e:
             print(traceback.format_exc())
 
@@ -9,7 +9,8 @@ requires = [
 	"logger>=0.1.1",
 	"rezbuild>=0.1.1",
 	"preferences>=0.1.0",
-	"pymongo>=4.4.1",
+	"pymongo>=4.13",
+	"jsonschema>=3.2",
 	"schema>=0.0.1"
 ]
 
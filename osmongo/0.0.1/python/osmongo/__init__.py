@@ -1 +1,17 @@
-from .osmongo import MongoAPI
\ No newline at end of file
+from .osmongo import MongoAPI
+from ._pool import MongoClientRegistry
+from ._validation import SchemaValidationError, validate_documents
+from ._cache import QueryCache
+from ._writebehind import WriteBehindQueue
+from ._loader import DocumentLoader
+from ._metrics import CommandMetrics
+from ._health import HealthChecker, ServerUnavailableError
+from ._atomic import VersionConflictError
+from ._blobs import BlobStore
+
+def __getattr__(name):
+    # AsyncMongoAPI is imported on first use, most tools never need asyncio
+    if name == "AsyncMongoAPI":
+        from ._aio import AsyncMongoAPI
+        return AsyncMongoAPI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,267 @@
+# import built-ins
+import asyncio
+
+# import pymongo
+from pymongo import AsyncMongoClient
+
+# import osvfx
+from schema import validate as validate_schema
+
+# import osmongo
+from .osmongo import OSMongo, MongoAPI, METRICS, POOL_SETTINGS, MONGO_URI, TIMEOUT, DATABASE
+from .osmongo import _check_document, _check_documents, _check_query, _check_sort, _inserted, _written
+from ._pool import MongoClientRegistry
+from ._cache import QueryCache
+from ._validation import validate_documents, PARALLEL_THRESHOLD
+from ._capture import captured
+
+
+class AsyncMongoAPI:
+    """
+    asyncio version of MongoAPI built on pymongo's native AsyncMongoClient.
+
+    Methods mirror MongoAPI and return awaitables, find returns an async iterator.
+    Argument checks, validation, logging, query shape recording and command metrics are shared with MongoAPI,
+    operations are captured in the workload recorder started by MongoAPI.start_capture.
+    Unlike run_in_executor wrappers, concurrency isn't capped by a thread pool, only by the
+    connection pool ('max_pool_size' in the 'pool' section of mongo_preferences.yaml).
+
+    The client belongs to the event loop it is first used on and is created lazily.
+    Like MongoAPI, awaited calls fail fast with ServerUnavailableError while the server is known to be down,
+    using the HealthChecker shared by every MongoAPI of the same server, and find_one results can be
+    cached in a QueryCache, shared with MongoAPI instances if required, which writes made here invalidate.
+
+    Example:
+        >>> from osmongo import AsyncMongoAPI
+        >>> mongo = AsyncMongoAPI()
+        >>> collection = mongo.database["osvfx"]
+        >>> doc = await mongo.find_one(collection, {"code": "bbx"})
+        >>> async for doc in mongo.find(collection, {"show": "bbx"}):
+        >>>     print(doc)
+        >>> await mongo.disconnect()
+    """
+    def __init__(self, connection_uri=None, server_timeout=None, database_name=None, cache=None):
+        """
+        :param connection_uri: MongoDB Server URI, eg: mongodb://127.0.0.1:27017
+        :type connection_uri: str
+
+        :param server_timeout: Timeout value in ms
+        :type server_timeout: int
+
+        :param database_name: Name of the database
+        :type database_name: str
+
+        :param cache: Read-through cache for find_one, True creates a private QueryCache
+        :type cache: QueryCache or bool
+        """
+        self._client = None
+        self._database = None
+        self.health = None
+        self.cache = QueryCache() if cache is True else (cache or None)
+
+        self.connection_uri = (
+            connection_uri if connection_uri is not None else (MONGO_URI if MONGO_URI is not None else "mongodb://127.0.0.1:27017")
+        )
+
+        self.server_timeout = (
+            server_timeout if server_timeout is not None else (TIMEOUT if TIMEOUT is not None else 1000)
+        )
+
+        self.database_name = (
+            database_name if database_name is not None else (DATABASE if DATABASE is not None else "osvfx")
+        )
+
+    @property
+    def workload(self):
+        """
+        The WorkloadRecorder of MongoAPI, see MongoAPI.start_capture
+        """
+        return MongoAPI.workload
+
+    @property
+    def database(self):
+        """
+        The MongoDB database of this instance, the client is created on first access
+        """
+        if self._client is None:
+            options = {
+                "maxPoolSize": POOL_SETTINGS.get("max_pool_size"),
+                "minPoolSize": POOL_SETTINGS.get("min_pool_size"),
+                "waitQueueTimeoutMS": POOL_SETTINGS.get("wait_queue_timeout"),
+                "maxIdleTimeMS": POOL_SETTINGS.get("max_idle_time"),
+            }
+            options = {key: value for key, value in options.items() if value is not None}
+            self._client = AsyncMongoClient(
+                self.connection_uri,
+                serverSelectionTimeoutMS=self.server_timeout,
+                event_listeners=METRICS.listeners(),
+                **options
+            )
+            self._database = self._client[self.database_name]
+            self.health = MongoClientRegistry.shared_health(self.connection_uri, self.server_timeout)
+        return self._database
+
+    async def _ensure_available(self):
+        """
+        Fail fast with ServerUnavailableError while the server is known to be down,
+        the recheck ping runs in a thread so the event loop isn't blocked
+        """
+        if self.health is not None and self.health.available is False:
+            await asyncio.to_thread(self.health.raise_if_unavailable)
+
+    def _invalidate(self, collection):
+        """
+        Drop the cached find_one results of a collection after writing to it
+        """
+        if self.cache is not None:
+            self.cache.invalidate(collection)
+
+    async def disconnect(self):
+        """
+        Close any connection to the database
+        """
+        if self._client is not None:
+            await self._client.close()
+            OSMongo.warning("Disconnecting MongoDB...")
+
+        self._client = None
+        self._database = None
+        self.health = None
+
+    @captured
+    async def count(self, collection, query={}, exact=True):
+        """
+        Count the number of documents in the specified collection that match the 'query', see MongoAPI.count
+
+        :rtype: int
+        """
+        await self._ensure_available()
+        if not query and not exact:
+            return await collection.estimated_document_count()
+        query = query or {}
+        MongoAPI.query_shapes.record(collection, query)
+        return await collection.count_documents(query)
+
+    @captured
+    async def insert_one(self, collection, data):
+        """
+        Insert a single document into the specified collection.
+
+        :return: ID of the document inserted
+        :rtype: pymongo ObjectID
+        """
+        _check_document(data)
+        validate_schema(data)
+        await self._ensure_available()
+        result = await collection.insert_one(data)
+        self._invalidate(collection)
+        return _inserted(result.inserted_id)
+
+    @captured
+    async def insert_many(self, collection, data, ordered=True, schema=None, validate=True, workers=None):
+        """
+        Insert multiple documents into the specified collection, see MongoAPI.insert_many.
+        Batches larger than PARALLEL_THRESHOLD are validated in a thread so the event loop isn't blocked.
+
+        :return: IDs of the document inserted
+        :rtype: pymongo ObjectIDs
+        """
+        _check_documents(data)
+        if validate:
+            if len(data) >= PARALLEL_THRESHOLD:
+                await asyncio.to_thread(validate_documents, data, schema, workers)
+            else:
+                validate_documents(data, schema=schema, workers=workers)
+
+        await self._ensure_available()
+        try:
+            result = await collection.insert_many(data, ordered=ordered)
+        finally:
+            self._invalidate(collection)
+        return _inserted(result.inserted_ids)
+
+    @captured
+    def find(self, collection, query={}, projection=None, sort=None, limit=0, batch_size=0):
+        """
+        Find documents in the specified collection, see MongoAPI.find.
+        Unlike MongoAPI.find, no sort is applied unless 'sort' is given, and as the cursor is returned
+        without awaiting it doesn't fail fast, errors are raised while iterating.
+
+        :return: async iterator of documents
+        :rtype: pymongo.asynchronous.cursor.AsyncCursor
+        """
+        if projection is not None:
+            assert isinstance(projection, dict), "`projection` must be <dict>"
+
+        if sort is not None:
+            _check_sort(sort)
+
+        MongoAPI.query_shapes.record(collection, query, projection, sort)
+        return collection.find(filter=query, projection=projection, sort=sort, limit=limit, batch_size=batch_size)
+
+    @captured
+    async def find_one(self, collection, query, projection=None):
+        """
+        Find and retrieve a single document from the specified collection, see MongoAPI.find_one.
+
+        :return: Document as a Dictionary
+        :rtype: dict
+        """
+        _check_query(query, projection)
+        MongoAPI.query_shapes.record(collection, query, projection)
+
+        if self.cache is None:
+            await self._ensure_available()
+            return await collection.find_one(filter=query, projection=projection)
+
+        key = QueryCache.make_key(collection, query, projection)
+        hit, document = self.cache.get(key)
+        if hit:
+            return document
+
+        generation = self.cache.generation(key)
+        await self._ensure_available()
+        document = await collection.find_one(filter=query, projection=projection)
+        self.cache.set(key, document, generation)
+        return document
+
+    @captured
+    async def update_one(self, collection, query, data):
+        """
+        Update a single document in the specified collection that matches the 'query'.
+
+        :rtype: pymongo.results.UpdateResult object
+        """
+        _check_query(query)
+        _check_document(data)
+        await self._ensure_available()
+        updated_result = await collection.update_one(query, data)
+        self._invalidate(collection)
+        return _written(updated_result, f"Successfully updated {query} with {data}", "updating")
+
+    @captured
+    async def replace_one(self, collection, query, data):
+        """
+        Replace a single document in the collection that matches the specified query criteria.
+
+        :rtype: pymongo.results.UpdateResult object
+        """
+        _check_query(query)
+        _check_document(data)
+        await self._ensure_available()
+        updated_result = await collection.replace_one(query, data)
+        self._invalidate(collection)
+        return _written(updated_result, f"Successfully replaced {query} with {data}", "replacing")
+
+    @captured
+    async def delete_one(self, collection, query):
+        """
+        Delete a single document from the specified collection that matches the 'query'.
+
+        :rtype: pymongo.results.DeleteResult object
+        """
+        _check_query(query)
+        await self._ensure_available()
+        deleted_result = await collection.delete_one(query)
+        self._invalidate(collection)
+        return _written(deleted_result, f"Successfully deleted {query}", "deleting")
@@ -0,0 +1,60 @@
+# import built-ins
+import datetime
+
+# Module Constants
+VERSION_FIELD = "_version"
+QUEUED = "queued"
+CLAIMED = "claimed"
+
+
+class VersionConflictError(Exception):
+    """
+    Raised when a compare-and-swap update finds the document at another version than expected,
+    someone else updated it since it was read.
+
+    Attributes:
+        query (dict): query of the document
+        expected (int): version the caller read
+    """
+    def __init__(self, query, expected):
+        self.query = query
+        self.expected = expected
+        super().__init__(f"Document {query} is no longer at version {expected}, re-read it and retry")
+
+
+def versioned_update(data, field=VERSION_FIELD):
+    """
+    Add the version increment to an update document, eg: {"$set": {...}} -> {"$set": {...}, "$inc": {"_version": 1}}
+    """
+    data = dict(data)
+    data["$inc"] = dict(data.get("$inc", {}), **{field: 1})
+    return data
+
+
+def claim_query(query=None, lease_field="lease_expires"):
+    """
+    Query matching queued jobs and claimed jobs whose lease expired
+
+    :rtype: dict
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    claimable = {"$or": [
+        {"status": QUEUED},
+        {"status": CLAIMED, lease_field: {"$lt": now}},
+    ]}
+    if not query:
+        return claimable
+    return {"$and": [query, claimable]}
+
+
+def claim_update(worker, lease=None, lease_field="lease_expires"):
+    """
+    Update document marking a job as claimed by 'worker', with a lease of 'lease' seconds
+
+    :rtype: dict
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    claim = {"status": CLAIMED, "claimed_by": worker, "claimed_at": now}
+    if lease is not None:
+        claim[lease_field] = now + datetime.timedelta(seconds=lease)
+    return {"$set": claim, "$inc": {"attempts": 1}}
@@ -0,0 +1,344 @@
+# import built-ins
+import os
+import hashlib
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# import pymongo
+import pymongo
+import gridfs
+from bson import ObjectId
+
+# Module Constants
+CHUNK_SIZE = 1024 * 1024
+HASH_FIELD = "metadata.sha256"
+REFS_FIELD = "metadata.refs"
+READ_SIZE = 4 * CHUNK_SIZE
+MAX_PUT_ATTEMPTS = 5
+
+
+def _hash_stream(source):
+    """
+    :return: sha256 hex digest of a seekable file object, the position is restored
+    :rtype: str
+    """
+    position = source.tell()
+    digest = hashlib.sha256()
+    for block in iter(lambda: source.read(READ_SIZE), b""):
+        digest.update(block)
+    source.seek(position)
+    return digest.hexdigest()
+
+
+class _HashingReader:
+    """
+    Wrap a non-seekable file object and hash what is read from it
+    """
+    def __init__(self, source):
+        self.source = source
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.source.read(size)
+        self.digest.update(data)
+        return data
+
+
+class BlobStore:
+    """
+    GridFS bucket for large blobs (thumbnails, Nuke snippets, json sidecars) stored next to their metadata.
+
+    Blobs are uploaded and downloaded in chunks so they never have to fit in memory, identical content
+    is stored once (the GridFS files are unique by sha256), downloads to a path fetch chunk ranges in
+    parallel and 'read_range' only fetches the chunks covering the requested bytes.
+
+    Every 'put' returns its own blob _id, a reference in <bucket_name>.refs holding the filename and
+    metadata given by the caller and pointing at the shared content. The content counts its references
+    and is only deleted with the last one.
+
+    Example:
+        >>> blobs = mongo.blobs("thumbnails")
+        >>> blob_id = blobs.put("/dd/shows/bbx/0780/thumb.jpg", metadata={"shot": "0780"})
+        >>> blobs.download(blob_id, "/tmp/thumb.jpg")
+        >>> header = blobs.read_range(blob_id, 0, 16)
+        >>> blobs.delete(blob_id)
+    """
+    def __init__(self, database, bucket_name="blobs", chunk_size=CHUNK_SIZE, workers=4):
+        """
+        :param database: Database holding the bucket
+        :type database: pymongo database object
+
+        :param bucket_name: name of the bucket, its collections are <bucket_name>.files, <bucket_name>.chunks
+            and <bucket_name>.refs
+        :type bucket_name: str
+
+        :param chunk_size: size in bytes of the chunks of new blobs
+        :type chunk_size: int
+
+        :param workers: number of threads fetching chunks in parallel for 'download'
+        :type workers: int
+        """
+        assert isinstance(chunk_size, int) and chunk_size > 0, "`chunk_size` must be a positive <int>"
+        self.database = database
+        self.bucket_name = bucket_name
+        self.chunk_size = chunk_size
+        self.workers = max(1, workers)
+        self.bucket = gridfs.GridFSBucket(database, bucket_name=bucket_name, chunk_size_bytes=chunk_size)
+        self.files = database[f"{bucket_name}.files"]
+        self.chunks = database[f"{bucket_name}.chunks"]
+        self.refs = database[f"{bucket_name}.refs"]
+
+        self._indexed = False
+        self._lock = threading.Lock()
+
+    def _ensure_index(self):
+        with self._lock:
+            if not self._indexed:
+                self.files.create_index([(HASH_FIELD, pymongo.ASCENDING)], unique=True,
+                                        partialFilterExpression={HASH_FIELD: {"$exists": True}})
+                self._indexed = True
+
+    def _add_reference(self, sha256):
+        """
+        Count one more reference to the content with this sha256
+
+        :return: _id of the GridFS file of the content, None if it isn't stored or is being deleted
+        :rtype: ObjectId
+        """
+        document = self.files.find_one_and_update(
+            {HASH_FIELD: sha256, REFS_FIELD: {"$gt": 0}}, {"$inc": {REFS_FIELD: 1}}, projection={"_id": 1})
+        return document["_id"] if document else None
+
+    def _remove_reference(self, content_id):
+        """
+        Count one less reference to a content, the content is deleted with its last reference.
+        Its sha256 is unset first so a concurrent 'put' of the same content uploads it again
+        instead of referencing a file being deleted.
+        """
+        document = self.files.find_one_and_update(
+            {"_id": content_id}, {"$inc": {REFS_FIELD: -1}}, projection={REFS_FIELD: 1},
+            return_document=pymongo.ReturnDocument.AFTER)
+        if document is None or document.get("metadata", {}).get("refs", 0) > 0:
+            return
+        result = self.files.update_one({"_id": content_id, REFS_FIELD: {"$lte": 0}}, {"$unset": {HASH_FIELD: ""}})
+        if result.matched_count:
+            self._delete_content(content_id)
+
+    def _delete_content(self, content_id):
+        self.files.delete_one({"_id": content_id})
+        self.chunks.delete_many({"files_id": content_id})
+
+    def put(self, source, filename=None, metadata=None):
+        """
+        Stream a blob into the bucket, its content is only uploaded if no blob has the same content.
+
+        Seekable sources are hashed before uploading so duplicates are never sent. Other sources are
+        hashed while uploading and the upload is dropped afterwards if the content already existed.
+
+        :param source: path or binary file object to read the blob from
+        :type source: str or file
+
+        :param filename: name stored with the blob, defaults to the basename of 'source'
+        :type filename: str
+
+        :param metadata: extra metadata stored with the blob
+        :type metadata: dict
+
+        :return: _id of the stored blob
+        :rtype: ObjectId
+        """
+        if isinstance(source, str):
+            filename = filename or os.path.basename(source)
+            with open(source, "rb") as source_file:
+                return self.put(source_file, filename=filename, metadata=metadata)
+
+        filename = filename or getattr(source, "name", None) or "blob"
+        self._ensure_index()
+
+        content_id = None
+        seekable = getattr(source, "seekable", lambda: False)()
+        if seekable:
+            sha256 = _hash_stream(source)
+            position = source.tell()
+            for _ in range(MAX_PUT_ATTEMPTS):
+                content_id = self._add_reference(sha256)
+                if content_id is not None:
+                    break
+                source.seek(position)
+                content_id = ObjectId()
+                try:
+                    self.bucket.upload_from_stream_with_id(
+                        content_id, filename, source, metadata={"sha256": sha256, "refs": 1})
+                    break
+                except pymongo.errors.DuplicateKeyError:
+                    self._delete_content(content_id)
+                    content_id = None
+        else:
+            upload_id = ObjectId()
+            reader = _HashingReader(source)
+            self.bucket.upload_from_stream_with_id(upload_id, filename, reader, metadata={"refs": 1})
+            sha256 = reader.digest.hexdigest()
+            for _ in range(MAX_PUT_ATTEMPTS):
+                content_id = self._add_reference(sha256)
+                if content_id is not None:
+                    self._delete_content(upload_id)
+                    break
+                try:
+                    self.files.update_one({"_id": upload_id}, {"$set": {HASH_FIELD: sha256}})
+                    content_id = upload_id
+                    break
+                except pymongo.errors.DuplicateKeyError:
+                    continue
+            else:
+                self._delete_content(upload_id)
+
+        if content_id is None:
+            raise gridfs.errors.GridFSError(f"Couldn't store blob {filename} in {self.bucket_name}, "
+                                            f"its content is being deleted concurrently")
+
+        reference = {
+            "blob": content_id,
+            "filename": filename,
+            "metadata": dict(metadata or {}, sha256=sha256),
+            "uploadDate": datetime.datetime.now(datetime.timezone.utc),
+        }
+        try:
+            return self.refs.insert_one(reference).inserted_id
+        except BaseException:
+            self._remove_reference(content_id)
+            raise
+
+    def _reference(self, blob_id):
+        reference = self.refs.find_one({"_id": blob_id})
+        if reference is None:
+            raise gridfs.errors.NoFile(f"No blob with _id {blob_id} in {self.bucket_name}")
+        return reference
+
+    def get(self, blob_id, output=None):
+        """
+        Stream a blob to 'output' chunk by chunk, or return its content if no 'output' is given
+
+        :param output: binary file object to write to
+        :type output: file
+
+        :rtype: bytes or None
+        """
+        content_id = self._reference(blob_id)["blob"]
+        if output is None:
+            return self.bucket.open_download_stream(content_id).read()
+        self.bucket.download_to_stream(content_id, output)
+
+    def info(self, blob_id):
+        """
+        :return: the files document of the blob content (length, chunkSize...) with the _id, filename,
+            metadata and uploadDate of the blob
+        :rtype: dict
+        """
+        reference = self._reference(blob_id)
+        document = self.files.find_one({"_id": reference["blob"]})
+        if document is None:
+            raise gridfs.errors.NoFile(f"No content {reference['blob']} for blob {blob_id} in {self.bucket_name}")
+        document.update(reference)
+        document["_id"] = blob_id
+        return document
+
+    def _fetch_chunks(self, content_id, first, last, length, chunk_size):
+        """
+        Yield the chunks first..last of a content in order, checking that none is missing or truncated
+
+        :raise gridfs.errors.CorruptGridFile: the chunks don't match the length of the content
+        """
+        cursor = self.chunks.find(
+            {"files_id": content_id, "n": {"$gte": first, "$lte": last}},
+            projection={"_id": 0, "n": 1, "data": 1},
+            sort=[("n", 1)],
+        )
+        last_size = length - (((length + chunk_size - 1) // chunk_size) - 1) * chunk_size
+        expected = first
+        for chunk in cursor:
+            size = last_size if chunk["n"] == (length - 1) // chunk_size else chunk_size
+            if chunk["n"] != expected or len(chunk["data"]) != size:
+                raise gridfs.errors.CorruptGridFile(
+                    f"Chunk {expected} of {content_id} in {self.bucket_name} is missing or truncated")
+            expected += 1
+            yield chunk
+        if expected != last + 1:
+            raise gridfs.errors.CorruptGridFile(
+                f"Chunk {expected} of {content_id} in {self.bucket_name} is missing")
+
+    def download(self, blob_id, path, workers=None):
+        """
+        Download a blob to 'path', the chunks are split into ranges fetched by parallel threads, each
+        writing its chunks straight to their offset in the file. The file is written next to 'path'
+        and renamed once complete.
+
+        :param workers: number of threads, defaults to the 'workers' of the store
+        :type workers: int
+
+        :return: number of bytes written
+        :rtype: int
+
+        :raise gridfs.errors.CorruptGridFile: a chunk of the blob is missing or truncated
+        """
+        document = self.info(blob_id)
+        content_id, length, chunk_size = document["blob"], document["length"], document["chunkSize"]
+        chunk_count = (length + chunk_size - 1) // chunk_size
+        workers = max(1, min(workers or self.workers, chunk_count))
+        step = (chunk_count + workers - 1) // workers if chunk_count else 0
+
+        temp_path = f"{path}.{os.getpid()}.part"
+        descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(descriptor, length)
+
+            def fetch(first):
+                last = min(first + step, chunk_count) - 1
+                for chunk in self._fetch_chunks(content_id, first, last, length, chunk_size):
+                    os.pwrite(descriptor, chunk["data"], chunk["n"] * chunk_size)
+
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="osmongo-blobs") as executor:
+                list(executor.map(fetch, range(0, chunk_count, step or 1)))
+        except BaseException:
+            os.close(descriptor)
+            os.remove(temp_path)
+            raise
+        os.close(descriptor)
+        os.replace(temp_path, path)
+        return length
+
+    def read_range(self, blob_id, start, end=None):
+        """
+        Read bytes start..end (end excluded) of a blob, only the chunks covering the range are fetched.
+
+        :param start: first byte to read
+        :type start: int
+
+        :param end: byte to stop at, defaults to the end of the blob
+        :type end: int
+
+        :rtype: bytes
+
+        :raise gridfs.errors.CorruptGridFile: a chunk of the range is missing or truncated
+        """
+        document = self.info(blob_id)
+        length, chunk_size = document["length"], document["chunkSize"]
+        end = length if end is None else min(end, length)
+        assert 0 <= start, "`start` must be a positive <int>"
+        if start >= end:
+            return b""
+
+        first, last = start // chunk_size, (end - 1) // chunk_size
+        chunks = self._fetch_chunks(document["blob"], first, last, length, chunk_size)
+        data = b"".join(chunk["data"] for chunk in chunks)
+        offset = start - first * chunk_size
+        return data[offset:offset + end - start]
+
+    def delete(self, blob_id):
+        """
+        Delete a blob, its content and chunks are deleted once no other blob references them
+        """
+        reference = self.refs.find_one_and_delete({"_id": blob_id})
+        if reference is None:
+            raise gridfs.errors.NoFile(f"No blob with _id {blob_id} in {self.bucket_name}")
+        self._remove_reference(reference["blob"])
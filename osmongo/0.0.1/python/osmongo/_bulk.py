@@ -0,0 +1,113 @@
+# import pymongo
+from pymongo import InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany
+from pymongo.errors import BulkWriteError
+
+# Module Constants
+DEFAULT_MAX_BATCH_SIZE = 100000
+FILTERED_OPERATIONS = (UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany)
+WRITE_OPERATIONS = (InsertOne,) + FILTERED_OPERATIONS
+RESULT_COUNTS = ("nInserted", "nMatched", "nModified", "nRemoved", "nUpserted")
+MATCH_ALL_CONDITIONS = ({"$exists": True},)
+
+
+def is_match_all(query):
+    """
+    Check if a filter would match every document of a collection,
+    eg: None, {}, {"_id": {"$exists": True}}, {"$or": [{}, {"code": "bbx"}]} or {"$and": [{}]}
+
+    :param query: filter to check
+    :type query: dict
+
+    :rtype: bool
+    """
+    if not query:
+        return True
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(is_match_all(member) for member in condition):
+                return False
+        elif key == "$and":
+            if not all(is_match_all(member) for member in condition):
+                return False
+        elif condition not in MATCH_ALL_CONDITIONS:
+            return False
+    return True
+
+
+def guard_filter(query):
+    """
+    Reject empty or match-all filters so a bulk update/delete can't wipe a whole collection by accident
+
+    :param query: filter to check
+    :type query: dict
+    """
+    if not isinstance(query, dict):
+        raise TypeError(f"filter must be <dict>, got {type(query).__name__}")
+    if is_match_all(query):
+        raise ValueError(f"Refusing to run a bulk write with an empty or match-all filter: {query}")
+
+
+def operation_filter(operation):
+    """
+    pymongo write models have no public accessor for their filter, read it from the attribute they
+    store it in and refuse the operation if it isn't there, so the guard can't be silently skipped
+
+    :rtype: dict
+    """
+    try:
+        return operation._filter
+    except AttributeError:
+        raise TypeError(f"Can't read the filter of {operation!r}, unsupported pymongo version")
+
+
+def chunks(operations, batch_size):
+    """
+    Split 'operations' into lists of at most 'batch_size' items
+
+    :return: (offset of the chunk, chunk)
+    :rtype: generator
+    """
+    for offset in range(0, len(operations), batch_size):
+        yield offset, operations[offset:offset + batch_size]
+
+
+def new_result():
+    """
+    :return: empty aggregated bulk write result
+    :rtype: dict
+    """
+    result = {key: 0 for key in RESULT_COUNTS}
+    result["upserted"] = []
+    result["writeErrors"] = []
+    result["batches"] = 0
+    return result
+
+
+def merge_result(result, chunk_result, offset):
+    """
+    Add a chunk's raw bulk api result to the aggregated 'result',
+    indexes are shifted by 'offset' so they point into the full list of operations.
+    """
+    for key in RESULT_COUNTS:
+        result[key] += chunk_result.get(key, 0)
+
+    for upserted in chunk_result.get("upserted", []):
+        result["upserted"].append(dict(upserted, index=upserted["index"] + offset))
+
+    for error in chunk_result.get("writeErrors", []):
+        result["writeErrors"].append(dict(error, index=error["index"] + offset))
+
+    result["batches"] += 1
+
+
+def run_chunk(collection, chunk, ordered):
+    """
+    Run one chunk of operations
+
+    :return: raw bulk api result and True if the chunk failed
+    :rtype: tuple
+    """
+    try:
+        return collection.bulk_write(chunk, ordered=ordered).bulk_api_result, False
+    except BulkWriteError as e:
+        return e.details, True
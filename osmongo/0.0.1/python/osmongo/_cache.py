@@ -0,0 +1,149 @@
+# import built-ins
+import copy
+import time
+import threading
+from collections import OrderedDict
+
+# import bson
+from bson import json_util
+
+
+class QueryCache:
+    """
+    Thread-safe read-through cache for MongoAPI.find_one results with LRU eviction and per-collection TTLs.
+
+    Entries are keyed on (collection, normalized query, projection). Writes made through MongoAPI
+    invalidate every entry of the written collection, writes made by other processes are only
+    picked up once the entry expires, so keep TTLs short for collections that change often.
+
+    A query racing with a write can read the document before the write and cache it after the write
+    invalidated the collection. Read the collection's generation before querying and pass it to 'set',
+    the result is dropped if the collection was invalidated meanwhile.
+
+    Example:
+        >>> cache = QueryCache(max_size=2048, ttl=30, collection_ttls={"osvfx.shows": 300})
+        >>> mongo = MongoAPI(cache=cache)
+        >>> mongo.find_one(mongo.database["shows"], {"code": "bbx"})
+        >>> cache.stats()
+
+        >>> key = QueryCache.make_key(collection, query, None)
+        >>> generation = cache.generation(key)
+        >>> cache.set(key, collection.find_one(query), generation)
+    """
+    def __init__(self, max_size=1024, ttl=60, collection_ttls=None):
+        """
+        :param max_size: maximum number of cached documents, least recently used are evicted first
+        :type max_size: int
+
+        :param ttl: default time to live of an entry in seconds
+        :type ttl: float
+
+        :param collection_ttls: time to live per collection full name, eg: {"osvfx.shows": 300}
+        :type collection_ttls: dict
+        """
+        assert isinstance(max_size, int) and max_size > 0, "`max_size` must be a positive <int>"
+        self.max_size = max_size
+        self.ttl = ttl
+        self.collection_ttls = dict(collection_ttls or {})
+
+        self._entries = OrderedDict()
+        # Invalidation counters, of every collection and per collection full name
+        self._generation = 0
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(collection, query, projection):
+        """
+        Build the cache key, top-level filter keys are sorted as their order doesn't change the match.
+        Nested documents keep their order, {"a": {"x": 1, "y": 2}} and {"a": {"y": 2, "x": 1}} are different queries.
+        """
+        query = dict(sorted((query or {}).items()))
+        return (
+            collection.full_name,
+            json_util.dumps(query),
+            json_util.dumps(projection) if projection is not None else None,
+        )
+
+    def get(self, key):
+        """
+        :return: (True, cached document) on a hit or (False, None) on a miss
+        :rtype: tuple
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, copy.deepcopy(entry[1])
+
+    def generation(self, key):
+        """
+        :return: invalidation counter of the collection of 'key', read it before querying the server
+        :rtype: tuple
+        """
+        with self._lock:
+            return self._generation, self._generations.get(key[0], 0)
+
+    def set(self, key, document, generation=None):
+        """
+        Cache a document, unless its collection was invalidated since 'generation' was read
+
+        :param generation: value of generation(key) before the document was queried
+        :type generation: tuple
+        """
+        ttl = self.collection_ttls.get(key[0], self.ttl)
+        with self._lock:
+            if generation is not None and generation != (self._generation, self._generations.get(key[0], 0)):
+                return
+            self._entries[key] = (time.monotonic() + ttl, copy.deepcopy(document))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, collection=None):
+        """
+        Drop every entry of 'collection', or every entry if 'collection' is None
+
+        :param collection: Collection written to
+        :type collection: pymongo collection object
+        """
+        with self._lock:
+            if collection is None:
+                self._generation += 1
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                return
+
+            self._generations[collection.full_name] = self._generations.get(collection.full_name, 0) + 1
+            keys = [key for key in self._entries if key[0] == collection.full_name]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+
+    def stats(self):
+        """
+        :return: hits, misses, hit ratio, evictions, invalidations and current size
+        :rtype: dict
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
@@ -0,0 +1,264 @@
+# import built-ins
+import json
+import time
+import inspect
+import functools
+import threading
+import contextvars
+
+# import pymongo
+import pymongo
+from bson import json_util
+
+# Module Constants
+JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS
+COLLECTION_ARGUMENTS = ("collection", "queue_collection")
+# Arguments which aren't captured, replay provides its own, eg: write_raw writes to os.devnull
+UNCAPTURED_ARGUMENTS = ("output",)
+WRITE_MODELS = {
+    model.__name__: model for model in (
+        pymongo.InsertOne, pymongo.UpdateOne, pymongo.UpdateMany, pymongo.ReplaceOne, pymongo.DeleteOne,
+        pymongo.DeleteMany,
+    )
+}
+
+# True while a captured operation runs, a context variable so concurrent asyncio tasks don't share it
+_active = contextvars.ContextVar("osmongo_capture_active", default=False)
+
+
+class WorkloadRecorder:
+    """
+    Append one json line per captured MongoAPI operation to a file:
+    {"t": seconds since capture start, "op": method name, "database", "collection",
+     "duration": seconds, "error": exception name or null, "arguments": {...}}
+
+    Arguments are canonical extended json so ObjectIds and dates survive the replay, bulk_write
+    operations are stored as {"model": "UpdateOne", "arguments": [...]}.
+    Operations with arguments that can't be serialized are counted in 'skipped'.
+
+    The duration of operations returning a generator includes the time spent iterating it, they are
+    written once exhausted, closed or garbage collected. Cursors are returned untouched so callers can
+    still chain sort, limit or batch_size on them, their operations are written right away with a null
+    duration since the server isn't queried until they are iterated.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.started = time.perf_counter()
+        self.recorded = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1024 * 1024)
+
+    def write(self, offset, op, collection, duration, error, encoded_arguments):
+        head = json.dumps({
+            "t": round(offset, 6),
+            "op": op,
+            "database": collection.database.name,
+            "collection": collection.name,
+            "duration": None if duration is None else round(duration, 6),
+            "error": error,
+        })
+        line = head[:-1] + ', "arguments": ' + encoded_arguments + "}\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+                self.recorded += 1
+
+    def skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def encode_operations(operations):
+    """
+    :return: json serializable version of a list of pymongo write models, see decode_operations
+    :rtype: list
+    """
+    encoded = []
+    for operation in operations:
+        name = type(operation).__name__
+        # write models don't expose their arguments, they are read back from their private attributes
+        if name == "InsertOne":
+            arguments = [operation._doc]
+        elif name in ("DeleteOne", "DeleteMany"):
+            arguments = [operation._filter]
+        else:
+            arguments = [operation._filter, operation._doc, operation._upsert]
+        encoded.append({"model": name, "arguments": arguments})
+    return encoded
+
+
+def decode_operations(encoded):
+    """
+    :return: pymongo write models of operations encoded by encode_operations
+    :rtype: list
+    """
+    return [WRITE_MODELS[operation["model"]](*operation["arguments"]) for operation in encoded]
+
+
+def _is_cursor(result):
+    """
+    :return: True for pymongo cursors, which are iterators but aren't wrapped to keep their type
+    :rtype: bool
+    """
+    return hasattr(result, "__anext__") or (hasattr(result, "__next__") and not inspect.isgenerator(result))
+
+
+class _TimedIterator:
+    """
+    Proxy of the generator returned by a captured operation, adds the time spent fetching its
+    items to the duration of the operation and writes it once iteration ends.
+    Time spent by the caller between items isn't counted.
+    """
+    _iterator = None
+    _finish = None
+
+    def __init__(self, iterator, finish, duration):
+        self._iterator = iterator
+        self._finish = finish
+        self._duration = duration
+        self._error = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finish is None:
+            return next(self._iterator)
+        token = _active.set(True)
+        start = time.perf_counter()
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            self._done()
+            raise
+        except Exception as e:
+            self._error = type(e).__name__
+            self._done()
+            raise
+        finally:
+            self._duration += time.perf_counter() - start
+            _active.reset(token)
+
+    def _done(self):
+        finish, self._finish = self._finish, None
+        if finish is not None:
+            finish(self._duration, self._error)
+
+    def close(self):
+        try:
+            if hasattr(self._iterator, "close"):
+                self._iterator.close()
+        finally:
+            self._done()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self._done()
+
+    def __getattr__(self, name):
+        return getattr(self._iterator, name)
+
+
+def _encode_arguments(signature, self, args, kwargs):
+    """
+    :return: collection and canonical json of the arguments of a captured call, the json is None
+        if they can't be serialized
+    :rtype: tuple
+    """
+    arguments = signature.bind(self, *args, **kwargs).arguments
+    arguments.pop("self")
+    collection = next(arguments.pop(name) for name in COLLECTION_ARGUMENTS if name in arguments)
+    for name in UNCAPTURED_ARGUMENTS:
+        arguments.pop(name, None)
+    try:
+        if "operations" in arguments:
+            arguments["operations"] = encode_operations(arguments["operations"])
+        return collection, json_util.dumps(arguments, json_options=JSON_OPTIONS)
+    except (TypeError, AttributeError):
+        return collection, None
+
+
+def captured(method):
+    """
+    Record calls of a MongoAPI or AsyncMongoAPI operation in the active WorkloadRecorder of the class ('workload').
+    Arguments are encoded before the call, so documents are captured before the server adds their _id.
+    Operations called by another captured operation, eg: claim_next -> find_one_and_update, aren't recorded.
+    Generators are returned wrapped in a _TimedIterator so their duration covers the iteration,
+    cursors are returned as is and recorded without a duration.
+    """
+    signature = inspect.signature(method)
+
+    def start_recording(self, args, kwargs):
+        recorder = self.workload
+        if recorder is None or _active.get():
+            return None
+        collection, encoded_arguments = _encode_arguments(signature, self, args, kwargs)
+        if encoded_arguments is None:
+            recorder.skip()
+        start = time.perf_counter()
+
+        def finish(duration, error):
+            if encoded_arguments is not None:
+                recorder.write(start - recorder.started, method.__name__, collection, duration, error, encoded_arguments)
+
+        return finish, start
+
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(self, *args, **kwargs):
+            recording = start_recording(self, args, kwargs)
+            if recording is None:
+                return await method(self, *args, **kwargs)
+
+            finish, start = recording
+            token = _active.set(True)
+            try:
+                result = await method(self, *args, **kwargs)
+            except Exception as e:
+                finish(time.perf_counter() - start, type(e).__name__)
+                raise
+            finally:
+                _active.reset(token)
+            finish(time.perf_counter() - start, None)
+            return result
+
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        recording = start_recording(self, args, kwargs)
+        if recording is None:
+            return method(self, *args, **kwargs)
+
+        finish, start = recording
+        token = _active.set(True)
+        try:
+            result = method(self, *args, **kwargs)
+        except Exception as e:
+            finish(time.perf_counter() - start, type(e).__name__)
+            raise
+        finally:
+            _active.reset(token)
+        duration = time.perf_counter() - start
+
+        if _is_cursor(result):
+            finish(None, None)
+            return result
+        if hasattr(result, "__next__"):
+            return _TimedIterator(result, finish, duration)
+        finish(duration, None)
+        return result
+
+    return wrapper
@@ -0,0 +1,95 @@
+# import built-ins
+import numbers
+
+# import numpy
+import numpy
+
+# import osmongo
+from ._paging import _covers
+
+# Module Constants
+INITIAL_CAPACITY = 4096
+_MISSING = object()
+
+
+def _get(document, path):
+    """
+    Get a possibly dotted field from a document, eg: "stats.cpu"
+    """
+    value = document
+    for key in path:
+        if not isinstance(value, dict):
+            return _MISSING
+        value = value.get(key, _MISSING)
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+class ColumnBuilder:
+    """
+    Growing, preallocated NumPy array of one field with a mask of missing values.
+    Numeric and boolean columns only take numbers, strings such as "1.5" are masked instead of parsed.
+    """
+    def __init__(self, field, dtype, capacity=INITIAL_CAPACITY):
+        self.field = field
+        self.path = field.split(".")
+        self.dtype = numpy.dtype(dtype)
+        self.numeric = self.dtype.kind in "biufc"
+        self.values = numpy.zeros(capacity, dtype=self.dtype)
+        self.mask = numpy.zeros(capacity, dtype=bool)
+
+    def grow(self, capacity):
+        values = numpy.zeros(capacity, dtype=self.dtype)
+        values[:len(self.values)] = self.values
+        mask = numpy.zeros(capacity, dtype=bool)
+        mask[:len(self.mask)] = self.mask
+        self.values, self.mask = values, mask
+
+    def set(self, index, document):
+        value = _get(document, self.path)
+        if value is _MISSING or value is None or (self.numeric and not isinstance(value, numbers.Number)):
+            self.mask[index] = True
+            return
+        try:
+            self.values[index] = value
+            self.mask[index] = False
+        except (TypeError, ValueError):
+            self.mask[index] = True
+
+    def build(self, size):
+        return numpy.ma.MaskedArray(self.values[:size].copy(), mask=self.mask[:size].copy())
+
+
+def find_columns(collection, query, fields, dtypes=None, batch_size=10000, sort=None):
+    """
+    Stream the documents matching 'query' into one NumPy array per field, only the requested
+    fields are fetched and documents are dropped as soon as their values are copied.
+
+    Overlapping fields, eg: "stats" and "stats.cpu", are fetched once through the parent field.
+
+    :return: masked array per field, missing, None or non-convertible values are masked
+    :rtype: dict
+    """
+    dtypes = dtypes or {}
+    columns = [ColumnBuilder(field, dtypes.get(field, "float64")) for field in fields]
+    capacity = INITIAL_CAPACITY
+
+    projection = {
+        field: 1 for field in fields if not any(other != field and _covers(other, field) for other in fields)
+    }
+    if "_id" not in fields:
+        projection["_id"] = 0
+
+    cursor = collection.find(filter=query, projection=projection, sort=sort, batch_size=batch_size)
+    size = 0
+    for document in cursor:
+        if size == capacity:
+            capacity *= 2
+            for column in columns:
+                column.grow(capacity)
+        for column in columns:
+            column.set(size, document)
+        size += 1
+
+    return {column.field: column.build(size) for column in columns}
@@ -0,0 +1,187 @@
+# import built-ins
+import re
+import time
+import heapq
+import queue
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# import pymongo
+import pymongo
+from bson import Binary, Decimal128, MaxKey, MinKey, ObjectId, Regex, Timestamp
+
+# Module Constants
+_DONE = object()
+QUEUE_SIZE = 1000
+
+
+class _Reverse:
+    """
+    Invert the ordering of a sort key for descending merges
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def _bson_key(value):
+    """
+    :return: sort key of a value following the BSON comparison order of the server, so values
+        of different types, and missing values, can be merged: MinKey < null < numbers < strings
+        < objects < arrays < binary < ObjectId < booleans < dates < timestamps < regexes < MaxKey
+    :rtype: tuple
+    """
+    if value is None:
+        return (1, 0)
+    if isinstance(value, MinKey):
+        return (0, 0)
+    if isinstance(value, MaxKey):
+        return (12, 0)
+    if isinstance(value, bool):
+        return (8, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, Decimal128):
+        return (2, value.to_decimal())
+    if isinstance(value, str):
+        return (3, value)
+    if isinstance(value, dict):
+        return (4, tuple((key, _bson_key(item)) for key, item in value.items()))
+    if isinstance(value, list):
+        return (5, tuple(_bson_key(item) for item in value))
+    if isinstance(value, (bytes, Binary)):
+        return (6, len(value), bytes(value))
+    if isinstance(value, ObjectId):
+        return (7, value.binary)
+    if isinstance(value, datetime.datetime):
+        return (9, value.timestamp() if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc).timestamp())
+    if isinstance(value, Timestamp):
+        return (10, value.time, value.inc)
+    if isinstance(value, (Regex, re.Pattern)):
+        return (11, value.pattern)
+    return (13, str(value))
+
+
+def _sort_value(document, field):
+    """
+    :return: value of a, possibly dotted, sort field, None if it is missing
+    """
+    value = document
+    for part in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _produce(database_name, run, timeout, output, stop, errors):
+    """
+    Run one database's query in a worker thread and push (database_name, document) to 'output'.
+    'timeout' is the time the database gets to return its documents, the time waiting on
+    a full 'output' doesn't count.
+    """
+    try:
+        documents = None
+        remaining = timeout
+        while True:
+            start = time.monotonic()
+            with pymongo.timeout(remaining):
+                if documents is None:
+                    documents = iter(run(database_name))
+                document = next(documents, _DONE)
+            if document is _DONE:
+                break
+            if remaining is not None:
+                remaining = max(0.0, remaining - (time.monotonic() - start))
+
+            while not stop.is_set():
+                try:
+                    output.put((database_name, document), timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set():
+                return
+    except Exception as e:
+        errors[database_name] = e
+    finally:
+        while not stop.is_set():
+            try:
+                output.put(_DONE, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+
+
+def _drain(output):
+    while True:
+        item = output.get()
+        if item is _DONE:
+            return
+        yield item
+
+
+def fan_out(database_names, run, timeout=None, sort=None, workers=None, errors=None):
+    """
+    Run 'run(database_name)' concurrently for every database and stream the merged results
+    as (database_name, document) tuples.
+
+    Without 'sort', results are yielded as they arrive. With 'sort', every database must return its
+    results sorted the same way and they are merged in order, eg: sort=[("created_at", -1)].
+    Unordered fan-outs can use fewer 'workers' than databases.
+    Each database gets 'timeout' seconds of server time, databases failing or running out of time
+    are skipped and their exception is stored in 'errors'. Sort values are compared in BSON order,
+    like the server does, so missing values and mixed types merge in the same order.
+
+    :rtype: generator
+    """
+    errors = {} if errors is None else errors
+    stop = threading.Event()
+
+    # An ordered merge waits on every database, so each one needs its own worker
+    workers = len(database_names) if sort or not workers else workers
+
+    if sort:
+        outputs = [queue.Queue(QUEUE_SIZE) for _ in database_names]
+    else:
+        outputs = [queue.Queue(QUEUE_SIZE)] * len(database_names)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="osmongo-fan-out")
+    futures = []
+    try:
+        for database_name, output in zip(database_names, outputs):
+            futures.append(executor.submit(_produce, database_name, run, timeout, output, stop, errors))
+
+        if sort:
+            def key(item):
+                document = item[1]
+                values = []
+                for field, direction in sort:
+                    value = _bson_key(_sort_value(document, field))
+                    values.append(value if direction == 1 else _Reverse(value))
+                return values
+
+            yield from heapq.merge(*[_drain(output) for output in outputs], key=key)
+        else:
+            output = outputs[0] if outputs else None
+            remaining = len(database_names)
+            while remaining:
+                item = output.get()
+                if item is _DONE:
+                    remaining -= 1
+                    continue
+                yield item
+    finally:
+        # Databases which didn't start yet are skipped, running ones stop at their next document
+        stop.set()
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
@@ -0,0 +1,142 @@
+# import built-ins
+import time
+import random
+import threading
+
+# import pymongo
+import pymongo
+
+
+class ServerUnavailableError(IOError):
+    """
+    Raised when the health checker knows the server is down, instead of blocking on server selection
+    """
+    pass
+
+
+class HealthChecker:
+    """
+    Background thread tracking the availability of the server behind a MongoClient.
+
+    The server is pinged every 'interval' seconds while it is up. Once a ping fails, it is retried
+    with exponential backoff and jitter (backoff * 2^failures, capped at max_backoff, randomised
+    by +/-50%) so a farm full of clients doesn't hammer a recovering server at the same moment.
+
+    'available' is None until the first ping finished, then True or False. While the server is down,
+    raise_if_unavailable pings it again itself once the last check is older than 'recheck' seconds,
+    so callers see a recovered server straight away instead of after the backoff delay.
+    """
+    def __init__(self, client, name, interval=10.0, backoff=0.5, max_backoff=30.0, recheck=1.0, on_change=None):
+        """
+        :param client: client to check
+        :type client: pymongo.MongoClient
+
+        :param name: name used in messages, eg: the connection uri
+        :type name: str
+
+        :param interval: seconds between pings while the server is up
+        :type interval: float
+
+        :param backoff: first retry delay in seconds once the server is down
+        :type backoff: float
+
+        :param max_backoff: maximum retry delay in seconds
+        :type max_backoff: float
+
+        :param recheck: age in seconds of a failed check after which callers ping the server again,
+            each of these pings waits for the server at most 'recheck' seconds
+        :type recheck: float
+
+        :param on_change: called with (checker) whenever availability changes
+        :type on_change: callable
+        """
+        self.client = client
+        self.name = name
+        self.interval = interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.recheck = recheck
+        self.on_change = on_change
+
+        self.available = None
+        self.failures = 0
+        self.last_error = None
+        self.last_check = None
+        self.latency = None
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._check_lock = threading.Lock()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="osmongo-health", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def check(self, timeout=None):
+        """
+        Ping the server once and update the availability
+
+        :param timeout: maximum seconds to wait for the server, defaults to the client's timeouts
+        :type timeout: float
+
+        :return: True if the server answered
+        :rtype: bool
+        """
+        start = time.monotonic()
+        try:
+            with pymongo.timeout(timeout):
+                self.client.admin.command("ping")
+        except Exception as e:
+            available = False
+            self.failures += 1
+            self.last_error = e
+        else:
+            available = True
+            self.failures = 0
+            self.last_error = None
+            self.latency = time.monotonic() - start
+        self.last_check = time.time()
+
+        changed = available != self.available
+        self.available = available
+        if changed and self.on_change is not None:
+            self.on_change(self)
+        return available
+
+    def next_delay(self):
+        """
+        :return: seconds to wait before the next ping
+        :rtype: float
+        """
+        if self.available:
+            return self.interval
+        delay = min(self.max_backoff, self.backoff * (2 ** max(0, self.failures - 1)))
+        return delay * random.uniform(0.5, 1.5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check()
+            self._stop.wait(self.next_delay())
+
+    def _stale(self):
+        return self.last_check is None or time.time() - self.last_check > self.recheck
+
+    def raise_if_unavailable(self):
+        """
+        Ping the server again if the last failed check is older than 'recheck' seconds,
+        one caller pings while the others wait for its result
+
+        :raises ServerUnavailableError: if the server is still down
+        """
+        if self.available is False and self._stale():
+            with self._check_lock:
+                if self.available is False and self._stale():
+                    self.check(timeout=self.recheck)
+        if self.available is False:
+            raise ServerUnavailableError(
+                f"MongoDB server {self.name} is unavailable ({self.failures} failed check(s)): {self.last_error}")
@@ -0,0 +1,186 @@
+# import built-ins
+import json
+import threading
+
+# import pymongo
+from pymongo import IndexModel
+
+# Module Constants
+EQUALITY_OPERATORS = ("$eq", "$in")
+RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte", "$ne", "$nin", "$exists", "$regex")
+
+
+def index_models(specs):
+    """
+    Build IndexModels from a declarative index spec
+
+    :param specs: index specs, eg: [{"keys": [["show", 1], ["shot", 1]], "unique": True}]
+    :type specs: list
+
+    :rtype: list
+    """
+    models = []
+    for spec in specs:
+        spec = dict(spec)
+        keys = [tuple(key) for key in spec.pop("keys")]
+        models.append(IndexModel(keys, **spec))
+    return models
+
+
+def missing_indexes(collection, models):
+    """
+    :return: the models whose keys don't have an index in 'collection' yet
+    :rtype: list
+    """
+    existing = [list(info["key"]) for info in collection.index_information().values()]
+    return [model for model in models if list(model.document["key"].items()) not in existing]
+
+
+def query_shape(value):
+    """
+    Replace every value of a query with "?" keeping fields and operators, eg:
+    {"show": "bbx", "version": {"$gt": 3}} -> {"show": "?", "version": {"$gt": "?"}}
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], dict):
+        return [query_shape(item) for item in value]
+    return "?"
+
+
+def query_fields(query):
+    """
+    Split the fields of a query into equality and range fields, $and clauses are merged,
+    other logical operators ($or, $nor, ...) are ignored
+
+    :return: (equality fields, range fields)
+    :rtype: tuple
+    """
+    equality, ranges = [], []
+    for field, condition in query.items():
+        if field == "$and":
+            for clause in condition:
+                clause_equality, clause_ranges = query_fields(clause)
+                equality.extend(clause_equality)
+                ranges.extend(clause_ranges)
+        elif field.startswith("$"):
+            continue
+        elif isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+            if any(key in RANGE_OPERATORS for key in condition):
+                ranges.append(field)
+            else:
+                equality.append(field)
+        else:
+            equality.append(field)
+    return equality, ranges
+
+
+def suggest_index(query, sort=None):
+    """
+    Suggest an index for a query following the Equality, Sort, Range rule
+
+    :return: index keys, eg: [("show", 1), ("created_at", -1), ("version", 1)]
+    :rtype: list
+    """
+    equality, ranges = query_fields(query)
+    keys = []
+    for field in equality:
+        if field not in [key for key, _ in keys]:
+            keys.append((field, 1))
+    for field, direction in sort or []:
+        if field not in [key for key, _ in keys]:
+            keys.append((field, direction))
+    for field in ranges:
+        if field not in [key for key, _ in keys]:
+            keys.append((field, 1))
+    return keys
+
+
+def plan_stages(plan):
+    """
+    :return: every stage name of an explain plan, from the root down
+    :rtype: list
+    """
+    stages = [plan.get("stage")]
+    for child in ("inputStage", "queryPlan"):
+        if child in plan:
+            stages.extend(plan_stages(plan[child]))
+    for child in plan.get("inputStages", []):
+        stages.extend(plan_stages(child))
+    return stages
+
+
+class QueryShapeRecorder:
+    """
+    Thread-safe, bounded record of the query shapes a process has run,
+    with one sample query per shape used to explain it later.
+    """
+    def __init__(self, max_shapes=1000):
+        self.max_shapes = max_shapes
+        self._shapes = {}
+        self._lock = threading.Lock()
+
+    def record(self, collection, query, projection=None, sort=None):
+        key = json.dumps(
+            [collection.full_name, query_shape(query or {}), sorted(projection or {}), sort or []], default=str)
+        with self._lock:
+            entry = self._shapes.get(key)
+            if entry is not None:
+                entry["count"] += 1
+            elif len(self._shapes) < self.max_shapes:
+                self._shapes[key] = {
+                    "collection": collection,
+                    "query": query or {},
+                    "projection": projection,
+                    "sort": sort,
+                    "count": 1,
+                }
+
+    def shapes(self):
+        """
+        :return: recorded shapes, most frequent first
+        :rtype: list
+        """
+        with self._lock:
+            return sorted((dict(entry) for entry in self._shapes.values()), key=lambda entry: -entry["count"])
+
+    def clear(self):
+        with self._lock:
+            self._shapes.clear()
+
+
+def explain_shape(shape):
+    """
+    Explain a recorded query shape and report collection scans, non-covered queries and a suggested index
+
+    :return: report with collection, query, count, stages, collscan, covered and suggested_index
+    :rtype: dict
+    """
+    collection = shape["collection"]
+    cursor = collection.find(shape["query"], projection=shape["projection"])
+    if shape["sort"]:
+        cursor = cursor.sort(shape["sort"])
+    explain = cursor.explain()
+
+    winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+    stages = plan_stages(winning_plan)
+    collscan = "COLLSCAN" in stages
+    covered = not collscan and "FETCH" not in stages
+
+    report = {
+        "collection": collection.full_name,
+        "query": query_shape(shape["query"]),
+        "sort": shape["sort"],
+        "count": shape["count"],
+        "stages": stages,
+        "collscan": collscan,
+        "covered": covered,
+        "suggested_index": None,
+    }
+
+    if collscan or "SORT" in stages:
+        suggested = suggest_index(shape["query"], shape["sort"])
+        existing = [list(info["key"]) for info in collection.index_information().values()]
+        if suggested and suggested not in existing:
+            report["suggested_index"] = suggested
+    return report
@@ -0,0 +1,168 @@
+# import built-ins
+import threading
+from concurrent.futures import Future
+
+# import osmongo
+from ._paging import keyset_projection
+
+
+def key_values(document, key):
+    """
+    :return: values of a dotted 'key' in 'document', every element of the arrays on the path,
+        like a {key: {"$in": [...]}} query matches them
+    :rtype: list
+    """
+    values = [document]
+    for name in key.split("."):
+        found = []
+        for value in values:
+            if isinstance(value, list):
+                value = [item.get(name) for item in value if isinstance(item, dict)]
+                found.extend(value)
+            elif isinstance(value, dict) and name in value:
+                found.append(value[name])
+        values = found
+    return [item for value in values for item in (value if isinstance(value, list) else [value])]
+
+
+class DocumentLoader:
+    """
+    Coalesce find_one-by-key lookups issued within a short window into a single $in query.
+
+    Lookups from any thread are collected for 'window' seconds (or until 'max_batch_size'
+    distinct keys are pending), duplicate keys within the window share one result and
+    every caller gets its own document back, or None if no document matched.
+    Dotted keys and array fields are supported, a document whose array holds several of the
+    pending keys is returned for each of them.
+
+    Example:
+        >>> loader = mongo.loader(mongo.database["assets"])
+        >>> futures = [loader.load(asset_id) for asset_id in asset_ids]
+        >>> assets = [future.result() for future in futures]
+        >>> assets = loader.load_many(asset_ids)
+    """
+    def __init__(self, collection, key="_id", projection=None, window=0.005, max_batch_size=1000, find=None):
+        """
+        :param collection: Collection to find the documents
+        :type collection: pymongo collection object
+
+        :param key: field the lookups are made on, it should be unique and indexed
+        :type key: str
+
+        :param projection: Determines which fields are returned, 'key' is always returned
+        :type projection: dict
+
+        :param window: time in seconds lookups are collected before querying
+        :type window: float
+
+        :param max_batch_size: maximum number of distinct keys per query
+        :type max_batch_size: int
+
+        :param find: called as find(collection, query, projection, sort) to run the queries,
+            eg: MongoAPI.find, defaults to collection.find
+        :type find: callable
+        """
+        assert isinstance(max_batch_size, int) and max_batch_size > 0, "`max_batch_size` must be a positive <int>"
+        self.collection = collection
+        self.key = key
+        self.projection = keyset_projection(projection, key)
+        self.find = find
+        self.window = window
+        self.max_batch_size = max_batch_size
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timer = None
+        self.queries = 0
+        self.lookups = 0
+
+    def load(self, key):
+        """
+        Queue a lookup of 'key'
+
+        :return: Future resolved with the matching document or None
+        :rtype: concurrent.futures.Future
+        """
+        with self._lock:
+            self.lookups += 1
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+
+            future = Future()
+            self._pending[key] = future
+            if len(self._pending) >= self.max_batch_size:
+                batch = self._take()
+            else:
+                batch = None
+                if self._timer is None:
+                    self._timer = threading.Timer(self.window, self.dispatch)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+        if batch:
+            self._resolve(batch)
+        return future
+
+    def load_many(self, keys):
+        """
+        Lookup every key and wait for the results, they are returned in the order of 'keys'
+
+        :rtype: list
+        """
+        futures = [self.load(key) for key in keys]
+        self.dispatch()
+        return [future.result() for future in futures]
+
+    def dispatch(self):
+        """
+        Query every pending key now instead of waiting for the window to close
+        """
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._resolve(batch)
+
+    def _take(self):
+        batch = self._pending
+        self._pending = {}
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _resolve(self, batch):
+        with self._lock:
+            self.queries += 1
+        try:
+            query = {self.key: {"$in": list(batch)}}
+            sort = [(self.key, 1)]
+            if self.find is not None:
+                cursor = self.find(self.collection, query, self.projection, sort)
+            else:
+                cursor = self.collection.find(query, projection=self.projection, sort=sort)
+
+            documents = {}
+            for document in cursor:
+                for value in key_values(document, self.key):
+                    try:
+                        if value in batch:
+                            documents.setdefault(value, document)
+                    except TypeError:
+                        # unhashable values, eg: embedded documents, can't be pending keys
+                        continue
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+            return
+
+        for key, future in batch.items():
+            future.set_result(documents.get(key))
+
+    def stats(self):
+        """
+        :return: number of lookups, queries sent and round trips avoided
+        :rtype: dict
+        """
+        with self._lock:
+            return {"lookups": self.lookups, "queries": self.queries, "saved": self.lookups - self.queries}
@@ -0,0 +1,189 @@
+# import built-ins
+import bisect
+import threading
+from collections import defaultdict
+
+# import pymongo
+import bson
+from pymongo import monitoring
+
+# Module Constants
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class _CommandListener(monitoring.CommandListener):
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        self.metrics._started(event)
+
+    def succeeded(self, event):
+        self.metrics._finished(event, failed=False)
+
+    def failed(self, event):
+        self.metrics._finished(event, failed=True)
+
+
+class _PoolListener(monitoring.ConnectionPoolListener):
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def pool_created(self, event):
+        self.metrics._pool_event("pools_created")
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.metrics._pool_event("pools_cleared")
+
+    def pool_closed(self, event):
+        self.metrics._pool_event("pools_closed")
+
+    def connection_created(self, event):
+        self.metrics._pool_event("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.metrics._pool_event("connections_closed")
+
+    def connection_check_out_started(self, event):
+        self.metrics._pool_event("checkouts_started")
+
+    def connection_check_out_failed(self, event):
+        self.metrics._pool_event("checkouts_failed")
+
+    def connection_checked_out(self, event):
+        self.metrics._pool_event("checked_out")
+
+    def connection_checked_in(self, event):
+        self.metrics._pool_event("checked_in")
+
+
+class CommandMetrics:
+    """
+    In-process metrics for every command MongoAPI sends to the server, collected with pymongo
+    command and connection pool listeners.
+
+    Per command name: count, failures and a latency histogram (ms buckets of LATENCY_BUCKETS_MS),
+    per collection: operation counts per command, and connection pool event counters.
+    Bytes sent and received are measured by re-encoding commands and replies, which costs CPU,
+    so it is only done when 'track_bytes' is True.
+
+    Commands slower than 'slow_query_ms' are logged as warnings through 'logger'.
+
+    Example:
+        >>> from osmongo import MongoAPI
+        >>> mongo = MongoAPI()
+        >>> mongo.find_one(mongo.database["shows"], {"code": "bbx"})
+        >>> MongoAPI.metrics.snapshot()["commands"]["find"]
+    """
+    def __init__(self, slow_query_ms=None, track_bytes=False, logger=None):
+        """
+        :param slow_query_ms: log commands slower than this many ms, None disables slow query logs
+        :type slow_query_ms: float
+
+        :param track_bytes: measure bytes sent and received per command
+        :type track_bytes: bool
+
+        :param logger: logger used for slow query warnings, eg: OSMongo
+        :type logger: logger.Logger
+        """
+        self.slow_query_ms = slow_query_ms
+        self.track_bytes = track_bytes
+        self.logger = logger
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.reset()
+
+    def listeners(self):
+        """
+        :return: listeners to pass to MongoClient(event_listeners=...)
+        :rtype: list
+        """
+        return [_CommandListener(self), _PoolListener(self)]
+
+    def reset(self):
+        with self._lock:
+            self._commands = defaultdict(lambda: {
+                "count": 0,
+                "failed": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                "bytes_out": 0,
+                "bytes_in": 0,
+            })
+            self._collections = defaultdict(lambda: defaultdict(int))
+            self._pool = defaultdict(int)
+            self._slow_queries = 0
+
+    def _started(self, event):
+        command_name = event.command_name
+        collection = event.command.get(command_name)
+        if not isinstance(collection, str):
+            collection = event.command.get("collection")
+
+        namespace = f"{event.database_name}.{collection}" if isinstance(collection, str) else event.database_name
+        bytes_out = len(bson.encode(event.command)) if self.track_bytes else 0
+        summary = event.command.get("filter", event.command.get("q")) if self.slow_query_ms is not None else None
+
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (namespace, bytes_out, summary)
+
+    def _finished(self, event, failed):
+        duration_ms = event.duration_micros / 1000.0
+        bytes_in = 0
+        if self.track_bytes and not failed:
+            bytes_in = len(bson.encode(event.reply))
+
+        with self._lock:
+            namespace, bytes_out, summary = self._pending.pop(
+                (event.connection_id, event.request_id), (event.database_name, 0, None))
+
+            stats = self._commands[event.command_name]
+            stats["count"] += 1
+            stats["failed"] += int(failed)
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            stats["histogram"][bisect.bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+            stats["bytes_out"] += bytes_out
+            stats["bytes_in"] += bytes_in
+
+            self._collections[namespace][event.command_name] += 1
+
+            slow = self.slow_query_ms is not None and duration_ms >= self.slow_query_ms
+            if slow:
+                self._slow_queries += 1
+
+        if slow and self.logger is not None:
+            self.logger.warning(
+                "Slow query: %s on %s took %.1f ms, filter: %s" % (event.command_name, namespace, duration_ms, summary))
+
+    def _pool_event(self, name):
+        with self._lock:
+            self._pool[name] += 1
+
+    def snapshot(self):
+        """
+        :return: commands (count, failed, mean_ms, max_ms, histogram, bytes_out, bytes_in per command name),
+                 collections (operation counts per namespace and command), pool event counters
+                 and the number of slow queries
+        :rtype: dict
+        """
+        with self._lock:
+            commands = {}
+            for name, stats in self._commands.items():
+                commands[name] = dict(stats, histogram=list(stats["histogram"]))
+                commands[name]["mean_ms"] = stats["total_ms"] / stats["count"] if stats["count"] else 0.0
+            return {
+                "buckets_ms": list(LATENCY_BUCKETS_MS),
+                "commands": commands,
+                "collections": {namespace: dict(counts) for namespace, counts in self._collections.items()},
+                "pool": dict(self._pool),
+                "slow_queries": self._slow_queries,
+            }
@@ -0,0 +1,140 @@
+# import built-ins
+import base64
+
+# import bson
+import bson
+
+
+def _covers(path, field):
+    """
+    :return: True if projecting 'path' projects 'field', eg: "stats" covers "stats.cpu"
+    :rtype: bool
+    """
+    return field == path or field.startswith(path + ".")
+
+
+def sort_value(document, sort_field):
+    """
+    :return: value of a dotted 'sort_field' in 'document', None if it is missing
+    """
+    value = document
+    for key in sort_field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def encode_token(sort_field, direction, document):
+    """
+    Build an opaque continuation token from the last document of a page
+
+    :param sort_field: field the pages are sorted on
+    :type sort_field: str
+
+    :param direction: 1 for ascending, -1 for descending
+    :type direction: int
+
+    :param document: last document of the page
+    :type document: dict
+
+    :return: url-safe continuation token
+    :rtype: str
+    """
+    state = {"f": sort_field, "d": direction, "id": document["_id"]}
+    if sort_field != "_id":
+        state["v"] = sort_value(document, sort_field)
+    return base64.urlsafe_b64encode(bson.encode(state)).decode("ascii")
+
+
+def decode_token(token, sort_field, direction):
+    """
+    Decode a continuation token, it must have been issued for the same sort
+
+    :return: decoded state with the last sort value and _id
+    :rtype: dict
+    """
+    try:
+        state = bson.decode(base64.urlsafe_b64decode(token.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"Invalid continuation token: {str(e)}")
+
+    if state["f"] != sort_field or state["d"] != direction:
+        raise ValueError(
+            f"Continuation token was issued for sort ({state['f']}, {state['d']}), not ({sort_field}, {direction})")
+    return state
+
+
+def keyset_query(query, sort_field, direction, state):
+    """
+    Add the range condition that starts a page right after the document in 'state'.
+    Sorting on a field other than _id uses _id as tie-breaker so pages never skip or repeat documents.
+
+    Null and missing values sort before every other value but range operators never match them,
+    so they get their own conditions.
+
+    :return: query for the next page
+    :rtype: dict
+    """
+    operator = "$gt" if direction == 1 else "$lt"
+
+    if sort_field == "_id":
+        condition = {"_id": {operator: state["id"]}}
+    elif state["v"] is None:
+        conditions = [{sort_field: None, "_id": {operator: state["id"]}}]
+        if direction == 1:
+            conditions.append({sort_field: {"$exists": True, "$ne": None}})
+        condition = {"$or": conditions}
+    else:
+        conditions = [
+            {sort_field: {operator: state["v"]}},
+            {sort_field: state["v"], "_id": {operator: state["id"]}},
+        ]
+        if direction == -1:
+            conditions.append({sort_field: None})
+        condition = {"$or": conditions}
+
+    if not query:
+        return condition
+    return {"$and": [query, condition]}
+
+
+def keyset_sort(sort_field, direction):
+    """
+    :return: sort parameters for keyset pagination on 'sort_field'
+    :rtype: list
+    """
+    if sort_field == "_id":
+        return [("_id", direction)]
+    return [(sort_field, direction), ("_id", direction)]
+
+
+def keyset_projection(projection, sort_field):
+    """
+    Make sure the projection returns _id and the sort field, they are needed to build the next token.
+    Exclusions of _id, of the sort field or of a document holding it are dropped, an inclusion projection
+    gets the sort field unless one of its paths already covers it.
+
+    :rtype: dict or None
+    """
+    if projection is None:
+        return projection
+
+    kept = {
+        key: value for key, value in projection.items()
+        if value or not (key == "_id" or _covers(key, sort_field))
+    }
+    if not kept and projection:
+        # pymongo turns an empty projection into {"_id": 1}, nothing is excluded anymore
+        return None
+    projection = kept
+
+    if sort_field == "_id":
+        return projection
+
+    included = [key for key, value in projection.items() if value and key != "_id"]
+    if included and not any(_covers(key, sort_field) for key in included):
+        # A parent path can't be projected next to its children
+        projection = {key: value for key, value in projection.items() if not _covers(sort_field, key)}
+        projection[sort_field] = 1
+    return projection
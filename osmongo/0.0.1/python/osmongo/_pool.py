@@ -0,0 +1,211 @@
+# import built-ins
+import os
+import atexit
+import threading
+
+# import pymongo
+import pymongo
+
+# import osmongo
+from ._health import HealthChecker
+
+
+class MongoClientRegistry:
+    """
+    Process-wide registry of pooled MongoClient objects, keyed by (connection_uri, server_timeout).
+
+    A MongoClient is thread-safe and keeps its own connection pool, so every MongoAPI
+    pointing at the same server can share one client instead of paying a TCP/TLS handshake
+    and a server selection round trip each time it is instantiated.
+
+    The registry is fork-safe, a child process (eg: farm workers) never reuses the parent's
+    clients, they are dropped and re-created lazily on first use in the child.
+
+    Every pooled client has a HealthChecker pinging its server in the background,
+    so callers can fail fast while the server is down. MongoAPI instances with a private client
+    share the checker of the pooled client of their server, see shared_health.
+
+    Example:
+        >>> client = MongoClientRegistry.get("mongodb://127.0.0.1:27017", 1000)
+        >>> MongoClientRegistry.stats()
+        >>> MongoClientRegistry.close_all()
+    """
+    _clients = {}
+    _health = {}
+    _health_options = {}
+    _lock = threading.RLock()
+    _pid = os.getpid()
+    _pool_options = {}
+    _hits = 0
+    _misses = 0
+
+    @classmethod
+    def configure(cls, max_pool_size=None, min_pool_size=None, wait_queue_timeout=None, max_idle_time=None,
+                  event_listeners=None):
+        """
+        Set the connection pool options used for every client created from now on.
+        Values of None are left to pymongo defaults.
+
+        :param max_pool_size: maximum number of connections per server
+        :type max_pool_size: int
+
+        :param min_pool_size: minimum number of connections kept open per server
+        :type min_pool_size: int
+
+        :param wait_queue_timeout: time in ms a thread waits for a free connection before erroring
+        :type wait_queue_timeout: int
+
+        :param max_idle_time: time in ms a connection can stay idle in the pool before being closed
+        :type max_idle_time: int
+
+        :param event_listeners: pymongo command, pool or server listeners registered on every client
+        :type event_listeners: list
+        """
+        options = {
+            "maxPoolSize": max_pool_size,
+            "minPoolSize": min_pool_size,
+            "waitQueueTimeoutMS": wait_queue_timeout,
+            "maxIdleTimeMS": max_idle_time,
+            "event_listeners": event_listeners,
+        }
+        with cls._lock:
+            cls._pool_options = {key: value for key, value in options.items() if value is not None}
+
+    @classmethod
+    def configure_health(cls, interval=None, backoff=None, max_backoff=None, recheck=None, on_change=None):
+        """
+        Set the HealthChecker options used for every client created from now on, see HealthChecker
+        """
+        options = {"interval": interval, "backoff": backoff, "max_backoff": max_backoff, "recheck": recheck,
+                   "on_change": on_change}
+        with cls._lock:
+            cls._health_options = {key: value for key, value in options.items() if value is not None}
+
+    @classmethod
+    def health_checker(cls, client, name):
+        """
+        Create and start a HealthChecker for 'client' with the configured options
+
+        :rtype: HealthChecker
+        """
+        return HealthChecker(client, name, **cls._health_options).start()
+
+    @classmethod
+    def _check_pid(cls):
+        """
+        Drop clients inherited from a parent process, pymongo clients are not fork-safe.
+        The inherited sockets are shared with the parent so they are discarded, not closed,
+        health checker threads don't survive a fork so they are dropped too.
+        """
+        pid = os.getpid()
+        if pid != cls._pid:
+            cls._clients = {}
+            cls._health = {}
+            cls._pid = pid
+
+    @classmethod
+    def get(cls, connection_uri, server_timeout, **kwargs):
+        """
+        Return the pooled MongoClient for (connection_uri, server_timeout), creating it if required.
+
+        :param connection_uri: MongoDB Server URI, eg: mongodb://127.0.0.1:27017
+        :type connection_uri: str
+
+        :param server_timeout: Server selection timeout value in ms
+        :type server_timeout: int
+
+        :return: shared client
+        :rtype: pymongo.MongoClient
+        """
+        key = (connection_uri, server_timeout)
+        with cls._lock:
+            cls._check_pid()
+            client = cls._clients.get(key)
+            if client is not None:
+                cls._hits += 1
+                return client
+
+            options = dict(cls._pool_options)
+            options.update(kwargs)
+            client = pymongo.MongoClient(connection_uri, serverSelectionTimeoutMS=server_timeout, **options)
+            cls._clients[key] = client
+            cls._health[key] = cls.health_checker(client, connection_uri)
+            cls._misses += 1
+            return client
+
+    @classmethod
+    def health(cls, connection_uri, server_timeout):
+        """
+        :return: the HealthChecker of the pooled client for (connection_uri, server_timeout), None if there is no client
+        :rtype: HealthChecker
+        """
+        with cls._lock:
+            cls._check_pid()
+            return cls._health.get((connection_uri, server_timeout))
+
+    @classmethod
+    def shared_health(cls, connection_uri, server_timeout):
+        """
+        Return the HealthChecker of (connection_uri, server_timeout) shared by every MongoAPI of this process,
+        pooled or not, so private clients don't start a health thread each. The checker pings the server
+        through the pooled client, which is created if required.
+
+        :rtype: HealthChecker
+        """
+        with cls._lock:
+            cls.get(connection_uri, server_timeout)
+            return cls._health[(connection_uri, server_timeout)]
+
+    @classmethod
+    def discard(cls, connection_uri, server_timeout):
+        """
+        Close and forget the client for (connection_uri, server_timeout)
+        """
+        key = (connection_uri, server_timeout)
+        with cls._lock:
+            cls._check_pid()
+            client = cls._clients.pop(key, None)
+            health = cls._health.pop(key, None)
+
+        if health is not None:
+            health.stop()
+
+        if client is not None:
+            client.close()
+
+    @classmethod
+    def close_all(cls):
+        """
+        Close every pooled client owned by this process
+        """
+        with cls._lock:
+            cls._check_pid()
+            clients = list(cls._clients.values())
+            checkers = list(cls._health.values())
+            cls._clients = {}
+            cls._health = {}
+
+        for health in checkers:
+            health.stop()
+        for client in clients:
+            client.close()
+
+    @classmethod
+    def stats(cls):
+        """
+        :return: number of pooled clients, cache hits and misses
+        :rtype: dict
+        """
+        with cls._lock:
+            return {"clients": len(cls._clients), "hits": cls._hits, "misses": cls._misses, "pid": cls._pid}
+
+
+def _reset_after_fork():
+    MongoClientRegistry._lock = threading.RLock()
+    MongoClientRegistry._check_pid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+atexit.register(MongoClientRegistry.close_all)
@@ -0,0 +1,140 @@
+# import built-ins
+import os
+import json
+import functools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# import osvfx
+from schema import validate as validate_schema
+
+# Module Constants
+PARALLEL_THRESHOLD = 5000
+CHUNK_SIZE = 1000
+
+# Process pools shared by every parallel validation of this process, one per number of workers, created on first use
+_executors = {}
+_executors_pid = os.getpid()
+_executor_lock = threading.Lock()
+
+
+class SchemaValidationError(Exception):
+    """
+    Raised when one or more documents of a batch fail schema validation.
+
+    Attributes:
+        errors (list): (index, message) for every failing document, index points into the batch
+    """
+    def __init__(self, errors):
+        self.errors = errors
+        message = "; ".join(f"document {index}: {error}" for index, error in errors[:10])
+        if len(errors) > 10:
+            message += f"; ... {len(errors) - 10} more"
+        super().__init__(f"{len(errors)} document(s) failed schema validation: {message}")
+
+
+@functools.lru_cache(maxsize=32)
+def _compile(schema_key):
+    """
+    Compile a JSON schema once per process, 'schema_key' is the canonical json of the schema
+    """
+    import jsonschema
+
+    schema = json.loads(schema_key)
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
+
+def compile_schema(schema):
+    """
+    Return a cached, compiled validator for a JSON schema dict
+
+    :param schema: JSON schema
+    :type schema: dict
+
+    :return: compiled validator
+    :rtype: jsonschema validator object
+    """
+    return _compile(json.dumps(schema, sort_keys=True))
+
+
+def _validate_chunk(documents, offset, schema_key):
+    """
+    Validate every document of a chunk exactly once
+
+    :return: (index, message) for every failing document
+    :rtype: list
+    """
+    errors = []
+    if schema_key is None:
+        for index, document in enumerate(documents, offset):
+            try:
+                validate_schema(document)
+            except Exception as e:
+                errors.append((index, str(e)))
+    else:
+        validator = _compile(schema_key)
+        for index, document in enumerate(documents, offset):
+            error = next(validator.iter_errors(document), None)
+            if error is not None:
+                errors.append((index, error.message))
+    return errors
+
+
+def _get_executor(workers):
+    """
+    Return the shared process pool of 'workers' processes, starting worker processes costs more than
+    validating a few thousand documents so they are reused across calls. Pools are never shut down
+    while the process runs, a call may still be submitting to a pool when another asks for a different
+    number of workers. Pools inherited from a parent process are dropped, not shut down.
+    """
+    global _executors, _executors_pid
+    with _executor_lock:
+        if _executors_pid != os.getpid():
+            _executors = {}
+            _executors_pid = os.getpid()
+        executor = _executors.get(workers)
+        if executor is None:
+            executor = _executors[workers] = ProcessPoolExecutor(max_workers=workers)
+        return executor
+
+
+def validate_documents(documents, schema=None, workers=None):
+    """
+    Validate a batch of documents, every document is checked exactly once.
+
+    If 'schema' is None the osvfx schema package validates the documents,
+    otherwise 'schema' is a JSON schema dict compiled once and cached.
+    Parallel validation is opt-in: with 'workers' > 1, batches larger than PARALLEL_THRESHOLD are split
+    in chunks and validated in a process pool shared by every call. Pickling the documents to the
+    workers costs about as much as validating simple schemas, only use it for expensive schemas
+    on machines with cpus to spare.
+
+    :param documents: documents to validate
+    :type documents: list
+
+    :param schema: JSON schema, eg: the same dict given to MongoAPI.set_server_validator
+    :type schema: dict
+
+    :param workers: number of worker processes for large batches, defaults to validating in this process
+    :type workers: int
+
+    :raises SchemaValidationError: with the index of every failing document
+    """
+    schema_key = None if schema is None else json.dumps(schema, sort_keys=True)
+
+    if not workers or workers <= 1 or len(documents) < PARALLEL_THRESHOLD:
+        errors = _validate_chunk(documents, 0, schema_key)
+    else:
+        errors = []
+        executor = _get_executor(workers)
+        futures = [
+            executor.submit(_validate_chunk, documents[offset:offset + CHUNK_SIZE], offset, schema_key)
+            for offset in range(0, len(documents), CHUNK_SIZE)
+        ]
+        for future in futures:
+            errors.extend(future.result())
+
+    if errors:
+        raise SchemaValidationError(errors)
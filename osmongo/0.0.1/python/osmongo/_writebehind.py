@@ -0,0 +1,188 @@
+# import built-ins
+import time
+import queue
+import logging
+import weakref
+import threading
+from concurrent.futures import Future
+
+# import pymongo
+from pymongo.errors import BulkWriteError, WriteError
+
+# Module Constants
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """
+    Background buffer coalescing single document inserts from any thread into insert_many batches.
+
+    A batch is flushed as soon as it holds 'max_batch_size' documents or its oldest document
+    has waited 'max_latency' seconds. Each submitted document gets a Future resolved with its
+    inserted _id, or with the error the server reported for that document. A document whose
+    Future is cancelled before its batch is flushed is not inserted.
+
+    The queue is flushed when closed, when it is garbage collected and at interpreter exit,
+    the worker thread doesn't hold the queue so it never keeps it alive.
+
+    Example:
+        >>> write_behind = WriteBehindQueue(max_batch_size=500, max_latency=0.05)
+        >>> future = write_behind.submit(collection, {"code": "bbx"})
+        >>> inserted_id = future.result()
+        >>> write_behind.close()
+    """
+    def __init__(self, max_batch_size=500, max_latency=0.05, on_flush=None):
+        """
+        :param max_batch_size: maximum number of documents per insert_many
+        :type max_batch_size: int
+
+        :param max_latency: maximum time in seconds a document waits before being flushed
+        :type max_latency: float
+
+        :param on_flush: called with (collection, inserted count, failed count) after every flush
+        :type on_flush: callable
+        """
+        assert isinstance(max_batch_size, int) and max_batch_size > 0, "`max_batch_size` must be a positive <int>"
+        self._worker = _Worker(max_batch_size, max_latency, on_flush)
+        self._finalize = weakref.finalize(self, self._worker.close)
+
+    @property
+    def max_batch_size(self):
+        return self._worker.max_batch_size
+
+    @property
+    def max_latency(self):
+        return self._worker.max_latency
+
+    @property
+    def closed(self):
+        return self._worker.closed
+
+    def submit(self, collection, document):
+        """
+        Queue a document to be inserted in 'collection'
+
+        :return: Future resolved with the inserted _id
+        :rtype: concurrent.futures.Future
+        """
+        return self._worker.submit(collection, document)
+
+    def close(self, timeout=None):
+        """
+        Stop accepting documents, flush everything still queued and wait for the worker to finish
+        """
+        self._finalize.detach()
+        self._worker.close(timeout)
+
+
+class _Worker:
+    """
+    Queue and thread of a WriteBehindQueue
+    """
+    def __init__(self, max_batch_size, max_latency, on_flush):
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.on_flush = on_flush
+        self.closed = False
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, collection, document):
+        future = Future()
+        with self._lock:
+            if self.closed:
+                raise RuntimeError("WriteBehindQueue is closed, can't insert more documents")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="osmongo-write-behind", daemon=True)
+                self._thread.start()
+            self._queue.put((collection, document, future))
+        return future
+
+    def close(self, timeout=None):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            thread = self._thread
+            self._queue.put(_STOP)
+
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._flush(batch)
+
+        # Drain anything queued before close was called
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        for offset in range(0, len(batch), self.max_batch_size):
+            self._flush(batch[offset:offset + self.max_batch_size])
+
+    def _flush(self, batch):
+        """
+        Insert a batch, one insert_many per collection, and resolve the futures
+        """
+        groups = {}
+        for collection, document, future in batch:
+            # Cancelled futures are dropped, the others can't be cancelled anymore
+            if not future.set_running_or_notify_cancel():
+                continue
+            groups.setdefault(collection.full_name, (collection, []))[1].append((document, future))
+
+        for collection, items in groups.values():
+            documents = [document for document, _ in items]
+            errors = {}
+            try:
+                collection.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                errors = {error["index"]: error for error in e.details.get("writeErrors", [])}
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                self._notify(collection, 0, len(items))
+                continue
+
+            for index, (document, future) in enumerate(items):
+                if index in errors:
+                    error = errors[index]
+                    future.set_exception(WriteError(error.get("errmsg"), error.get("code"), error))
+                else:
+                    future.set_result(document["_id"])
+            self._notify(collection, len(items) - len(errors), len(errors))
+
+    def _notify(self, collection, inserted, failed):
+        if self.on_flush is None:
+            return
+        try:
+            self.on_flush(collection, inserted, failed)
+        except Exception:
+            logging.getLogger("OSMongo").exception("Write-behind flush callback failed")
@@ -0,0 +1,314 @@
+# import built-ins
+import os
+import gzip
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# import pymongo
+import bson
+from bson import json_util
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import BulkWriteError
+
+# import osmongo
+from .osmongo import OSMongo, MongoAPI
+
+# Module Constants
+MANIFEST = "manifest.json"
+FORMATS = ("ndjson", "bson")
+SAMPLES_PER_RANGE = 32
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS
+
+
+def split_ranges(collection, ranges):
+    """
+    Split a collection into about 'ranges' _id ranges of similar size using a $sample of _ids.
+    The server sorts the sample in BSON order, so bounds of mixed _id types keep the ranges contiguous
+    when they are read in _id index order, see range_cursor.
+
+    :return: list of (lower, upper) bounds, None means unbounded
+    :rtype: list
+    """
+    count = collection.estimated_document_count()
+    if ranges <= 1 or count < ranges * SAMPLES_PER_RANGE:
+        return [(None, None)]
+
+    pipeline = [
+        {"$sample": {"size": ranges * SAMPLES_PER_RANGE}},
+        {"$project": {"_id": 1}},
+        {"$sort": {"_id": 1}},
+    ]
+    sample = [document["_id"] for document in collection.aggregate(pipeline, allowDiskUse=True)]
+
+    bounds = []
+    for index in range(1, ranges):
+        bound = sample[index * len(sample) // ranges]
+        if not bounds or bound != bounds[-1]:
+            bounds.append(bound)
+
+    lowers = [None] + bounds
+    uppers = bounds + [None]
+    return list(zip(lowers, uppers))
+
+
+def range_cursor(collection, lower, upper, batch_size=1000):
+    """
+    Cursor over lower <= _id < upper in _id index order.
+
+    Index bounds (min/max) are used instead of {"_id": {"$gte": lower, "$lt": upper}}, as range operators
+    only match _ids of the same BSON type as the bound and would skip documents with other _id types.
+
+    :rtype: pymongo.cursor.Cursor
+    """
+    cursor = collection.find(batch_size=batch_size).hint([("_id", 1)])
+    if lower is not None:
+        cursor = cursor.min([("_id", lower)])
+    if upper is not None:
+        cursor = cursor.max([("_id", upper)])
+    return cursor
+
+
+def _process_pool(workers):
+    """
+    Worker processes are spawned, not forked, so they don't inherit the pooled client and health thread.
+    Each worker reuses one pooled client and health checker for every range or file it processes.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _open(path, mode, compress):
+    return gzip.open(path, mode, compresslevel=6) if compress else open(path, mode)
+
+
+def _dump_range(connection_uri, database_name, collection_name, lower, upper, path, file_format, compress):
+    """
+    Stream one _id range of a collection to 'path', runs in a worker process
+
+    :return: (path, number of documents written)
+    :rtype: tuple
+    """
+    mongo = MongoAPI(connection_uri, database_name=database_name)
+    codec_options = RAW_CODEC_OPTIONS if file_format == "bson" else None
+    collection = mongo.database.get_collection(collection_name, codec_options=codec_options)
+
+    written = 0
+    with _open(path, "wb", compress) as output:
+        for document in range_cursor(collection, lower, upper):
+            if file_format == "bson":
+                output.write(document.raw)
+            else:
+                output.write(json_util.dumps(document, json_options=JSON_OPTIONS).encode("utf-8"))
+                output.write(b"\n")
+            written += 1
+
+    mongo.disconnect()
+    return path, written
+
+
+def _read_file(path, file_format, compress):
+    """
+    :return: generator of documents stored in 'path'
+    :rtype: generator
+    """
+    with _open(path, "rb", compress) as source:
+        if file_format == "bson":
+            for document in bson.decode_file_iter(source, codec_options=RAW_CODEC_OPTIONS):
+                yield document
+        else:
+            for line in source:
+                if line.strip():
+                    yield json_util.loads(line, json_options=JSON_OPTIONS)
+
+
+def _restore_file(connection_uri, database_name, collection_name, path, file_format, compress, batch_size):
+    """
+    Insert every document of a dump file with unordered insert_many batches, runs in a worker process
+
+    :return: (path, inserted, failed)
+    :rtype: tuple
+    """
+    mongo = MongoAPI(connection_uri, database_name=database_name)
+    collection = mongo.database[collection_name]
+
+    inserted = failed = 0
+    batch = []
+
+    def flush():
+        try:
+            return len(collection.insert_many(batch, ordered=False).inserted_ids), 0
+        except BulkWriteError as e:
+            errors = len(e.details.get("writeErrors", []))
+            return e.details.get("nInserted", 0), errors
+
+    for document in _read_file(path, file_format, compress):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            counts = flush()
+            inserted, failed = inserted + counts[0], failed + counts[1]
+            batch = []
+    if batch:
+        counts = flush()
+        inserted, failed = inserted + counts[0], failed + counts[1]
+
+    mongo.disconnect()
+    return path, inserted, failed
+
+
+def dump(output_dir, connection_uri=None, database_name=None, collections=None, workers=None, ranges=None,
+         file_format="ndjson", compress=True):
+    """
+    Dump collections to 'output_dir', each collection is split into _id ranges which are
+    streamed in parallel worker processes, one file per range, and a manifest is written last.
+    The dumped count of each collection is checked against the count of its metadata,
+    estimated_document_count, so no collection is scanned just to be counted.
+
+    :param output_dir: directory to write the dump to, created if required
+    :type output_dir: str
+
+    :param collections: names of the collections to dump, defaults to every collection
+    :type collections: list
+
+    :param workers: number of worker processes, defaults to the number of cpus
+    :type workers: int
+
+    :param ranges: number of _id ranges per collection, defaults to twice the number of workers
+    :type ranges: int
+
+    :param file_format: "ndjson" for canonical extended json lines, "bson" for raw bson documents
+    :type file_format: str
+
+    :param compress: gzip the files
+    :type compress: bool
+
+    :return: manifest of the dump
+    :rtype: dict
+
+    Example:
+        from osmongo.backup import dump
+        dump("/dd/backups/bbx", database_name="bbx", file_format="bson")
+    """
+    assert file_format in FORMATS, f"`file_format` must be one of {FORMATS}"
+    workers = workers or os.cpu_count()
+    ranges = ranges or workers * 2
+
+    mongo = MongoAPI(connection_uri, database_name=database_name)
+    database = mongo.database
+    collections = collections or database.list_collection_names(filter={"type": "collection"})
+    os.makedirs(output_dir, exist_ok=True)
+
+    extension = ("." + file_format) + (".gz" if compress else "")
+    manifest = {"database": mongo.database_name, "format": file_format, "compress": compress, "collections": {}}
+    start = time.time()
+
+    with _process_pool(workers) as executor:
+        futures = {}
+        for collection_name in collections:
+            collection = database[collection_name]
+            manifest["collections"][collection_name] = {
+                "expected": collection.estimated_document_count(),
+                "indexes": [
+                    {"keys": [list(key) for key in info["key"]],
+                     **{option: value for option, value in info.items() if option not in ("key", "v", "ns")}}
+                    for name, info in collection.index_information().items() if name != "_id_"
+                ],
+                "files": [],
+            }
+            for part, (lower, upper) in enumerate(split_ranges(collection, ranges)):
+                path = os.path.join(output_dir, "%s.part%04d%s" % (collection_name, part, extension))
+                future = executor.submit(
+                    _dump_range, mongo.connection_uri, mongo.database_name, collection_name,
+                    lower, upper, path, file_format, compress)
+                futures[future] = collection_name
+
+        for future in as_completed(futures):
+            path, written = future.result()
+            manifest["collections"][futures[future]]["files"].append({"path": os.path.basename(path), "count": written})
+
+    for collection_name, entry in manifest["collections"].items():
+        entry["count"] = sum(item["count"] for item in entry["files"])
+        if entry["count"] != entry["expected"]:
+            OSMongo.warning(f"Dumped {entry['count']} document(s) from {collection_name} but its metadata counts "
+                            f"{entry['expected']}, it was modified during the dump or documents were missed")
+
+    with open(os.path.join(output_dir, MANIFEST), "w") as manifest_file:
+        manifest_file.write(json_util.dumps(manifest, json_options=JSON_OPTIONS, indent=4))
+
+    total = sum(entry["count"] for entry in manifest["collections"].values())
+    OSMongo.info("Dumped %d document(s) from %d collection(s) in %.1f s" % (total, len(collections), time.time() - start))
+    mongo.disconnect()
+    return manifest
+
+
+def restore(input_dir, connection_uri=None, database_name=None, collections=None, workers=None, batch_size=1000,
+            drop=False):
+    """
+    Restore a dump written by 'dump', files are inserted in parallel worker processes with
+    unordered insert_many batches, indexes are created after the data.
+
+    :param input_dir: directory with the dump and its manifest
+    :type input_dir: str
+
+    :param database_name: database to restore to, defaults to the dumped database
+    :type database_name: str
+
+    :param collections: names of the collections to restore, defaults to every dumped collection
+    :type collections: list
+
+    :param workers: number of worker processes, defaults to the number of cpus
+    :type workers: int
+
+    :param batch_size: number of documents per insert_many
+    :type batch_size: int
+
+    :param drop: drop each collection before restoring it
+    :type drop: bool
+
+    :return: inserted and failed document counts per collection
+    :rtype: dict
+
+    Example:
+        from osmongo.backup import restore
+        restore("/dd/backups/bbx", database_name="bbx_migrated", drop=True)
+    """
+    with open(os.path.join(input_dir, MANIFEST)) as manifest_file:
+        manifest = json_util.loads(manifest_file.read(), json_options=JSON_OPTIONS)
+
+    mongo = MongoAPI(connection_uri, database_name=database_name or manifest["database"])
+    database = mongo.database
+    collections = collections or list(manifest["collections"])
+    results = {name: {"inserted": 0, "failed": 0} for name in collections}
+    start = time.time()
+
+    if drop:
+        for collection_name in collections:
+            database.drop_collection(collection_name)
+
+    with _process_pool(workers or os.cpu_count()) as executor:
+        futures = {}
+        for collection_name in collections:
+            for item in manifest["collections"][collection_name]["files"]:
+                future = executor.submit(
+                    _restore_file, mongo.connection_uri, mongo.database_name, collection_name,
+                    os.path.join(input_dir, item["path"]), manifest["format"], manifest["compress"], batch_size)
+                futures[future] = collection_name
+
+        for future in as_completed(futures):
+            _, inserted, failed = future.result()
+            results[futures[future]]["inserted"] += inserted
+            results[futures[future]]["failed"] += failed
+
+    for collection_name in collections:
+        specs = manifest["collections"][collection_name]["indexes"]
+        if specs:
+            mongo.ensure_indexes({collection_name: specs})
+
+    total = sum(result["inserted"] for result in results.values())
+    OSMongo.info("Restored %d document(s) into %d collection(s) in %.1f s" % (total, len(collections), time.time() - start))
+    for collection_name, result in results.items():
+        if result["failed"]:
+            OSMongo.error(f"{result['failed']} document(s) failed to restore into {collection_name}")
+    mongo.disconnect()
+    return results
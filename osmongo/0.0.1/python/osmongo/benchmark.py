@@ -0,0 +1,283 @@
+"""
+Benchmarks for osmongo, run against a local mongod.
+
+Usage:
+    python -m osmongo.benchmark pool --iterations 1000
+    python -m osmongo.benchmark paging --documents 500000 --page-size 100
+    python -m osmongo.benchmark async --queries 5000
+    python -m osmongo.benchmark raw --documents 200000
+    python -m osmongo.benchmark contention --jobs 5000 --workers 16
+"""
+# import built-ins
+import io
+import time
+import tracemalloc
+import asyncio
+import argparse
+import statistics
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+# import pymongo
+import bson
+
+# import osmongo
+from .osmongo import MongoAPI
+from ._pool import MongoClientRegistry
+from ._aio import AsyncMongoAPI
+
+BENCHMARK_DATABASE = "osmongo_benchmark"
+
+
+def _report(name, timings):
+    """
+    Print mean, median and p99 latency for a list of timings in seconds
+    """
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print("{:<24} n={:<8} mean={:.3f}ms  median={:.3f}ms  p99={:.3f}ms  total={:.3f}s".format(
+        name, len(timings), statistics.mean(timings) * 1000, statistics.median(timings) * 1000,
+        p99 * 1000, sum(timings)))
+
+
+def bench_pool(connection_uri, iterations):
+    """
+    Per-call latency of short-lived MongoAPI users, each creating a MongoAPI, running one
+    find_one and disconnecting, with a private client (before) and a pooled client (after).
+    """
+    for pooled in (False, True):
+        MongoClientRegistry.close_all()
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            mongo = MongoAPI(connection_uri, database_name=BENCHMARK_DATABASE, pooled=pooled)
+            mongo.find_one(mongo.database["pool"], {"_id": 0})
+            mongo.disconnect()
+            timings.append(time.perf_counter() - start)
+        _report("pooled" if pooled else "private client", timings)
+
+
+def _fill(collection, documents, make_document, batch_size=10000):
+    """
+    Drop 'collection' and insert 'documents' generated documents in batches
+    """
+    collection.drop()
+    for offset in range(0, documents, batch_size):
+        batch = [make_document(index) for index in range(offset, min(offset + batch_size, documents))]
+        collection.insert_many(batch, ordered=False)
+
+
+def bench_paging(connection_uri, documents, page_size, samples):
+    """
+    Page through 'documents' publish-like documents sorted on _id with keyset pagination (every page)
+    and with skip/limit (sampled pages), latency is reported per depth decile.
+    """
+    mongo = MongoAPI(connection_uri, database_name=BENCHMARK_DATABASE)
+    collection = mongo.database["paging"]
+    _fill(collection, documents, lambda index: {"_id": index, "shot": "%04d" % (index % 1000), "version": index})
+
+    pages = (documents + page_size - 1) // page_size
+
+    keyset_timings = [[] for _ in range(10)]
+    token = None
+    for page in range(pages):
+        start = time.perf_counter()
+        _, token = mongo.find_page(collection, page_size=page_size, token=token)
+        keyset_timings[min(9, page * 10 // pages)].append(time.perf_counter() - start)
+        if token is None:
+            break
+
+    skip_timings = [[] for _ in range(10)]
+    for decile in range(10):
+        for sample in range(samples):
+            page = min(pages - 1, decile * pages // 10 + sample)
+            start = time.perf_counter()
+            list(collection.find().sort([("_id", 1)]).skip(page * page_size).limit(page_size))
+            skip_timings[decile].append(time.perf_counter() - start)
+
+    for decile in range(10):
+        _report("keyset depth %d0%%" % decile, keyset_timings[decile])
+        _report("skip   depth %d0%%" % decile, skip_timings[decile])
+
+    collection.drop()
+    mongo.disconnect()
+
+
+def bench_async(connection_uri, queries):
+    """
+    Run 'queries' find_one calls in flight at once, with MongoAPI wrapped in run_in_executor
+    (concurrency capped by the default thread pool) and with AsyncMongoAPI.
+    """
+    mongo = MongoAPI(connection_uri, database_name=BENCHMARK_DATABASE)
+    collection = mongo.database["async"]
+    _fill(collection, 10000, lambda index: {"_id": index, "code": "asset_%05d" % index})
+
+    async def executor_queries():
+        loop = asyncio.get_running_loop()
+
+        async def query(index):
+            start = time.perf_counter()
+            await loop.run_in_executor(None, mongo.find_one, collection, {"_id": index % 10000})
+            return time.perf_counter() - start
+
+        return await asyncio.gather(*[query(index) for index in range(queries)])
+
+    async def async_queries():
+        async_mongo = AsyncMongoAPI(connection_uri, database_name=BENCHMARK_DATABASE)
+        async_collection = async_mongo.database["async"]
+
+        async def query(index):
+            start = time.perf_counter()
+            await async_mongo.find_one(async_collection, {"_id": index % 10000})
+            return time.perf_counter() - start
+
+        timings = await asyncio.gather(*[query(index) for index in range(queries)])
+        await async_mongo.disconnect()
+        return timings
+
+    for name, run in (("run_in_executor", executor_queries), ("AsyncMongoAPI", async_queries)):
+        start = time.perf_counter()
+        timings = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+        _report(name, list(timings))
+        print("{:<24} throughput={:.0f} queries/s".format(name, queries / elapsed))
+
+    collection.drop()
+    mongo.disconnect()
+
+
+def bench_raw(connection_uri, documents):
+    """
+    Forward 'documents' render-stat-like documents to an in-memory buffer, decoding them into dicts
+    and re-encoding them (before) vs writing their raw BSON bytes (after), reports CPU time and peak memory.
+    """
+    mongo = MongoAPI(connection_uri, database_name=BENCHMARK_DATABASE)
+    collection = mongo.database["raw"]
+    _fill(collection, documents, lambda index: {
+        "_id": index,
+        "shot": "%04d" % (index % 1000),
+        "frames": list(range(100)),
+        "stats": {"cpu": index * 0.5, "memory": index * 2, "host": "render%03d" % (index % 300)},
+    })
+
+    def decoded():
+        output = io.BytesIO()
+        for document in mongo.find(collection, sort=[("_id", 1)]):
+            output.write(bson.encode(document))
+        return output.tell()
+
+    def raw():
+        output = io.BytesIO()
+        mongo.write_raw(collection, output)
+        return output.tell()
+
+    for name, run in (("decode + encode", decoded), ("raw bson", raw)):
+        tracemalloc.start()
+        start_cpu, start = time.process_time(), time.perf_counter()
+        size = run()
+        cpu, elapsed = time.process_time() - start_cpu, time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("{:<24} bytes={:<12} cpu={:.3f}s  wall={:.3f}s  peak python memory={:.1f}MB".format(
+            name, size, cpu, elapsed, peak / 1024.0 / 1024.0))
+
+    collection.drop()
+    mongo.disconnect()
+
+
+def bench_contention(connection_uri, jobs, workers):
+    """
+    'workers' threads drain a queue of 'jobs' jobs, with find_one followed by update_one (before)
+    and with the single round trip claim_next (after), reports throughput and jobs claimed more than once.
+    """
+    mongo = MongoAPI(connection_uri, database_name=BENCHMARK_DATABASE)
+    collection = mongo.database["contention"]
+
+    def read_modify_write(worker):
+        job = collection.find_one({"status": "queued"}, sort=[("_id", 1)])
+        if job is None:
+            return None
+        collection.update_one({"_id": job["_id"]}, {"$set": {"status": "claimed", "claimed_by": worker}})
+        return job
+
+    def claim_next(worker):
+        return mongo.claim_next(collection, worker=worker)
+
+    for name, claim in (("find_one + update_one", read_modify_write), ("claim_next", claim_next)):
+        _fill(collection, jobs, lambda index: {"_id": index, "status": "queued"})
+        claims = collections.Counter()
+        lock = threading.Lock()
+
+        def drain(worker):
+            timings = []
+            while True:
+                start = time.perf_counter()
+                job = claim(worker)
+                timings.append(time.perf_counter() - start)
+                if job is None:
+                    return timings
+                with lock:
+                    claims[job["_id"]] += 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            timings = [timing for result in executor.map(drain, ["worker%02d" % index for index in range(workers)])
+                       for timing in result]
+        elapsed = time.perf_counter() - start
+
+        _report(name, timings)
+        duplicates = sum(count - 1 for count in claims.values() if count > 1)
+        print("{:<24} throughput={:.0f} jobs/s  claimed={}  duplicate claims={}".format(
+            name, len(claims) / elapsed, len(claims), duplicates))
+
+    collection.drop()
+    mongo.disconnect()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="osmongo benchmarks")
+    parser.add_argument("--uri", default="mongodb://127.0.0.1:27017", help="MongoDB Server URI")
+
+    subparsers = parser.add_subparsers(title="Benchmarks", dest="benchmark")
+
+    pool_parser = subparsers.add_parser("pool", help="Short-lived MongoAPI users, private vs pooled client")
+    pool_parser.add_argument("--iterations", default=1000, type=int, help="Number of MongoAPI users")
+    pool_parser.set_defaults(func=bench_pool)
+
+    paging_parser = subparsers.add_parser("paging", help="Keyset pagination vs skip/limit paging")
+    paging_parser.add_argument("--documents", default=500000, type=int, help="Number of documents to page through")
+    paging_parser.add_argument("--page-size", default=100, type=int, help="Documents per page")
+    paging_parser.add_argument("--samples", default=20, type=int, help="Skip/limit pages timed per depth decile")
+    paging_parser.set_defaults(func=bench_paging)
+
+    async_parser = subparsers.add_parser("async", help="Concurrent queries, run_in_executor vs AsyncMongoAPI")
+    async_parser.add_argument("--queries", default=5000, type=int, help="Number of queries in flight")
+    async_parser.set_defaults(func=bench_async)
+
+    raw_parser = subparsers.add_parser("raw", help="Forwarding documents, decoded dicts vs raw BSON")
+    raw_parser.add_argument("--documents", default=200000, type=int, help="Number of documents to forward")
+    raw_parser.set_defaults(func=bench_raw)
+
+    contention_parser = subparsers.add_parser("contention", help="Work queue claims, find_one + update_one vs claim_next")
+    contention_parser.add_argument("--jobs", default=5000, type=int, help="Number of queued jobs")
+    contention_parser.add_argument("--workers", default=16, type=int, help="Number of concurrent workers")
+    contention_parser.set_defaults(func=bench_contention)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    if not args.benchmark:
+        print("Please choose a benchmark, use --help for the available benchmarks")
+        return
+
+    benchmark_args = vars(args)
+    benchmark_func = benchmark_args.pop("func")
+    del benchmark_args["benchmark"]
+    benchmark_func(benchmark_args.pop("uri"), **benchmark_args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,48 @@
 # import built-ins
-import time
+import os
+import socket
 import logging
+import functools
+import itertools
+import weakref
 
 # import pymongo
 import pymongo
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, PyMongoError
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
 
 # import osvfx
 from logger import Logger
 from preferences import Preference
 from schema import validate as validate_schema
 
+# import osmongo
+from ._pool import MongoClientRegistry
+from . import _bulk
+from ._validation import validate_documents
+from . import _paging
+from ._cache import QueryCache
+from ._writebehind import WriteBehindQueue
+from ._loader import DocumentLoader
+from . import _indexes
+from ._metrics import CommandMetrics
+from ._fanout import fan_out
+from . import _atomic
+from ._blobs import BlobStore
+from ._capture import WorkloadRecorder, captured
+
 # Module Constants
 MONGO_PREFERENCES = Preference("mongo_preferences.yaml")
 DATABASE = MONGO_PREFERENCES["database"]
 TIMEOUT = MONGO_PREFERENCES["timeout"]
 MONGO_URI = MONGO_PREFERENCES["mongo_uri"]
+POOL_SETTINGS = MONGO_PREFERENCES["pool"] or {}
+INDEXES = MONGO_PREFERENCES["indexes"] or {}
+METRICS_SETTINGS = MONGO_PREFERENCES["metrics"] or {}
+HEALTH_SETTINGS = MONGO_PREFERENCES["health"] or {}
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
 
 # Initiate Logger
 class OSMongo(Logger):
@@ -22,6 +50,102 @@ class OSMongo(Logger):
     DEFAULT_LEVEL = logging.INFO
     PROPAGATE_DEFAULT = False
 
+# Command and connection pool metrics of every client created by MongoAPI in this process
+METRICS = CommandMetrics(
+    slow_query_ms=METRICS_SETTINGS.get("slow_query_ms"),
+    track_bytes=METRICS_SETTINGS.get("track_bytes", False),
+    logger=OSMongo,
+)
+
+# Connection pool settings shared by every pooled client in this process
+MongoClientRegistry.configure(
+    max_pool_size=POOL_SETTINGS.get("max_pool_size"),
+    min_pool_size=POOL_SETTINGS.get("min_pool_size"),
+    wait_queue_timeout=POOL_SETTINGS.get("wait_queue_timeout"),
+    max_idle_time=POOL_SETTINGS.get("max_idle_time"),
+    event_listeners=METRICS.listeners(),
+)
+
+def _log_health_change(health):
+    if health.available:
+        OSMongo.log(20, "Connected to %s, delay %.3f s" % (health.name, health.latency))
+    else:
+        OSMongo.error(f"Lost connection to {health.name}, retrying with backoff: {str(health.last_error)}")
+
+# Background health checks of every pooled client in this process
+MongoClientRegistry.configure_health(
+    interval=HEALTH_SETTINGS.get("interval"),
+    backoff=HEALTH_SETTINGS.get("backoff"),
+    max_backoff=HEALTH_SETTINGS.get("max_backoff"),
+    recheck=HEALTH_SETTINGS.get("recheck"),
+    on_change=_log_health_change,
+)
+
+def _on_write_behind_flush(cache, collection, inserted, failed):
+    """
+    Invalidate the cached find_one results of a collection flushed by a write-behind queue and log the flush.
+    It is given the cache, not the MongoAPI, so the queue never keeps its MongoAPI alive.
+    """
+    if cache is not None:
+        cache.invalidate(collection)
+    if failed:
+        OSMongo.error(f"Write-behind failed to insert {failed} document(s) into {collection.full_name}")
+    if inserted:
+        OSMongo.info(f"Successfully inserted {inserted} document(s) into {collection.full_name}")
+
+def _check_document(data):
+    assert isinstance(data, dict), "data must be of type <dict>"
+
+def _check_documents(data):
+    assert isinstance(data, list), "`items` must be of type <list>"
+    for item in data:
+        assert isinstance(item, dict), "`item` must be of type <dict>"
+
+def _check_query(query, projection=None):
+    assert isinstance(query, dict), "`query` must be <dict>"
+    if projection is not None:
+        assert isinstance(projection, dict), "`projection` must be <dict>"
+
+def _check_sort(sort):
+    assert isinstance(sort, list), "`sort` must be <list> of <tuple> like [(field, direction)], 1 for ascending, -1 for decending eg[('_id', 1)]"
+    for item in sort:
+        assert isinstance(item, tuple), "`sort item` must be of type <tuple>"
+
+def _inserted(inserted):
+    """
+    Log and return the inserted id(s) of insert_one or insert_many, shared with AsyncMongoAPI
+    """
+    if inserted:
+        OSMongo.info(f"Successfully inserted: {inserted}")
+        return inserted
+    OSMongo.error("Something went wrong when inserting data")
+
+def _written(result, message, action):
+    """
+    Log and return the result of update_one, replace_one or delete_one, shared with AsyncMongoAPI
+    """
+    if result:
+        OSMongo.info(message)
+        return result
+    OSMongo.error(f"Something went wrong when {action} data")
+
+def _group_count_stages(group_by, query=None, limit=None):
+    """
+    :return: aggregation stages counting documents per value of 'group_by', most frequent first
+    :rtype: list
+    """
+    if isinstance(group_by, str):
+        group_id = f"${group_by}"
+    else:
+        group_id = {field.replace(".", "_"): f"${field}" for field in group_by}
+
+    stages = [{"$match": query}] if query else []
+    stages.append({"$group": {"_id": group_id, "count": {"$sum": 1}}})
+    stages.append({"$sort": {"count": -1}})
+    if limit:
+        stages.append({"$limit": limit})
+    return stages
+
 class MongoAPI:
     """
     A class for performing operations using PyMongo, the official Python driver for MongoDB.
@@ -31,31 +155,77 @@ class MongoAPI:
             A flag indicating whether PyMongo is connected in the current environment.
             It is set to True if PyMongo is connected, otherwise, it remains False.
             This attribute is used to check the availability of PyMongo functionalities.
+            The connection is opened lazily, on first access to 'database'.
 
         _client (MongoClient or None):
             The MongoClient object representing the connection to the MongoDB server.
             It is set to None if the connection has not been established yet.
             The connection is initialized using the '_connect' method
+            When 'pooled' is True this client is shared with every other pooled MongoAPI
+            using the same connection_uri and server_timeout, see MongoClientRegistry.
+            A client inherited from a parent process is dropped and reconnected on next use.
 
-        database (str or None):
-            The name of the MongoDB database with which the class is currently working.
-            It is set to None initially and gets assigned when a valid database is selected.
+        database (pymongo database object):
+            The MongoDB database with which the class is currently working.
+            Accessing it connects to the server if required, it raises ServerUnavailableError
+            straight away if the background health checker knows the server is down.
+
+        health (HealthChecker or None):
+            Background checker tracking the availability of the server, with exponential backoff and jitter.
+
+        cache (QueryCache or None):
+            Opt-in read-through cache for find_one, writes made through this class invalidate it.
+
+        write_behind (WriteBehindQueue or None):
+            Opt-in background queue coalescing insert_one calls into insert_many batches.
 
     Methods:
-        __init__(self, connection_uri=None, timeout=None, database_name=None)
+        __init__(self, connection_uri=None, timeout=None, database_name=None, pooled=True, cache=None, write_behind=None)
         _connect(self)
         disconnect(self)
         insert_one(self, collection, document)
         insert_many(self, collection, documents)
-        find(self, collection_name, query=None, projection=None, limit=0)
-        find_one(self, collection, query=None, projection=None)
+        find(self, collection_name, query=None, projection=None, limit=0, raw=False)
+        find_one(self, collection, query=None, projection=None, raw=False)
+        write_raw(self, collection, output, query=None, projection=None, sort=None, batch_size=1000)
+        find_columns(self, collection, query, fields, dtypes=None, batch_size=10000, sort=None)
+        loader(self, collection, key="_id", projection=None, window=0.005, max_batch_size=1000)
+        blobs(self, bucket_name="blobs", chunk_size=1048576, workers=4)
+        start_capture(cls, path)
+        stop_capture(cls)
+        iter_batches(self, collection, query=None, projection=None, batch_size=1000, sort=None, cursor_batch_size=None)
+        find_page(self, collection, query=None, projection=None, page_size=100, sort_field="_id", direction=1, token=None)
         update_one(self, collection, query, data)
         replace_one(self, collection, query, data)
         delete_one(self, collection)
-        delete_many(self, collection)
-        count(self, collection, query)
+        update_many(self, collection, query, data)
+        delete_many(self, collection, query)
+        bulk_write(self, collection, operations, ordered=True, batch_size=None)
+        set_server_validator(self, collection, schema, level="strict", action="error")
+        ensure_indexes(self, specs=None)
+        advise_indexes(self, limit=None)
+        count(self, collection, query, exact=True)
+        aggregate(self, collection, pipeline, allow_disk_use=True, batch_size=1000, max_time_ms=None)
+        group_count(self, collection, group_by, query=None, limit=None)
+        facet(self, collection, facets, query=None)
+        fan_out_find(self, database_names, collection_name, query=None, projection=None, sort=None, limit=0, timeout=None, workers=None, errors=None)
+        fan_out_aggregate(self, database_names, collection_name, pipeline, sort=None, timeout=None, workers=None, errors=None)
+        fan_out_count(self, database_names, collection_name, query=None, timeout=None, errors=None)
+        find_one_and_update(self, collection, query, data, projection=None, sort=None, upsert=False, return_new=True)
+        increment_counter(self, collection, name, amount=1, field="value")
+        update_versioned(self, collection, query, data, version, field="_version")
+        claim_next(self, queue_collection, worker=None, query=None, sort=None, lease=None)
     """
-    def __init__(self, connection_uri=None, server_timeout=None, database_name=None):
+    # Query shapes run by every MongoAPI in this process, explained by advise_indexes
+    query_shapes = _indexes.QueryShapeRecorder()
+
+    # Per-command latency, bytes and per-collection operation counts, see CommandMetrics.snapshot
+    metrics = METRICS
+
+    # WorkloadRecorder capturing the operations of every MongoAPI in this process, see start_capture
+    workload = None
+
+    def __init__(self, connection_uri=None, server_timeout=None, database_name=None, pooled=True, cache=None, write_behind=None):
         """
         Initialize the MongoAPI class by calling _connect method which creates a MongoClient instance.
 
@@ -82,6 +252,23 @@ class MongoAPI:
                 If 'database_name' is not provided, it will get the value specified in mongo_preferences.yaml.
                 If 'database_name' is None, it will default to osvfx.
 
+            pooled (bool):
+                If True (default), reuse the process-wide pooled MongoClient for this connection_uri and server_timeout.
+                Pool size and wait queue settings are read from the 'pool' section of mongo_preferences.yaml.
+                If False, create a private MongoClient which is closed on disconnect.
+
+            cache (QueryCache, bool or None):
+                If a QueryCache is provided, find_one results are cached in it, it can be shared between instances.
+                If True, a private QueryCache with default size and TTL is created.
+                If None (default), find_one always queries the server.
+
+            write_behind (bool, dict or None):
+                If True, insert_one queues documents in a background WriteBehindQueue and returns a Future
+                resolved with the inserted id, documents from every thread are flushed as insert_many batches.
+                A dict is passed to WriteBehindQueue as settings, eg: {"max_batch_size": 500, "max_latency": 0.05}.
+                The queue is drained on disconnect and at interpreter exit, and created again by the next insert_one.
+                If None (default), insert_one writes immediately and returns the inserted id.
+
         :param connection_uri: MongoDB Server URI, eg: mongodb://127.0.0.1:27017
         :type connection_uri: str
 
@@ -90,12 +277,34 @@ class MongoAPI:
         
         :param database_name: Name of the database
         :type database_name: str
+
+        :param pooled: Share a pooled client with other MongoAPI instances
+        :type pooled: bool
+
+        :param cache: Read-through cache for find_one
+        :type cache: QueryCache or bool
+
+        :param write_behind: Coalesce insert_one calls in a background queue
+        :type write_behind: bool or dict
         """
 
         # Declare Instance Attributes
         self._is_installed = False
         self._client = None
-        self.database = None
+        self._database = None
+        self._pid = None
+        self.health = None
+        self._close = None
+        self.pooled = pooled
+        self._max_write_batch_size = None
+        self.cache = QueryCache() if cache is True else (cache or None)
+
+        self.write_behind = None
+        self._write_behind_pid = None
+        self._write_behind_settings = None
+        if write_behind:
+            self._write_behind_settings = write_behind if isinstance(write_behind, dict) else {}
+            self._write_behind_queue()
 
         self.connection_uri = (
             connection_uri if connection_uri is not None else (MONGO_URI if MONGO_URI is not None else "mongodb://127.0.0.1:27017")
@@ -109,64 +318,180 @@ class MongoAPI:
             database_name if database_name is not None else (DATABASE if DATABASE is not None else "osvfx")
         )
 
-        # Connect to Database when this class is Initiated
-        self._connect()
+        # The connection is opened lazily on first use, see the database property
 
     def __repr__(self):
         return "mongo = MongoAPI()\ncollection = mongo.database[collection_name]\nmongo.insert_ine(collection, data)"
     
+    @property
+    def database(self):
+        """
+        The MongoDB database of this instance, connecting to the server on first access
+
+        :raises ServerUnavailableError: if the health checker knows the server is down
+        """
+        self._ensure_connected()
+        self._ensure_available()
+        return self._database
+
+    def _ensure_connected(self):
+        """
+        Connect on first use, and again in a forked process
+        """
+        if self._is_installed and self._pid != os.getpid():
+            self._drop_inherited_client()
+        if not self._is_installed:
+            self._connect()
+
     def _connect(self):
 
         """
         Method to connect to the database
+        Creating a MongoClient doesn't block, the server is reached in the background by the health checker
+        and by the first operation, no handshake is made here.
         """
         if self._is_installed:
             OSMongo.warning("We are already connected to the database")
             return
-        
-        self._client = pymongo.MongoClient(self.connection_uri, serverSelectionTimeoutMS=self.server_timeout)
 
-        for retry in range(3):
-            try:
-                time_1 = time.time()
-                self._client.server_info()
-            except Exception as e:
-                OSMongo.error(f"Something gone wrong while attempting to connect, Retrying: {str(retry)} time(s)")
-                time.sleep(1)
-                self.server_timeout += 1.5
-            else:
-                break
+        if self.pooled:
+            self._client = MongoClientRegistry.get(self.connection_uri, self.server_timeout)
+            self.health = MongoClientRegistry.health(self.connection_uri, self.server_timeout)
         else:
-            raise IOError(f"ERROR: Couldn't Connect to database in less than {self.server_timeout}")
-        
-        OSMongo.log(20, "Connected to %s, delay %.3f s" % (self.connection_uri, time.time() - time_1))
-        self.database = self._client[self.database_name]
+            self._client = pymongo.MongoClient(
+                self.connection_uri, serverSelectionTimeoutMS=self.server_timeout, event_listeners=METRICS.listeners())
+            # Private clients share the health checker of their server instead of starting a thread each
+            self.health = MongoClientRegistry.shared_health(self.connection_uri, self.server_timeout)
+            # Close the client if this instance is dropped without disconnect
+            self._close = weakref.finalize(self, self._client.close)
+
+        self._database = self._client[self.database_name]
+        self._pid = os.getpid()
         self._is_installed = True
-    
+
+    def _drop_inherited_client(self):
+        """
+        Drop a client connected in a parent process, pymongo clients are not fork-safe.
+        Its sockets are shared with the parent so it is discarded, not closed.
+        """
+        if self._close is not None:
+            self._close.detach()
+        self._client = None
+        self._database = None
+        self.health = None
+        self._close = None
+        self._is_installed = False
+
+    def _ensure_available(self):
+        """
+        Fail fast with ServerUnavailableError while the server is known to be down,
+        instead of blocking every call on server selection
+        """
+        if self.health is not None:
+            self.health.raise_if_unavailable()
+
+    def _invalidate(self, collection):
+        """
+        Drop the cached find_one results of a collection after writing to it
+        """
+        if self.cache is not None:
+            self.cache.invalidate(collection)
+
+    def _write_behind_queue(self):
+        """
+        :return: the write-behind queue, created again after disconnect and in a forked process
+        :rtype: WriteBehindQueue
+        """
+        if self.write_behind is None or self.write_behind.closed or self._write_behind_pid != os.getpid():
+            self.write_behind = WriteBehindQueue(
+                on_flush=functools.partial(_on_write_behind_flush, self.cache), **self._write_behind_settings)
+            self._write_behind_pid = os.getpid()
+        return self.write_behind
+
+    @classmethod
+    def start_capture(cls, path):
+        """
+        Start recording the operations of every MongoAPI and AsyncMongoAPI in this process to 'path', one json
+        line per operation with its collection, arguments, start time and duration. Replay the file with
+        'python -m osmongo.replay' to load test a server upgrade or an index set with real traffic.
+
+        Every operation on a collection is captured, except:
+            loader: its batched lookups are captured as find calls.
+            blobs: GridFS reads and writes aren't captured.
+            fan_out_find, fan_out_aggregate, fan_out_count: they span several databases while a captured
+                operation has a single collection.
+            ensure_indexes, advise_indexes, set_server_validator: administration, not workload.
+
+        :param path: file the operations are appended to
+        :type path: str
+
+        :return: the recorder
+        :rtype: WorkloadRecorder
+
+        Example:
+            from osmongo import MongoAPI
+            MongoAPI.start_capture("/tmp/osmongo_workload.ndjson")
+            run_pipeline()
+            MongoAPI.stop_capture()
+        """
+        cls.stop_capture()
+        cls.workload = WorkloadRecorder(path)
+        OSMongo.info(f"Capturing MongoAPI operations to {path}")
+        return cls.workload
+
+    @classmethod
+    def stop_capture(cls):
+        """
+        Stop recording operations and close the capture file
+        """
+        workload, cls.workload = cls.workload, None
+        if workload is not None:
+            workload.close()
+            OSMongo.info(f"Captured {workload.recorded} operation(s) to {workload.path}, {workload.skipped} skipped")
+
     def disconnect(self):
         """
         Close any connection to the database
+        Documents queued in the write-behind queue are flushed first.
+        A pooled client is only detached from this instance, it stays open for the rest of the process,
+        use MongoClientRegistry.close_all() to close every pooled client.
         """
-        try:
-            self._client.close()
+        if self.write_behind is not None and self._write_behind_pid == os.getpid():
+            self.write_behind.close()
+        self.write_behind = None
+
+        if self._is_installed and self._pid != os.getpid():
+            self._drop_inherited_client()
+        elif self._close is not None:
+            self._close()
+
+        if self._is_installed:
             OSMongo.warning("Disconnecting MongoDB...")
-        except AttributeError as e:
-            OSMongo.exception(e)
 
-        self._client = False
-        self.database = None
-        self._is_installed = None
+        # Back to the lazy state of __init__, the next use connects again
+        self._client = None
+        self._database = None
+        self._pid = None
+        self.health = None
+        self._close = None
+        self._is_installed = False
 
-    def count(self, collection, query={}):
+    @captured
+    def count(self, collection, query={}, exact=True):
         """
         Count the number of documents in the specified collection that match the 'query'.
         If 'query' is None, it will return the total number of documents in the collection.
+        With exact=False, an empty 'query' reads the count from the collection metadata instead of
+        scanning, which is faster but can be off, eg: after an unclean shutdown or in a sharded cluster.
 
         :param collection: Collection to Query
         :type collection: pymongo collection object 
 
         :param query: query to count
         :type query: dict
+
+        :param exact: count matching documents even for an empty query, False allows the metadata count
+        :type exact: bool
         
         :return: number of documents in the collection
         :rtype: int
@@ -176,13 +501,138 @@ class MongoAPI:
             mongo = MongoAPI()
             collection = mongo.database["osvfx"]
             total_count = mongo.count(collection)
-            print(total_count)
+            estimated_count = mongo.count(collection, exact=False)
+            print(total_count, estimated_count)
         """
+        self._ensure_available()
+        if not query and not exact:
+            return collection.estimated_document_count()
+
+        query = query or {}
+        self.query_shapes.record(collection, query)
         return collection.count_documents(query)
 
+    @captured
+    def aggregate(self, collection, pipeline, allow_disk_use=True, batch_size=1000, max_time_ms=None):
+        """
+        Run an aggregation pipeline on the server and stream the results,
+        grouping happens next to the data instead of pulling raw documents to the client.
+
+        :param collection: Collection to aggregate
+        :type collection: pymongo collection object
+
+        :param pipeline: aggregation stages, eg: [{"$match": {...}}, {"$group": {...}}]
+        :type pipeline: list
+
+        :param allow_disk_use: let $group and $sort stages spill to disk on large inputs
+        :type allow_disk_use: bool
+
+        :param batch_size: number of results fetched per round trip
+        :type batch_size: int
+
+        :param max_time_ms: abort the aggregation on the server after this many ms
+        :type max_time_ms: int
+
+        :return: Iterator with the results
+        :rtype: pymongo.command_cursor.CommandCursor object
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            collection = mongo.database["publishes"]
+            pipeline = [{"$match": {"show": "bbx"}}, {"$group": {"_id": "$artist", "frames": {"$sum": "$frames"}}}]
+            for result in mongo.aggregate(collection, pipeline):
+                print(result)
+        """
+        assert isinstance(pipeline, list), "`pipeline` must be <list> of stages"
+
+        self._ensure_available()
+        if pipeline and "$match" in pipeline[0]:
+            self.query_shapes.record(collection, pipeline[0]["$match"])
+
+        options = {"allowDiskUse": allow_disk_use, "batchSize": batch_size}
+        if max_time_ms is not None:
+            options["maxTimeMS"] = max_time_ms
+        return collection.aggregate(pipeline, **options)
+
+    @captured
+    def group_count(self, collection, group_by, query=None, limit=None):
+        """
+        Count documents per value of one or more fields, most frequent first,
+        eg: publishes per shot or per artist.
+
+        :param collection: Collection to aggregate
+        :type collection: pymongo collection object
+
+        :param group_by: field or list of fields to group on
+        :type group_by: str or list
+
+        :param query: only count documents matching this query
+        :type query: dict
+
+        :param limit: only return the 'limit' largest groups
+        :type limit: int
+
+        :return: one {"_id": value, "count": n} per group, '_id' is a dict of values when grouping on several fields
+        :rtype: list
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            collection = mongo.database["publishes"]
+            per_artist = mongo.group_count(collection, "artist", {"show": "bbx"})
+            per_shot_task = mongo.group_count(collection, ["shot", "task"])
+        """
+        return list(self.aggregate(collection, _group_count_stages(group_by, query, limit)))
+
+    @captured
+    def facet(self, collection, facets, query=None):
+        """
+        Compute several dashboard aggregations over the same documents in a single round trip with $facet.
+        Facets are either a list of stages, or a field name (or list of field names) as a shortcut
+        for the stages of group_count.
+
+        :param collection: Collection to aggregate
+        :type collection: pymongo collection object
+
+        :param facets: facet name to stages or to field(s) to count per value
+        :type facets: dict
+
+        :param query: only aggregate documents matching this query
+        :type query: dict
+
+        :return: results per facet name
+        :rtype: dict
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            collection = mongo.database["publishes"]
+            dashboard = mongo.facet(collection, {
+                "per_shot": "shot",
+                "per_artist": "artist",
+                "total": [{"$count": "publishes"}],
+            }, query={"show": "bbx"})
+        """
+        assert isinstance(facets, dict) and facets, "`facets` must be a non-empty <dict>"
+
+        stages = {}
+        for name, facet in facets.items():
+            if isinstance(facet, (str, tuple)) or (isinstance(facet, list) and all(isinstance(item, str) for item in facet)):
+                stages[name] = _group_count_stages(facet)
+            else:
+                stages[name] = facet
+
+        pipeline = [{"$match": query}] if query else []
+        pipeline.append({"$facet": stages})
+        results = list(self.aggregate(collection, pipeline))
+        return results[0] if results else {name: [] for name in facets}
+
+    @captured
     def insert_one(self, collection, data):
         """
         Insert a single document into the specified collection.
+        With write_behind enabled, the document is queued and a Future of its ID is returned.
 
         :param collection: Collection to insert the document
         :type collection: pymongo collection object
@@ -190,8 +640,8 @@ class MongoAPI:
         :param data: Dictionary to insert as document
         :type data: dict
         
-        :return: ID of the document inserted
-        :rtype: pymongo ObjectID
+        :return: ID of the document inserted, or a Future of it with write_behind enabled
+        :rtype: pymongo ObjectID or concurrent.futures.Future
 
         Example:
             from osmongo import MongoAPI
@@ -201,28 +651,49 @@ class MongoAPI:
             inserted_id = mongo.insert_one(collection, data)
             print(inserted_id)
         """
-        assert isinstance(data, dict), "data must be of type <dict>"
+        _check_document(data)
         validate_schema(data)
+        self._ensure_available()
+
+        if self._write_behind_settings is not None:
+            return self._write_behind_queue().submit(collection, data)
+
         inserted_id = collection.insert_one(data).inserted_id
-        if inserted_id:
-            OSMongo.info(f"Successfully inserted: {inserted_id}")
-            return inserted_id
-        else:
-            OSMongo.error("Something went wrong when inserting data")
+        self._invalidate(collection)
+        return _inserted(inserted_id)
 
-    def insert_many(self, collection, data, ordered=True):
+    @captured
+    def insert_many(self, collection, data, ordered=True, schema=None, validate=True, workers=None):
         """
         Insert multiple documents into the specified collection.
+        Every document is validated exactly once before inserting, large batches are validated in a process pool.
+        Trusted bulk loaders writing to a collection with a server-side validator (see set_server_validator)
+        can skip client-side validation with validate=False.
 
         :param collection: Collection to insert the document
         :type collection: pymongo collection object
 
         :param data: list of Dictionaries to insert as documents
         :type data: list
+
+        :param ordered: stop inserting at the first failing document
+        :type ordered: bool
+
+        :param schema: JSON schema to validate with, if None the osvfx schema package is used
+        :type schema: dict
+
+        :param validate: validate the documents on the client before inserting
+        :type validate: bool
+
+        :param workers: number of worker processes used to validate large batches, by default they
+            are validated in this process, see validate_documents
+        :type workers: int
         
         :return: IDs of the document inserted
         :rtype: pymongo ObjectIDs
 
+        :raises SchemaValidationError: with the index of every document failing validation
+
         Example:
             from osmongo import MongoAPI
             mongo = MongoAPI()
@@ -231,27 +702,28 @@ class MongoAPI:
             inserted_ids = mongo.insert_many(collection, data)
             print(inserted_ids)
         """
-        assert isinstance(data, list), "`items` must be of type <list>"
+        _check_documents(data)
+        if validate:
+            validate_documents(data, schema=schema, workers=workers)
 
-        for item in data:
-            assert isinstance(item, dict), "`item` must be of type <dict>"
-            validate_schema(data)
+        self._ensure_available()
 
-        inserted_ids = collection.insert_many(data, ordered=ordered).inserted_ids
-
-        if inserted_ids:
-            OSMongo.info(f"Successfully inserted: {inserted_ids}")
-            return inserted_ids
-        else:
-            OSMongo.error("Something went wrong when inserting data")
+        try:
+            inserted_ids = collection.insert_many(data, ordered=ordered).inserted_ids
+        finally:
+            self._invalidate(collection)
+        return _inserted(inserted_ids)
     
-    def find(self, collection, query={}, projection=None, sort=None, limit=0):
+    @captured
+    def find(self, collection, query={}, projection=None, sort=None, limit=0, raw=False):
         """
         Find and retrieve multiple documents from the specified collection.
         'query' allows filtering the search
         'projection' lets you specify which fields to include.
         'sort' allows sorting the search in ascending or decending order
         'limit' restricts the maximum number of documents to be returned (default: all).
+        'raw' returns RawBSONDocuments, which are only decoded when a field is accessed
+        and expose their bytes as '.raw', for readers forwarding documents without reading them.
 
         :param collection: Collection to find the documents
         :type collection: pymongo collection object
@@ -268,6 +740,9 @@ class MongoAPI:
         :param limit: maximum number of documents to return
         :type limit: int
 
+        :param raw: return lazily decoded RawBSONDocuments instead of dicts
+        :type raw: bool
+
         :return: Iterator with Documents in the collection collection
         :rtype: pymongo.cursor.Cursor object
 
@@ -284,21 +759,259 @@ class MongoAPI:
                 print(doc)
         """
         if projection is not None:
-            assert isinstance(projection, dict), "`filter` must be <dict>"
+            assert isinstance(projection, dict), "`projection` must be <dict>"
 
         if sort is not None:
-            assert isinstance(sort, list), "`sort` must be <list> of <tuple> like [(field, direction)], 1 for ascending, -1 for decending eg[('_id', 1)]"
-            for item in sort:
-                assert isinstance(item, tuple), "`sort item` must be of type <tuple>"
+            _check_sort(sort)
         else:
             sort = [("_id", 1)]
 
+        self._ensure_available()
+        self.query_shapes.record(collection, query, projection, sort)
+
+        if raw:
+            collection = collection.with_options(codec_options=RAW_CODEC_OPTIONS)
         return collection.find(filter=query, projection=projection).sort(sort).limit(limit)
 
-    def find_one(self, collection, query, projection=None):
+    @captured
+    def write_raw(self, collection, output, query={}, projection=None, sort=None, batch_size=1000):
+        """
+        Write the BSON bytes of every document matching 'query' straight to 'output',
+        documents are never decoded into dicts. The output is a concatenation of BSON documents,
+        the same layout as mongodump, readable with bson.decode_file_iter.
+
+        :param collection: Collection to find the documents
+        :type collection: pymongo collection object
+
+        :param output: binary file-like object, eg: open(path, "wb"), io.BytesIO() or socket.makefile("wb")
+        :type output: file object
+
+        :param query: query to match the search
+        :type query: dict
+
+        :param projection: Determines which fields are returned in the matching documents
+        :type projection: dict
+
+        :param sort: sort parameters, None for no sort
+        :type sort: list
+
+        :param batch_size: number of documents fetched per round trip
+        :type batch_size: int
+
+        :return: number of documents and bytes written
+        :rtype: tuple
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            collection = mongo.database["publishes"]
+            with open("/tmp/publishes.bson", "wb") as output:
+                count, size = mongo.write_raw(collection, output, {"show": "bbx"})
+        """
+        if projection is not None:
+            assert isinstance(projection, dict), "`projection` must be <dict>"
+
+        self._ensure_available()
+        self.query_shapes.record(collection, query, projection, sort)
+
+        raw_collection = collection.with_options(codec_options=RAW_CODEC_OPTIONS)
+        cursor = raw_collection.find(filter=query, projection=projection, sort=sort, batch_size=batch_size)
+
+        count = size = 0
+        for document in cursor:
+            output.write(document.raw)
+            count += 1
+            size += len(document.raw)
+        return count, size
+
+    @captured
+    def iter_batches(self, collection, query={}, projection=None, batch_size=1000, sort=None, cursor_batch_size=None):
+        """
+        Iterate over the documents matching 'query' in lists of at most 'batch_size' documents.
+        Only one list (and one server batch) is held in memory at a time, so exporting
+        a whole collection runs in constant memory.
+
+        Unlike find, no sort is applied unless 'sort' is given, the server returns documents
+        in natural order which avoids an in-memory or index sort when ordering doesn't matter.
+
+        :param collection: Collection to find the documents
+        :type collection: pymongo collection object
+
+        :param query: query to match the search
+        :type query: dict
+
+        :param projection: Determines which fields are returned in the matching documents
+        :type projection: dict
+
+        :param batch_size: maximum number of documents per yielded list
+        :type batch_size: int
+
+        :param sort: sort parameters, eg: [('_id', 1)], None for no sort
+        :type sort: list
+
+        :param cursor_batch_size: number of documents fetched per round trip, defaults to 'batch_size'
+        :type cursor_batch_size: int
+
+        :return: generator of lists of documents
+        :rtype: generator
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            collection = mongo.database["osvfx"]
+            for documents in mongo.iter_batches(collection, {"show": "bbx"}, batch_size=500):
+                export(documents)
+        """
+        assert isinstance(batch_size, int) and batch_size > 0, "`batch_size` must be a positive <int>"
+        if projection is not None:
+            assert isinstance(projection, dict), "`projection` must be <dict>"
+
+        self._ensure_available()
+        self.query_shapes.record(collection, query, projection, sort)
+        cursor = collection.find(filter=query, projection=projection)
+        cursor.batch_size(cursor_batch_size or batch_size)
+
+        if sort is not None:
+            assert isinstance(sort, list), "`sort` must be <list> of <tuple> like [(field, direction)]"
+            cursor.sort(sort)
+
+        try:
+            while True:
+                documents = list(itertools.islice(cursor, batch_size))
+                if not documents:
+                    break
+                yield documents
+        finally:
+            cursor.close()
+
+    @captured
+    def find_page(self, collection, query={}, projection=None, page_size=100, sort_field="_id", direction=1, token=None):
+        """
+        Return one page of documents using keyset pagination.
+        Each page starts with a range condition on 'sort_field' (and _id as tie-breaker) right after the
+        last document of the previous page instead of skipping documents, so with an index on
+        'sort_field' page N costs the same as page 1.
+
+        :param collection: Collection to find the documents
+        :type collection: pymongo collection object
+
+        :param query: query to match the search
+        :type query: dict
+
+        :param projection: Determines which fields are returned, _id and 'sort_field' are always returned
+        :type projection: dict
+
+        :param page_size: maximum number of documents per page
+        :type page_size: int
+
+        :param sort_field: indexed field to page on, eg: "_id" or "created_at"
+        :type sort_field: str
+
+        :param direction: 1 for ascending, -1 for descending
+        :type direction: int
+
+        :param token: continuation token returned with the previous page, None for the first page
+        :type token: str
+
+        :return: documents of the page and the continuation token for the next page, None on the last page
+        :rtype: tuple
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            collection = mongo.database["publishes"]
+            documents, token = mongo.find_page(collection, {"show": "bbx"}, sort_field="created_at", direction=-1)
+            while token:
+                documents, token = mongo.find_page(collection, {"show": "bbx"}, sort_field="created_at",
+                                                   direction=-1, token=token)
+        """
+        assert isinstance(query, dict), "`query` must be <dict>"
+        assert isinstance(page_size, int) and page_size > 0, "`page_size` must be a positive <int>"
+        assert direction in (1, -1), "`direction` must be 1 for ascending or -1 for descending"
+        if projection is not None:
+            assert isinstance(projection, dict), "`projection` must be <dict>"
+
+        if token is not None:
+            state = _paging.decode_token(token, sort_field, direction)
+            query = _paging.keyset_query(query, sort_field, direction, state)
+
+        projection = _paging.keyset_projection(projection, sort_field)
+        sort = _paging.keyset_sort(sort_field, direction)
+        self._ensure_available()
+        self.query_shapes.record(collection, query, projection, sort)
+
+        cursor = collection.find(filter=query, projection=projection, sort=sort, limit=page_size + 1)
+        documents = list(cursor)
+
+        # Fetching one extra document tells us if there is a next page without another round trip
+        if len(documents) <= page_size:
+            return documents, None
+
+        documents = documents[:page_size]
+        return documents, _paging.encode_token(sort_field, direction, documents[-1])
+
+    @captured
+    def find_columns(self, collection, query, fields, dtypes=None, batch_size=10000, sort=None):
+        """
+        Stream the documents matching 'query' straight into one NumPy array per field, for analytic
+        queries which would otherwise build millions of dicts with list(mongo.find(...)).
+        Only 'fields' are fetched, arrays are preallocated and doubled when full, and every
+        document is dropped as soon as its values are copied.
+
+        Missing, None or non-convertible values are masked in the returned numpy.ma.MaskedArray,
+        use 'array.filled(value)' or 'array.compressed()' to get a plain array. Numeric columns only
+        take numbers, strings are masked rather than parsed, eg: "1.5" in a float64 column.
+        Overlapping fields such as "stats" and "stats.cpu" are fetched once through "stats".
+        NumPy is only required by this method.
+
+        :param collection: Collection to find the documents
+        :type collection: pymongo collection object
+
+        :param query: query to match the search
+        :type query: dict
+
+        :param fields: fields to load, dotted paths are supported, eg: ["frame", "stats.cpu"]
+        :type fields: list
+
+        :param dtypes: NumPy dtype per field, defaults to float64, eg: {"frame": "int32", "host": object}
+        :type dtypes: dict
+
+        :param batch_size: number of documents fetched per round trip
+        :type batch_size: int
+
+        :param sort: sort parameters, None for no sort
+        :type sort: list
+
+        :return: masked array per field
+        :rtype: dict
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            collection = mongo.database["render_stats"]
+            columns = mongo.find_columns(collection, {"show": "bbx"}, ["frame", "stats.cpu"], {"frame": "int32"})
+            print(columns["stats.cpu"].mean())
+        """
+        # import numpy only when columns are requested, it isn't required by the rest of osmongo
+        from ._columns import find_columns
+
+        assert isinstance(query, dict), "`query` must be <dict>"
+        assert isinstance(fields, list) and fields, "`fields` must be a non-empty <list>"
+        if dtypes is not None:
+            assert isinstance(dtypes, dict), "`dtypes` must be <dict>"
+
+        self._ensure_available()
+        self.query_shapes.record(collection, query, {field: 1 for field in fields}, sort)
+        return find_columns(collection, query, fields, dtypes=dtypes, batch_size=batch_size, sort=sort)
+
+    @captured
+    def find_one(self, collection, query, projection=None, raw=False):
         """
          Find and retrieve a single document from the specified collection.
         'query' allows filtering the search, and 'projection' lets you specify which fields to include.
+        If the instance has a cache, results (including None) are served from it until they expire
+        or the collection is written to through this class.
+        'raw' returns a lazily decoded RawBSONDocument, raw lookups bypass the cache.
 
         :param collection: Collection to find the documents
         :type collection: pymongo collection object
@@ -309,6 +1022,9 @@ class MongoAPI:
         :param projection: Determines which fields are returned in the matching documents. eg: {"item1": "value1"}
         :type projection: dict
 
+        :param raw: return a lazily decoded RawBSONDocument instead of a dict
+        :type raw: bool
+
         :return: Document as a Dictionary
         :rtype: dict
 
@@ -319,12 +1035,96 @@ class MongoAPI:
             doc = mongo.find_one(collection, {"item1": "value1"})
             print(doc)
         """
-        assert isinstance(query, dict), "`query` must be <dict>"
+        _check_query(query, projection)
+        self.query_shapes.record(collection, query, projection)
+
+        if raw:
+            self._ensure_available()
+            collection = collection.with_options(codec_options=RAW_CODEC_OPTIONS)
+            return collection.find_one(filter=query, projection=projection)
+
+        if self.cache is None:
+            self._ensure_available()
+            return collection.find_one(filter=query, projection=projection)
+
+        key = QueryCache.make_key(collection, query, projection)
+        hit, document = self.cache.get(key)
+        if hit:
+            return document
+
+        generation = self.cache.generation(key)
+        self._ensure_available()
+        document = collection.find_one(filter=query, projection=projection)
+        self.cache.set(key, document, generation)
+        return document
+
+    def loader(self, collection, key="_id", projection=None, window=0.005, max_batch_size=1000):
+        """
+        Create a DocumentLoader which batches find_one-by-key lookups made within 'window' seconds
+        into a single {key: {"$in": [...]}} query, duplicate keys are only looked up once.
+        Use it instead of calling find_one per row when building list views.
+        The queries go through find, so they fail fast while the server is down and are captured.
+
+        :param collection: Collection to find the documents
+        :type collection: pymongo collection object
+
+        :param key: unique, indexed field the lookups are made on
+        :type key: str
+
+        :param projection: Determines which fields are returned in the matching documents
+        :type projection: dict
+
+        :param window: time in seconds lookups are collected before querying
+        :type window: float
+
+        :param max_batch_size: maximum number of distinct keys per query
+        :type max_batch_size: int
+
+        :return: loader for the collection
+        :rtype: DocumentLoader
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            loader = mongo.loader(mongo.database["assets"])
+            assets = loader.load_many(asset_ids)
+            future = loader.load(asset_id)
+            print(future.result())
+        """
         if projection is not None:
-            assert isinstance(projection, dict), "`query` must be <dict>"
+            assert isinstance(projection, dict), "`projection` must be <dict>"
+        return DocumentLoader(collection, key=key, projection=projection, window=window, max_batch_size=max_batch_size,
+                              find=self.find)
+
+    def blobs(self, bucket_name="blobs", chunk_size=1048576, workers=4):
+        """
+        Create a BlobStore on a GridFS bucket of this database, for files too large for a document
+        such as thumbnails, Nuke snippets or json sidecars. Blobs are streamed in chunks,
+        stored once per content hash and can be read partially.
+
+        :param bucket_name: name of the GridFS bucket
+        :type bucket_name: str
+
+        :param chunk_size: size in bytes of the chunks of new blobs
+        :type chunk_size: int
 
-        return collection.find_one(filter=query, projection=projection)
+        :param workers: number of threads fetching chunks in parallel when downloading to a path
+        :type workers: int
 
+        :return: blob store of the bucket
+        :rtype: BlobStore
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            thumbnails = mongo.blobs("thumbnails")
+            blob_id = thumbnails.put("/dd/shows/bbx/0780/thumb.jpg")
+            mongo.update_one(mongo.database["shots"], {"code": "0780"}, {"$set": {"thumbnail": blob_id}})
+            thumbnails.download(blob_id, "/tmp/thumb.jpg")
+        """
+        return BlobStore(self.database, bucket_name=bucket_name, chunk_size=chunk_size, workers=workers)
+
+    @captured
     def update_one(self, collection, query, data):
         """
         Update a single document in the specified collection that matches the 'query'.
@@ -354,16 +1154,14 @@ class MongoAPI:
             }
             mongo.update_one(collection, query, data)
         """
-        assert isinstance(query, dict), "query must be <dict>"
-        assert isinstance(data, dict), "data must be of type <dict>"
+        _check_query(query)
+        _check_document(data)
+        self._ensure_available()
         updated_result = collection.update_one(query, data)
-    
-        if updated_result:
-            OSMongo.info(f"Successfully updated {query} with {data}")
-            return updated_result
-        else:
-            OSMongo.error("Something went wrong when updating data")
+        self._invalidate(collection)
+        return _written(updated_result, f"Successfully updated {query} with {data}", "updating")
 
+    @captured
     def replace_one(self, collection, query, data):
         """
         Replace a single document in the collection that matches the specified query criteria.
@@ -388,16 +1186,14 @@ class MongoAPI:
             data = {"item10": "value10"}
             mongo.replace_one(collection, data)
         """
-        assert isinstance(query, dict), "filter must be <dict>"
-        assert isinstance(data, dict), "data must be of type <dict>"
+        _check_query(query)
+        _check_document(data)
+        self._ensure_available()
         updated_result = collection.replace_one(query, data)
+        self._invalidate(collection)
+        return _written(updated_result, f"Successfully replaced {query} with {data}", "replacing")
 
-        if updated_result:
-            OSMongo.info(f"Successfully replaced {query} with {data}")
-            return updated_result
-        else:
-            OSMongo.error("Something went wrong when replacing data")
-
+    @captured
     def delete_one(self, collection, query):
         """
         Delete a single document from the specified collection that matches the 'query'.
@@ -418,18 +1214,551 @@ class MongoAPI:
             query = {"_id": ObjectId('64bbb2d05356bf8411271a81')}
             mongo.delete_one(collection, query)
         """
-        assert isinstance(query, dict), "filter must be <dict>"
+        _check_query(query)
+        self._ensure_available()
         deleted_result = collection.delete_one(query)
+        self._invalidate(collection)
+        return _written(deleted_result, f"Successfully deleted {query}", "deleting")
+    
+    @captured
+    def update_many(self, collection, query, data):
+        """
+        Update every document in the specified collection that matches the 'query' in a single round trip.
+        Empty or match-all queries are rejected to avoid updating the whole collection by accident.
+
+        :param collection: Collection to update the documents
+        :type collection: pymongo collection object
+
+        :param query: query to get the documents, must not be empty
+        :type query: dict
+
+        :param data: data to update
+        :type data: dict
+
+        :return: aggregated bulk write result, see bulk_write
+        :rtype: dict
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            collection = mongo.database["osvfx"]
+            mongo.update_many(collection, {"show": "bbx"}, {"$set": {"tag": "approved"}})
+        """
+        assert isinstance(data, dict), "data must be of type <dict>"
+        return self.bulk_write(collection, [_bulk.UpdateMany(query, data)])
+
+    @captured
+    def delete_many(self, collection, query):
+        """
+        Delete every document in the specified collection that matches the 'query' in a single round trip.
+        Empty or match-all queries are rejected to avoid deleting the whole collection by accident.
+
+        :param collection: Collection to delete the documents from
+        :type collection: pymongo collection object
+
+        :param query: query to get the documents, must not be empty
+        :type query: dict
+
+        :return: aggregated bulk write result, see bulk_write
+        :rtype: dict
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            collection = mongo.database["osvfx"]
+            mongo.delete_many(collection, {"status": "omit"})
+        """
+        return self.bulk_write(collection, [_bulk.DeleteMany(query)])
+
+    def max_write_batch_size(self):
+        """
+        :return: maximum number of write operations the server accepts in a single batch
+        :rtype: int
+        """
+        if self._max_write_batch_size is None:
+            self._ensure_connected()
+            try:
+                hello = self._client.admin.command("hello")
+                self._max_write_batch_size = hello.get("maxWriteBatchSize", _bulk.DEFAULT_MAX_BATCH_SIZE)
+            except PyMongoError as e:
+                OSMongo.warning(f"Couldn't read maxWriteBatchSize from the server, using default: {str(e)}")
+                return _bulk.DEFAULT_MAX_BATCH_SIZE
+        return self._max_write_batch_size
+
+    @captured
+    def bulk_write(self, collection, operations, ordered=True, batch_size=None):
+        """
+        Run a mix of insert, update, replace and delete operations in batches,
+        each batch is a single round trip to the server.
+
+        Operations are pymongo write models (InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany).
+        They are split into chunks of the server's maxWriteBatchSize, or 'batch_size' if smaller.
+        Every operation with a filter is checked first, empty or match-all filters raise ValueError
+        and nothing is written.
+
+        With ordered=True, a failing operation stops the remaining operations, the errors are
+        reported and pymongo.errors.BulkWriteError is raised with the aggregated result.
+        With ordered=False, the server runs the operations in any order, failures are collected
+        in 'writeErrors' and every chunk is run.
+
+        :param collection: Collection to write to
+        :type collection: pymongo collection object
 
-        if deleted_result:
-            OSMongo.info(f"Successfully deleted {query}")
-            return deleted_result
+        :param operations: write operations
+        :type operations: list
+
+        :param ordered: run operations in order and stop at the first error
+        :type ordered: bool
+
+        :param batch_size: maximum number of operations per round trip
+        :type batch_size: int
+
+        :return: aggregated result with nInserted, nMatched, nModified, nRemoved, nUpserted,
+                 upserted, writeErrors and batches, indexes point into 'operations'
+        :rtype: dict
+
+        Example:
+            from pymongo import InsertOne, UpdateMany, DeleteOne
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            collection = mongo.database["osvfx"]
+            operations = [
+                InsertOne({"code": "bbx"}),
+                UpdateMany({"show": "bbx"}, {"$set": {"tag": "approved"}}),
+                DeleteOne({"code": "old"}),
+            ]
+            result = mongo.bulk_write(collection, operations, ordered=False)
+            print(result["nModified"])
+        """
+        assert isinstance(operations, list), "`operations` must be of type <list>"
+
+        for operation in operations:
+            assert isinstance(operation, _bulk.WRITE_OPERATIONS), f"unsupported write operation: {operation}"
+            if isinstance(operation, _bulk.FILTERED_OPERATIONS):
+                _bulk.guard_filter(_bulk.operation_filter(operation))
+
+        result = _bulk.new_result()
+        if not operations:
+            return result
+
+        self._ensure_available()
+        max_batch_size = self.max_write_batch_size()
+        batch_size = min(batch_size, max_batch_size) if batch_size else max_batch_size
+
+        try:
+            for offset, chunk in _bulk.chunks(operations, batch_size):
+                chunk_result, failed = _bulk.run_chunk(collection, chunk, ordered)
+                _bulk.merge_result(result, chunk_result, offset)
+                if failed and ordered:
+                    OSMongo.error(f"Bulk write stopped in the batch starting at operation {offset}")
+                    raise BulkWriteError(result)
+        finally:
+            self._invalidate(collection)
+
+        if result["writeErrors"]:
+            OSMongo.error(f"Bulk write finished with {len(result['writeErrors'])} error(s)")
         else:
-            OSMongo.error("Something went wrong when deleting data")
-    
-    def update_many(self, collection=None):
-        raise NotImplementedError("This method is not implemented, use update_one in a for-loop")
+            OSMongo.info(
+                "Successfully ran %d operation(s) in %d batch(es): %d inserted, %d modified, %d removed, %d upserted" % (
+                    len(operations), result["batches"], result["nInserted"], result["nModified"],
+                    result["nRemoved"], result["nUpserted"]))
+        return result
+
+    def set_server_validator(self, collection, schema, level="strict", action="error"):
+        """
+        Push a JSON schema to MongoDB as the collection's server-side $jsonSchema validator,
+        the server then rejects invalid documents and clients can insert with validate=False.
+        The collection is created if it doesn't exist yet.
+
+        :param collection: Collection to validate
+        :type collection: pymongo collection object
+
+        :param schema: JSON schema, eg: {"bsonType": "object", "required": ["code"]}
+        :type schema: dict
+
+        :param level: "strict" validates every insert and update, "moderate" skips existing invalid documents
+        :type level: str
+
+        :param action: "error" rejects invalid documents, "warn" only logs them on the server
+        :type action: str
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            collection = mongo.database["osvfx"]
+            schema = {"bsonType": "object", "required": ["code"], "properties": {"code": {"bsonType": "string"}}}
+            mongo.set_server_validator(collection, schema)
+            mongo.insert_many(collection, data, validate=False)
+        """
+        assert isinstance(schema, dict), "schema must be of type <dict>"
+        assert level in ("off", "strict", "moderate"), "level must be one of 'off', 'strict', 'moderate'"
+        assert action in ("error", "warn"), "action must be one of 'error', 'warn'"
+
+        database = collection.database
+        options = {"validator": {"$jsonSchema": schema}, "validationLevel": level, "validationAction": action}
+
+        if collection.name in database.list_collection_names(filter={"name": collection.name}):
+            database.command("collMod", collection.name, **options)
+        else:
+            database.create_collection(collection.name, **options)
+
+        OSMongo.info(f"Successfully set $jsonSchema validator on {collection.full_name}")
+
+    def ensure_indexes(self, specs=None):
+        """
+        Create the indexes declared per collection, indexes which already exist are skipped
+        so it is safe to call on every tool start-up.
+
+        :param specs: index specs per collection name, defaults to the 'indexes' section of mongo_preferences.yaml
+                      eg: {"publishes": [{"keys": [["show", 1], ["shot", 1]]}, {"keys": [["code", 1]], "unique": True}]}
+        :type specs: dict
+
+        :return: names of the created indexes per collection name
+        :rtype: dict
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            created = mongo.ensure_indexes()
+            print(created)
+        """
+        specs = INDEXES if specs is None else specs
+        assert isinstance(specs, dict), "`specs` must be <dict> of collection name to <list> of index specs"
+
+        created = {}
+        for collection_name, collection_specs in specs.items():
+            collection = self.database[collection_name]
+            models = _indexes.missing_indexes(collection, _indexes.index_models(collection_specs))
+            if not models:
+                continue
+
+            created[collection_name] = collection.create_indexes(models)
+            OSMongo.info(f"Successfully created indexes on {collection.full_name}: {created[collection_name]}")
+        return created
+
+    def advise_indexes(self, limit=None):
+        """
+        Explain the query shapes run by this process (find, find_one, find_page, iter_batches and count)
+        and report collection scans, queries not covered by an index and the indexes that are missing.
+        Suggested indexes follow the Equality, Sort, Range rule.
 
-    def delete_many(self, documents=None):
-        raise NotImplementedError("This is not implemented as this has potential risk to delete all if used incorrectly")
-    
\ No newline at end of file
+        :param limit: only explain the 'limit' most frequent shapes
+        :type limit: int
+
+        :return: one report per shape with collection, query, sort, count, stages, collscan, covered and suggested_index
+        :rtype: list
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            for report in mongo.advise_indexes():
+                if report["collscan"]:
+                    print(report["collection"], report["query"], report["suggested_index"])
+        """
+        reports = []
+        for shape in self.query_shapes.shapes()[:limit]:
+            try:
+                report = _indexes.explain_shape(shape)
+            except PyMongoError as e:
+                OSMongo.warning(f"Couldn't explain query on {shape['collection'].full_name}: {str(e)}")
+                continue
+
+            if report["collscan"]:
+                OSMongo.warning(
+                    f"COLLSCAN on {report['collection']} for {report['query']} ({report['count']} call(s)), "
+                    f"suggested index: {report['suggested_index']}")
+            reports.append(report)
+        return reports
+
+    def fan_out_find(self, database_names, collection_name, query={}, projection=None, sort=None, limit=0,
+                     timeout=None, workers=None, errors=None):
+        """
+        Run the same find concurrently against several databases, eg: one per show, over this instance's
+        pooled client, and stream the merged results as (database_name, document) tuples.
+
+        Without 'sort', results are yielded as soon as any database returns them.
+        With 'sort', each database sorts on the server and the results are merged in order.
+        Each database gets 'timeout' seconds, databases failing or running out of time are skipped,
+        logged, and their exception is stored in 'errors' if a dict is given.
+
+        :param database_names: databases to query
+        :type database_names: list
+
+        :param collection_name: name of the collection in every database
+        :type collection_name: str
+
+        :param query: query to match the search
+        :type query: dict
+
+        :param projection: Determines which fields are returned in the matching documents
+        :type projection: dict
+
+        :param sort: sort parameters for an ordered merge, eg: [("created_at", -1)]
+        :type sort: list
+
+        :param limit: maximum number of documents per database
+        :type limit: int
+
+        :param timeout: time budget in seconds per database
+        :type timeout: float
+
+        :param workers: maximum number of databases queried at once, ordered merges query them all at once
+        :type workers: int
+
+        :param errors: filled with database name to exception for every skipped database
+        :type errors: dict
+
+        :return: generator of (database_name, document)
+        :rtype: generator
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            errors = {}
+            publishes = mongo.fan_out_find(["bbx", "dev02"], "publishes", {"status": "ip"},
+                                           sort=[("created_at", -1)], timeout=5, errors=errors)
+            for show, publish in publishes:
+                print(show, publish["code"])
+        """
+        assert isinstance(database_names, list), "`database_names` must be <list>"
+        if projection is not None:
+            assert isinstance(projection, dict), "`projection` must be <dict>"
+
+        client = self.database.client
+
+        def run(database_name):
+            collection = client[database_name][collection_name]
+            self.query_shapes.record(collection, query, projection, sort)
+            return collection.find(filter=query, projection=projection, sort=sort, limit=limit)
+
+        return self._fan_out(database_names, run, timeout, sort, workers, errors)
+
+    def fan_out_aggregate(self, database_names, collection_name, pipeline, sort=None, timeout=None, workers=None,
+                          errors=None):
+        """
+        Run the same aggregation pipeline concurrently against several databases and stream the merged
+        results as (database_name, result) tuples, see fan_out_find.
+        With 'sort', the pipeline must end with the matching $sort stage for the merge to be ordered.
+
+        :return: generator of (database_name, result)
+        :rtype: generator
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            pipeline = [{"$group": {"_id": "$artist", "count": {"$sum": 1}}}]
+            for show, result in mongo.fan_out_aggregate(["bbx", "dev02"], "publishes", pipeline, timeout=10):
+                print(show, result)
+        """
+        assert isinstance(database_names, list), "`database_names` must be <list>"
+        assert isinstance(pipeline, list), "`pipeline` must be <list> of stages"
+
+        client = self.database.client
+
+        def run(database_name):
+            return client[database_name][collection_name].aggregate(pipeline, allowDiskUse=True)
+
+        return self._fan_out(database_names, run, timeout, sort, workers, errors)
+
+    def fan_out_count(self, database_names, collection_name, query={}, timeout=None, errors=None):
+        """
+        Count matching documents concurrently in several databases
+
+        :return: count per database name, skipped databases are missing
+        :rtype: dict
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            counts = mongo.fan_out_count(["bbx", "dev02"], "publishes", {"status": "ip"}, timeout=5)
+        """
+        assert isinstance(database_names, list), "`database_names` must be <list>"
+
+        client = self.database.client
+
+        def run(database_name):
+            collection = client[database_name][collection_name]
+            self.query_shapes.record(collection, query)
+            return [{"count": collection.count_documents(query)}]
+
+        counts = {}
+        for database_name, result in self._fan_out(database_names, run, timeout, None, None, errors):
+            counts[database_name] = result["count"]
+        return counts
+
+    def _fan_out(self, database_names, run, timeout, sort, workers, errors):
+        errors = {} if errors is None else errors
+        for item in fan_out(database_names, run, timeout=timeout, sort=sort, workers=workers, errors=errors):
+            yield item
+
+        for database_name, error in errors.items():
+            OSMongo.warning(f"Fan-out skipped {database_name}: {str(error)}")
+
+    @captured
+    def find_one_and_update(self, collection, query, data, projection=None, sort=None, upsert=False, return_new=True):
+        """
+        Atomically update a single document matching 'query' and return it, in a single round trip.
+        Use it instead of find_one followed by update_one, which takes two round trips and races
+        with other writers in between.
+
+        :param collection: Collection to update the document
+        :type collection: pymongo collection object
+
+        :param query: query to get the document
+        :type query: dict
+
+        :param data: update operators to apply, eg: {"$set": {...}, "$inc": {...}}
+        :type data: dict
+
+        :param projection: Determines which fields are returned
+        :type projection: dict
+
+        :param sort: picks the first document when several match, eg: [("priority", -1)]
+        :type sort: list
+
+        :param upsert: insert the document if nothing matches
+        :type upsert: bool
+
+        :param return_new: return the document after the update instead of before it
+        :type return_new: bool
+
+        :return: the document, None if nothing matched
+        :rtype: dict
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            collection = mongo.database["shots"]
+            shot = mongo.find_one_and_update(collection, {"code": "0780"}, {"$set": {"status": "ip"}})
+        """
+        assert isinstance(query, dict), "query must be <dict>"
+        assert isinstance(data, dict), "data must be of type <dict>"
+
+        self._ensure_available()
+        try:
+            return collection.find_one_and_update(
+                query, data, projection=projection, sort=sort, upsert=upsert,
+                return_document=ReturnDocument.AFTER if return_new else ReturnDocument.BEFORE)
+        finally:
+            self._invalidate(collection)
+
+    @captured
+    def increment_counter(self, collection, name, amount=1, field="value"):
+        """
+        Atomically increment a named counter and return its new value, the counter document
+        {"_id": name, field: value} is created on first use. Safe to call from any number of
+        processes at once, eg: to hand out version numbers.
+
+        :param collection: Collection holding the counters
+        :type collection: pymongo collection object
+
+        :param name: name of the counter
+        :type name: str
+
+        :param amount: value to add
+        :type amount: int
+
+        :param field: field holding the value
+        :type field: str
+
+        :return: value after the increment
+        :rtype: int
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            counters = mongo.database["counters"]
+            version = mongo.increment_counter(counters, "bbx_pir_0780_comp")
+        """
+        counter = self.find_one_and_update(collection, {"_id": name}, {"$inc": {field: amount}}, upsert=True)
+        return counter[field]
+
+    @captured
+    def update_versioned(self, collection, query, data, version, field="_version"):
+        """
+        Compare-and-swap update for optimistic concurrency, the document is only updated if it is still at
+        'version', and its version is incremented with the update. Read the document, modify it,
+        then update it with the version you read, on VersionConflictError re-read and retry.
+
+        :param collection: Collection to update the document
+        :type collection: pymongo collection object
+
+        :param query: query to get the document, usually {"_id": ...}
+        :type query: dict
+
+        :param data: update operators to apply
+        :type data: dict
+
+        :param version: version the document was read at, use 0 for documents without version yet
+        :type version: int
+
+        :param field: field holding the version
+        :type field: str
+
+        :return: the document after the update
+        :rtype: dict
+
+        :raises VersionConflictError: if someone else updated the document since it was read
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            collection = mongo.database["assets"]
+            asset = mongo.find_one(collection, {"code": "tree"})
+            mongo.update_versioned(collection, {"_id": asset["_id"]}, {"$set": {"lod": 2}}, asset.get("_version", 0))
+        """
+        assert isinstance(query, dict), "query must be <dict>"
+        assert isinstance(data, dict), "data must be of type <dict>"
+
+        version_query = {field: version} if version else {field: {"$in": [0, None]}}
+        document = self.find_one_and_update(
+            collection, {"$and": [query, version_query]}, _atomic.versioned_update(data, field))
+
+        if document is None:
+            raise _atomic.VersionConflictError(query, version)
+        return document
+
+    @captured
+    def claim_next(self, queue_collection, worker=None, query=None, sort=None, lease=None):
+        """
+        Atomically claim the next job of a work queue collection in a single round trip,
+        no two workers can ever claim the same job.
+
+        Jobs are documents with "status": "queued". Claiming sets "status": "claimed", "claimed_by",
+        "claimed_at" and increments "attempts". With 'lease', the job also gets a "lease_expires" date
+        and is claimable again once the lease expired, so jobs of crashed workers are picked up again.
+
+        :param queue_collection: Collection of jobs
+        :type queue_collection: pymongo collection object
+
+        :param worker: name of the worker, defaults to <hostname>:<pid>
+        :type worker: str
+
+        :param query: only claim jobs matching this query, eg: {"show": "bbx"}
+        :type query: dict
+
+        :param sort: order jobs are claimed in, defaults to [("_id", 1)], first in first out
+        :type sort: list
+
+        :param lease: seconds after which an unfinished claimed job can be claimed again
+        :type lease: float
+
+        :return: the claimed job, None if the queue is empty
+        :rtype: dict
+
+        Example:
+            from osmongo import MongoAPI
+            mongo = MongoAPI()
+            jobs = mongo.database["render_jobs"]
+            job = mongo.claim_next(jobs, lease=600)
+            if job:
+                render(job)
+                mongo.update_one(jobs, {"_id": job["_id"]}, {"$set": {"status": "done"}})
+        """
+        worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        return self.find_one_and_update(
+            queue_collection,
+            _atomic.claim_query(query),
+            _atomic.claim_update(worker, lease),
+            sort=sort or [("_id", 1)],
+        )
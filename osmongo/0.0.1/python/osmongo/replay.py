@@ -0,0 +1,185 @@
+"""
+Replay a workload captured with MongoAPI.start_capture against a mongod and report
+throughput and latency percentiles per operation.
+
+Usage:
+    python -m osmongo.replay /tmp/osmongo_workload.ndjson --concurrency 32 --speed 4
+    python -m osmongo.replay /tmp/osmongo_workload.ndjson --speed 0 --database bbx=bbx_replay
+"""
+# import built-ins
+import os
+import time
+import inspect
+import argparse
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+# import pymongo
+from bson import json_util
+
+# import osmongo
+from .osmongo import OSMongo, MongoAPI
+from ._capture import JSON_OPTIONS, decode_operations
+
+# Module Constants
+PERCENTILES = (50, 90, 99)
+
+
+def read_workload(path):
+    """
+    :return: generator of captured operations, in capture order
+    :rtype: generator
+    """
+    with open(path) as workload:
+        for line in workload:
+            if line.strip():
+                yield json_util.loads(line, json_options=JSON_OPTIONS)
+
+
+def _percentile(timings, percentile):
+    return timings[min(len(timings) - 1, int(len(timings) * percentile / 100.0))]
+
+
+def _consume(result):
+    """
+    Iterate cursors and generators so the replayed operation does the same work as the captured one
+    """
+    if hasattr(result, "__next__"):
+        for _ in result:
+            pass
+
+
+def replay(path, connection_uri=None, concurrency=16, speed=1.0, database_map=None):
+    """
+    Re-issue the operations of a capture file through MongoAPI. Operations start at their captured
+    offset divided by 'speed', on at most 'concurrency' threads. When every thread is busy the
+    replay falls behind schedule, which is reported as lag.
+
+    :param path: capture file written by MongoAPI.start_capture
+    :type path: str
+
+    :param concurrency: maximum number of operations in flight
+    :type concurrency: int
+
+    :param speed: speed-up factor of the captured timeline, 0 replays as fast as possible
+    :type speed: float
+
+    :param database_map: captured database name to replay database name, eg: {"bbx": "bbx_replay"}
+    :type database_map: dict
+
+    :return: timings in seconds per operation name, errors per operation name, elapsed seconds and maximum lag
+    :rtype: dict
+
+    Example:
+        from osmongo.replay import replay
+        results = replay("/tmp/osmongo_workload.ndjson", concurrency=32, speed=4)
+    """
+    assert concurrency > 0, "`concurrency` must be a positive <int>"
+    assert speed >= 0, "`speed` must be >= 0"
+    database_map = database_map or {}
+
+    mongo = MongoAPI(connection_uri)
+    client = mongo.database.client
+    timings = collections.defaultdict(list)
+    errors = collections.Counter()
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(concurrency)
+    max_lag = 0.0
+    devnull = open(os.devnull, "wb")
+
+    def run(operation):
+        database_name = database_map.get(operation["database"], operation["database"])
+        collection = client[database_name][operation["collection"]]
+        arguments = operation["arguments"]
+        if arguments.get("sort"):
+            arguments["sort"] = [tuple(item) for item in arguments["sort"]]
+        if operation["op"] == "bulk_write":
+            arguments["operations"] = decode_operations(arguments["operations"])
+        elif operation["op"] == "write_raw":
+            arguments["output"] = devnull
+        if operation["op"] == "claim_next":
+            arguments["queue_collection"] = collection
+        else:
+            arguments["collection"] = collection
+
+        # Operations captured from AsyncMongoAPI may have arguments MongoAPI doesn't take, eg: batch_size
+        method = getattr(mongo, operation["op"])
+        parameters = inspect.signature(method).parameters
+        if not any(parameter.kind == parameter.VAR_KEYWORD for parameter in parameters.values()):
+            arguments = {name: value for name, value in arguments.items() if name in parameters}
+
+        start = time.perf_counter()
+        try:
+            _consume(method(**arguments))
+        except Exception:
+            with lock:
+                errors[operation["op"]] += 1
+        finally:
+            duration = time.perf_counter() - start
+            with lock:
+                timings[operation["op"]].append(duration)
+            slots.release()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="osmongo-replay") as executor:
+        for operation in read_workload(path):
+            if speed:
+                delay = start + operation["t"] / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            slots.acquire()
+            if speed:
+                max_lag = max(max_lag, time.perf_counter() - start - operation["t"] / speed)
+            executor.submit(run, operation)
+    elapsed = time.perf_counter() - start
+
+    devnull.close()
+    mongo.disconnect()
+    return {"timings": dict(timings), "errors": dict(errors), "elapsed": elapsed, "max_lag": max_lag}
+
+
+def report(results):
+    """
+    Print throughput and latency percentiles per operation and for the whole replay
+    """
+    def line(name, timings, errors):
+        timings = sorted(timings)
+        percentiles = "  ".join(
+            "p{}={:.3f}ms".format(percentile, _percentile(timings, percentile) * 1000) for percentile in PERCENTILES)
+        print("{:<22} n={:<8} {}  max={:.3f}ms  errors={}".format(
+            name, len(timings), percentiles, timings[-1] * 1000, errors))
+
+    total = 0
+    for name, timings in sorted(results["timings"].items()):
+        line(name, timings, results["errors"].get(name, 0))
+        total += len(timings)
+
+    every = [timing for timings in results["timings"].values() for timing in timings]
+    if every:
+        line("all", every, sum(results["errors"].values()))
+    print("{} operation(s) in {:.3f}s, throughput={:.0f} ops/s, max lag={:.3f}s".format(
+        total, results["elapsed"], total / results["elapsed"] if results["elapsed"] else 0, results["max_lag"]))
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Replay a captured osmongo workload")
+    parser.add_argument("path", help="Capture file written by MongoAPI.start_capture")
+    parser.add_argument("--uri", default="mongodb://127.0.0.1:27017", help="MongoDB Server URI")
+    parser.add_argument("--concurrency", default=16, type=int, help="Maximum number of operations in flight")
+    parser.add_argument("--speed", default=1.0, type=float,
+                        help="Speed-up factor of the captured timeline, 0 replays as fast as possible")
+    parser.add_argument("--database", action="append", default=[], metavar="CAPTURED=REPLAYED",
+                        help="Replay the operations of a captured database into another database")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    database_map = dict(mapping.split("=", 1) for mapping in args.database)
+    OSMongo.info(f"Replaying {args.path} with concurrency={args.concurrency} speed={args.speed}")
+    report(replay(args.path, args.uri, concurrency=args.concurrency, speed=args.speed, database_map=database_map))
+
+
+if __name__ == "__main__":
+    main()
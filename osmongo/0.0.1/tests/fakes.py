@@ -0,0 +1,321 @@
+# import built-ins
+import io
+import copy
+import threading
+from collections.abc import Mapping
+
+# import pymongo
+import bson
+import pymongo
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import DuplicateKeyError
+
+# Module Constants
+_MISSING = object()
+
+
+def get_path(document, path):
+    """
+    :return: value of a dotted 'path' in 'document', _MISSING if it isn't set
+    """
+    value = document
+    for key in path.split("."):
+        if not isinstance(value, Mapping) or key not in value:
+            return _MISSING
+        value = value[key]
+    return value
+
+
+def set_path(document, path, value):
+    keys = path.split(".")
+    for key in keys[:-1]:
+        document = document.setdefault(key, {})
+    document[keys[-1]] = value
+
+
+def unset_path(document, path):
+    keys = path.split(".")
+    for key in keys[:-1]:
+        document = document.get(key, {})
+    document.pop(keys[-1], None)
+
+
+def _match_value(value, condition):
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        for operator, operand in condition.items():
+            if operator == "$exists":
+                if (value is not _MISSING) != bool(operand):
+                    return False
+            elif operator == "$in":
+                # null matches missing fields, like on the server
+                values = value if isinstance(value, list) else [None if value is _MISSING else value]
+                if not any(item in operand for item in values):
+                    return False
+            elif operator == "$ne":
+                if value == operand:
+                    return False
+            elif value is _MISSING or value is None:
+                return False
+            elif operator == "$gt" and not value > operand:
+                return False
+            elif operator == "$gte" and not value >= operand:
+                return False
+            elif operator == "$lt" and not value < operand:
+                return False
+            elif operator == "$lte" and not value <= operand:
+                return False
+        return True
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return value == condition
+
+
+def matches(document, query):
+    """
+    :return: True if 'document' matches the subset of the query language the fakes support
+    """
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(document, branch) for branch in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, branch) for branch in condition):
+                return False
+        elif not _match_value(get_path(document, key), condition):
+            return False
+    return True
+
+
+class FakeCursor:
+    """
+    In-memory stand-in for a pymongo Cursor
+    """
+    def __init__(self, documents):
+        self.documents = documents
+        self._iterator = None
+
+    def sort(self, sort):
+        for key, direction in reversed(sort or []):
+            self.documents.sort(key=lambda document: get_path(document, key), reverse=direction == pymongo.DESCENDING)
+        return self
+
+    def limit(self, limit):
+        if limit:
+            self.documents = self.documents[:limit]
+        return self
+
+    def batch_size(self, batch_size):
+        return self
+
+    def close(self):
+        self._iterator = iter([])
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = iter(self.documents)
+        return next(self._iterator)
+
+
+class FakeResult:
+    def __init__(self, matched_count=0, modified_count=0, deleted_count=0, inserted_id=None, inserted_ids=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.deleted_count = deleted_count
+        self.inserted_id = inserted_id
+        self.inserted_ids = inserted_ids
+        self.acknowledged = True
+
+
+class FakeCollection:
+    """
+    In-memory stand-in for a pymongo Collection, enough for the unit tests of osmongo helpers.
+    Every call is recorded in 'calls' as (method name, args).
+    """
+    def __init__(self, name="collection", documents=None, database=None):
+        self.name = name
+        self.database = database if database is not None else FakeDatabase()
+        self.full_name = f"{self.database.name}.{name}"
+        self.documents = [copy.deepcopy(document) for document in documents or []]
+        self.calls = []
+        self.unique = []
+        self._lock = threading.RLock()
+        self._next_id = 0
+        self.codec_options = None
+
+    def with_options(self, codec_options=None, **kwargs):
+        """
+        View of the same documents returning RawBSONDocuments when 'codec_options' asks for them
+        """
+        view = copy.copy(self)
+        view.codec_options = codec_options
+        return view
+
+    def _decoded(self, document):
+        if self.codec_options is not None and self.codec_options.document_class is RawBSONDocument:
+            return RawBSONDocument(bson.encode(document))
+        return copy.deepcopy(document)
+
+    def _check_unique(self, document, ignore=None):
+        for path in self.unique:
+            value = get_path(document, path)
+            if value is _MISSING:
+                continue
+            for other in self.documents:
+                if other is not ignore and get_path(other, path) == value:
+                    raise DuplicateKeyError(f"E11000 duplicate key error {path}: {value}")
+
+    def create_index(self, keys, unique=False, **kwargs):
+        self.calls.append(("create_index", (keys, unique, kwargs)))
+        if unique:
+            self.unique.append(keys[0][0])
+        return "_".join(f"{key}_{direction}" for key, direction in keys)
+
+    def _find(self, query, sort=None):
+        documents = [document for document in self.documents if matches(document, query)]
+        for key, direction in reversed(sort or []):
+            documents.sort(key=lambda document: get_path(document, key), reverse=direction == pymongo.DESCENDING)
+        return documents
+
+    def find(self, query=None, projection=None, sort=None, filter=None, **kwargs):
+        with self._lock:
+            query = filter if query is None else query
+            self.calls.append(("find", (query, projection, sort, kwargs)))
+            documents = self._find(query, sort)
+            return FakeCursor([self._decoded(document) for document in documents]).limit(kwargs.get("limit"))
+
+    def find_one(self, query=None, projection=None, sort=None, filter=None, **kwargs):
+        with self._lock:
+            query = filter if query is None else query
+            self.calls.append(("find_one", (query, projection, sort, kwargs)))
+            documents = self._find(query, sort)
+            return self._decoded(documents[0]) if documents else None
+
+    def count_documents(self, query, **kwargs):
+        with self._lock:
+            self.calls.append(("count_documents", (query, kwargs)))
+            return len(self._find(query))
+
+    def estimated_document_count(self, **kwargs):
+        self.calls.append(("estimated_document_count", (kwargs,)))
+        return len(self.documents)
+
+    def insert_one(self, document, **kwargs):
+        with self._lock:
+            self.calls.append(("insert_one", (document,)))
+            if "_id" not in document:
+                self._next_id += 1
+                document["_id"] = self._next_id
+            stored = copy.deepcopy(document)
+            self._check_unique(stored)
+            if any(other["_id"] == stored["_id"] for other in self.documents):
+                raise DuplicateKeyError(f"E11000 duplicate key error _id: {stored['_id']}")
+            self.documents.append(stored)
+            return FakeResult(inserted_id=document["_id"])
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        self.calls.append(("insert_many", (documents, ordered)))
+        return FakeResult(inserted_ids=[self.insert_one(document).inserted_id for document in documents])
+
+    def _update(self, document, update):
+        updated = copy.deepcopy(document)
+        for path, value in update.get("$set", {}).items():
+            set_path(updated, path, value)
+        for path in update.get("$unset", {}):
+            unset_path(updated, path)
+        for path, value in update.get("$inc", {}).items():
+            current = get_path(updated, path)
+            set_path(updated, path, (0 if current is _MISSING else current) + value)
+        self._check_unique(updated, ignore=document)
+        document.clear()
+        document.update(updated)
+
+    def update_one(self, query, update, upsert=False, **kwargs):
+        with self._lock:
+            self.calls.append(("update_one", (query, update)))
+            documents = self._find(query)
+            if documents:
+                self._update(documents[0], update)
+            return FakeResult(matched_count=len(documents[:1]), modified_count=len(documents[:1]))
+
+    def find_one_and_update(self, query, update, projection=None, sort=None, upsert=False, return_document=False,
+                            **kwargs):
+        with self._lock:
+            self.calls.append(("find_one_and_update", (query, update)))
+            documents = self._find(query, sort)
+            if not documents and upsert:
+                document = {key: value for key, value in query.items() if not key.startswith("$")}
+                self._update(document, update)
+                self.insert_one(document)
+                return copy.deepcopy(document) if return_document else None
+            if not documents:
+                return None
+            before = copy.deepcopy(documents[0])
+            self._update(documents[0], update)
+            return copy.deepcopy(documents[0]) if return_document else before
+
+    def find_one_and_delete(self, query, **kwargs):
+        with self._lock:
+            self.calls.append(("find_one_and_delete", (query,)))
+            documents = self._find(query)
+            if not documents:
+                return None
+            self.documents.remove(documents[0])
+            return documents[0]
+
+    def delete_one(self, query, **kwargs):
+        with self._lock:
+            self.calls.append(("delete_one", (query,)))
+            documents = self._find(query)
+            if documents:
+                self.documents.remove(documents[0])
+            return FakeResult(deleted_count=len(documents[:1]))
+
+    def delete_many(self, query, **kwargs):
+        with self._lock:
+            self.calls.append(("delete_many", (query,)))
+            documents = self._find(query)
+            for document in documents:
+                self.documents.remove(document)
+            return FakeResult(deleted_count=len(documents))
+
+
+class FakeDatabase:
+    """
+    In-memory stand-in for a pymongo Database, collections are created on first access
+    """
+    def __init__(self, name="fake"):
+        self.name = name
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(name, database=self)
+        return self.collections[name]
+
+
+class FakeGridFSBucket:
+    """
+    In-memory stand-in for gridfs.GridFSBucket storing its files and chunks in a FakeDatabase
+    """
+    def __init__(self, database, bucket_name="fs", chunk_size_bytes=255 * 1024):
+        self.files = database[f"{bucket_name}.files"]
+        self.chunks = database[f"{bucket_name}.chunks"]
+        self.chunk_size = chunk_size_bytes
+
+    def upload_from_stream_with_id(self, file_id, filename, source, metadata=None):
+        length = 0
+        for n, data in enumerate(iter(lambda: source.read(self.chunk_size), b"")):
+            self.chunks.insert_one({"files_id": file_id, "n": n, "data": data})
+            length += len(data)
+        self.files.insert_one({"_id": file_id, "length": length, "chunkSize": self.chunk_size,
+                               "filename": filename, "metadata": metadata})
+
+    def open_download_stream(self, file_id):
+        chunks = self.chunks.find({"files_id": file_id}, sort=[("n", 1)])
+        return io.BytesIO(b"".join(chunk["data"] for chunk in chunks))
+
+    def download_to_stream(self, file_id, output):
+        output.write(self.open_download_stream(file_id).read())
@@ -0,0 +1,75 @@
+# import built-ins
+import asyncio
+import unittest
+from unittest import mock
+
+# import osmongo
+from osmongo import ServerUnavailableError
+from osmongo import _aio
+from osmongo._aio import AsyncMongoAPI
+from osmongo._cache import QueryCache
+
+# import tests
+from .fakes import FakeCollection
+
+
+class FakeAsyncCollection:
+    """
+    Awaitable wrapper around a FakeCollection, standing in for a pymongo AsyncCollection
+    """
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+        self.full_name = collection.full_name
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            await asyncio.sleep(0)
+            return method(*args, **kwargs)
+        return call
+
+
+class AsyncMongoAPITest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeCollection("assets", [{"_id": 1, "code": "tree"}])
+        self.collection = FakeAsyncCollection(self.fake)
+        self.mongo = AsyncMongoAPI(cache=True)
+
+    def test_find_one_is_cached_until_written(self):
+        async def main():
+            first = await self.mongo.find_one(self.collection, {"_id": 1})
+            await self.mongo.find_one(self.collection, {"_id": 1})
+            await self.mongo.update_one(self.collection, {"_id": 1}, {"$set": {"code": "rock"}})
+            return first, await self.mongo.find_one(self.collection, {"_id": 1})
+
+        first, second = asyncio.run(main())
+        self.assertEqual((first["code"], second["code"]), ("tree", "rock"))
+        self.assertEqual([call[0] for call in self.fake.calls], ["find_one", "update_one", "find_one"])
+
+    def test_cache_is_shared_with_mongo_api(self):
+        cache = QueryCache()
+        self.assertIs(AsyncMongoAPI(cache=cache).cache, cache)
+        self.assertIsNone(AsyncMongoAPI().cache)
+
+    def test_unavailable_server_fails_fast(self):
+        self.mongo.health = mock.Mock(available=False)
+        self.mongo.health.raise_if_unavailable.side_effect = ServerUnavailableError("down")
+        with self.assertRaises(ServerUnavailableError):
+            asyncio.run(self.mongo.count(self.collection, {"code": "tree"}))
+        self.assertEqual(self.fake.calls, [])
+
+        self.mongo.health.available = True
+        self.assertEqual(asyncio.run(self.mongo.count(self.collection, {"code": "tree"})), 1)
+
+    def test_small_batches_are_validated_with_the_given_workers(self):
+        with mock.patch.object(_aio, "validate_documents") as validate:
+            asyncio.run(self.mongo.insert_many(self.collection, [{"_id": 2, "code": "rock"}], workers=2))
+        validate.assert_called_once_with([{"_id": 2, "code": "rock"}], schema=None, workers=2)
+        self.assertEqual(len(self.fake.documents), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+# import built-ins
+import datetime
+import unittest
+
+# import osmongo
+from osmongo import MongoAPI
+from osmongo._atomic import VersionConflictError, claim_query, versioned_update
+
+# import tests
+from .fakes import FakeCollection
+
+
+class AtomicHelpersTest(unittest.TestCase):
+
+    def test_versioned_update_keeps_other_increments(self):
+        self.assertEqual(versioned_update({"$set": {"lod": 2}, "$inc": {"hits": 1}}),
+                         {"$set": {"lod": 2}, "$inc": {"hits": 1, "_version": 1}})
+
+    def test_claim_query_is_combined_with_the_caller_query(self):
+        self.assertEqual(claim_query({"show": "bbx"})["$and"][0], {"show": "bbx"})
+        self.assertIn("$or", claim_query())
+
+
+class MongoAPIAtomicTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mongo = MongoAPI()
+
+    def test_counters_are_created_on_first_use(self):
+        counters = FakeCollection("counters")
+        self.assertEqual([self.mongo.increment_counter(counters, "bbx_0780") for _ in range(3)], [1, 2, 3])
+        self.assertEqual(self.mongo.increment_counter(counters, "bbx_0790", amount=10), 10)
+
+    def test_versioned_updates_detect_conflicts(self):
+        assets = FakeCollection("assets", [{"_id": 1, "code": "tree"}])
+        document = self.mongo.update_versioned(assets, {"_id": 1}, {"$set": {"lod": 1}}, 0)
+        self.assertEqual((document["lod"], document["_version"]), (1, 1))
+
+        with self.assertRaises(VersionConflictError) as context:
+            self.mongo.update_versioned(assets, {"_id": 1}, {"$set": {"lod": 2}}, 0)
+        self.assertEqual(context.exception.expected, 0)
+        self.assertEqual(self.mongo.update_versioned(assets, {"_id": 1}, {"$set": {"lod": 2}}, 1)["_version"], 2)
+
+    def test_jobs_are_claimed_once_until_their_lease_expires(self):
+        expired = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=1)
+        jobs = FakeCollection("render_jobs", [
+            {"_id": 1, "status": "queued"},
+            {"_id": 2, "status": "claimed", "lease_expires": expired},
+            {"_id": 3, "status": "done"},
+        ])
+        claimed = [self.mongo.claim_next(jobs, worker="r01", lease=600) for _ in range(3)]
+        self.assertEqual([job and job["_id"] for job in claimed], [1, 2, None])
+        self.assertEqual((claimed[0]["claimed_by"], claimed[0]["attempts"]), ("r01", 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+# import built-ins
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+# import osmongo
+from osmongo import backup
+
+
+class FakeCollection:
+    """
+    Collection returning a sorted sample of its _ids, like the $sample/$sort pipeline of split_ranges
+    """
+    def __init__(self, ids):
+        self.ids = ids
+
+    def estimated_document_count(self):
+        return len(self.ids)
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        return [{"_id": _id} for _id in self.ids]
+
+    def count_documents(self, query):
+        raise AssertionError("collections must not be scanned to be counted")
+
+    def index_information(self):
+        return {"_id_": {"key": [("_id", 1)], "v": 2}}
+
+
+class SplitRangesTest(unittest.TestCase):
+
+    def test_small_collection_is_one_range(self):
+        self.assertEqual(backup.split_ranges(FakeCollection(list(range(10))), 4), [(None, None)])
+        self.assertEqual(backup.split_ranges(FakeCollection(list(range(10000))), 1), [(None, None)])
+
+    def test_ranges_are_contiguous_and_unbounded_at_both_ends(self):
+        ranges = backup.split_ranges(FakeCollection(list(range(backup.SAMPLES_PER_RANGE * 4))), 4)
+        self.assertEqual(len(ranges), 4)
+        self.assertIsNone(ranges[0][0])
+        self.assertIsNone(ranges[-1][1])
+        for (_, upper), (lower, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(upper, lower)
+
+    def test_duplicate_bounds_are_merged(self):
+        ranges = backup.split_ranges(FakeCollection([1] * (backup.SAMPLES_PER_RANGE * 4)), 4)
+        self.assertEqual(ranges, [(None, 1), (1, None)])
+
+
+class DumpTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.mongo = mock.Mock(connection_uri="mongodb://test", database_name="bbx")
+        self.mongo.database = {"shots": FakeCollection(list(range(10)))}
+        for name, value in (("MongoAPI", mock.Mock(return_value=self.mongo)),
+                            ("_process_pool", ThreadPoolExecutor),
+                            ("_dump_range", lambda *args: (args[5], 9))):
+            patcher = mock.patch.object(backup, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_expected_counts_come_from_the_metadata(self):
+        with mock.patch.object(backup.OSMongo, "warning") as warning:
+            manifest = backup.dump(self.root, collections=["shots"], workers=1)
+        entry = manifest["collections"]["shots"]
+        self.assertEqual((entry["expected"], entry["count"]), (10, 9))
+        warning.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+# import built-ins
+import unittest
+
+# import osmongo
+from osmongo import MongoAPI
+
+# import tests
+from .fakes import FakeCollection
+
+
+class IterBatchesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.collection = FakeCollection("frames", [{"_id": index, "frame": 1010 - index} for index in range(10)])
+        self.mongo = MongoAPI()
+
+    def test_documents_come_in_bounded_lists(self):
+        batches = list(self.mongo.iter_batches(self.collection, batch_size=4))
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+        self.assertEqual([document["_id"] for batch in batches for document in batch], list(range(10)))
+
+    def test_sort_is_only_applied_when_given(self):
+        batches = self.mongo.iter_batches(self.collection, {"_id": {"$lt": 5}}, batch_size=10, sort=[("frame", 1)])
+        self.assertEqual([document["frame"] for document in next(batches)], [1006, 1007, 1008, 1009, 1010])
+        self.assertEqual(self.collection.calls[-1][1][2], None)
+
+    def test_cursor_is_closed_when_iteration_stops_early(self):
+        cursors = []
+        find = self.collection.find
+
+        def recorded_find(*args, **kwargs):
+            cursors.append(find(*args, **kwargs))
+            return cursors[-1]
+        self.collection.find = recorded_find
+
+        batches = self.mongo.iter_batches(self.collection, batch_size=3)
+        next(batches)
+        batches.close()
+        self.assertEqual(list(cursors[0]), [])
+
+    def test_batch_size_must_be_positive(self):
+        with self.assertRaises(AssertionError):
+            next(self.mongo.iter_batches(self.collection, batch_size=0))
+
+
+if __name__ == "__main__":
+    unittest.main()
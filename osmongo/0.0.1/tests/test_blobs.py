@@ -0,0 +1,135 @@
+# import built-ins
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+# import pymongo
+import gridfs
+
+# import osmongo
+from osmongo import _blobs
+
+# import tests
+from .fakes import FakeDatabase, FakeGridFSBucket
+
+
+class _Stream:
+    """
+    Non-seekable binary stream
+    """
+    def __init__(self, data):
+        self.source = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self.source.read(size)
+
+
+class BlobStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(_blobs.gridfs, "GridFSBucket", FakeGridFSBucket)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.database = FakeDatabase()
+        self.blobs = _blobs.BlobStore(self.database, "thumbnails", chunk_size=4, workers=3)
+        self.files = self.database["thumbnails.files"]
+        self.chunks = self.database["thumbnails.chunks"]
+        self.data = b"0123456789abcdefghij-"
+
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_same_content_is_stored_once_with_each_callers_metadata(self):
+        first = self.blobs.put(io.BytesIO(self.data), filename="a.jpg", metadata={"shot": "0780"})
+        second = self.blobs.put(_Stream(self.data), filename="b.jpg", metadata={"shot": "0790"})
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(len(self.files.documents), 1)
+        self.assertEqual(self.files.documents[0]["metadata"]["refs"], 2)
+        self.assertEqual(len(self.chunks.documents), 6)
+
+        first_info, second_info = self.blobs.info(first), self.blobs.info(second)
+        self.assertEqual((first_info["filename"], first_info["metadata"]["shot"]), ("a.jpg", "0780"))
+        self.assertEqual((second_info["filename"], second_info["metadata"]["shot"]), ("b.jpg", "0790"))
+        self.assertEqual(first_info["length"], len(self.data))
+
+    def test_hash_index_is_unique(self):
+        self.blobs.put(io.BytesIO(self.data))
+        keys, unique, options = [call[1] for call in self.files.calls if call[0] == "create_index"][0]
+        self.assertEqual(keys, [(_blobs.HASH_FIELD, 1)])
+        self.assertTrue(unique)
+        self.assertIn("partialFilterExpression", options)
+
+    def test_delete_only_drops_the_content_with_its_last_reference(self):
+        first = self.blobs.put(io.BytesIO(self.data))
+        second = self.blobs.put(io.BytesIO(self.data))
+
+        self.blobs.delete(first)
+        self.assertEqual(self.blobs.get(second), self.data)
+        with self.assertRaises(gridfs.errors.NoFile):
+            self.blobs.get(first)
+
+        self.blobs.delete(second)
+        self.assertEqual(self.files.documents, [])
+        self.assertEqual(self.chunks.documents, [])
+
+    def test_content_is_uploaded_again_after_its_deletion(self):
+        self.blobs.delete(self.blobs.put(io.BytesIO(self.data)))
+        blob_id = self.blobs.put(_Stream(self.data))
+        self.assertEqual(self.blobs.get(blob_id), self.data)
+        self.assertEqual(self.files.documents[0]["metadata"]["refs"], 1)
+
+    def test_concurrent_upload_of_the_same_content_is_dropped(self):
+        existing = self.blobs.put(io.BytesIO(self.data))
+        add_reference = self.blobs._add_reference
+        calls = []
+
+        def late_add_reference(sha256):
+            # the first lookup misses the content, as if it was stored meanwhile
+            calls.append(sha256)
+            return None if len(calls) == 1 else add_reference(sha256)
+
+        with mock.patch.object(self.blobs, "_add_reference", late_add_reference):
+            blob_id = self.blobs.put(io.BytesIO(self.data))
+
+        self.assertEqual(len(self.files.documents), 1)
+        self.assertEqual(len(self.chunks.documents), 6)
+        self.assertEqual(self.blobs.info(blob_id)["blob"], self.blobs.info(existing)["blob"])
+
+    def test_download_and_read_range(self):
+        blob_id = self.blobs.put(io.BytesIO(self.data))
+        path = os.path.join(self.root, "thumb.jpg")
+        self.assertEqual(self.blobs.download(blob_id, path), len(self.data))
+        with open(path, "rb") as handle:
+            self.assertEqual(handle.read(), self.data)
+
+        self.assertEqual(self.blobs.read_range(blob_id, 3, 10), self.data[3:10])
+        self.assertEqual(self.blobs.read_range(blob_id, 18), self.data[18:])
+        self.assertEqual(self.blobs.read_range(blob_id, 30), b"")
+
+    def test_missing_or_truncated_chunks_are_corrupt(self):
+        blob_id = self.blobs.put(io.BytesIO(self.data))
+        path = os.path.join(self.root, "thumb.jpg")
+
+        self.chunks.documents[2]["data"] = b"89"
+        with self.assertRaises(gridfs.errors.CorruptGridFile):
+            self.blobs.read_range(blob_id, 0)
+        with self.assertRaises(gridfs.errors.CorruptGridFile):
+            self.blobs.download(blob_id, path)
+        self.assertEqual(os.listdir(self.root), [])
+
+        del self.chunks.documents[2]
+        with self.assertRaises(gridfs.errors.CorruptGridFile):
+            self.blobs.read_range(blob_id, 6, 12)
+
+        del self.chunks.documents[-1]
+        with self.assertRaises(gridfs.errors.CorruptGridFile):
+            self.blobs.read_range(blob_id, 18)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+# import built-ins
+import unittest
+
+# import pymongo
+from pymongo import InsertOne, UpdateMany, DeleteOne
+
+# import osmongo
+from osmongo import _bulk
+
+
+class GuardFilterTest(unittest.TestCase):
+
+    def test_match_all_filters_are_refused(self):
+        self.assertTrue(_bulk.is_match_all(None))
+        for query in ({}, {"_id": {"$exists": True}}, {"$or": [{}]}, {"$or": [{"code": "bbx"}, {}]},
+                      {"$and": [{}]}, {"$and": [{}, {"$or": [{}]}]}):
+            with self.assertRaises(ValueError, msg=query):
+                _bulk.guard_filter(query)
+
+    def test_selective_filters_are_accepted(self):
+        for query in ({"code": "bbx"}, {"$or": [{"code": "bbx"}, {"code": "pir"}]},
+                      {"$and": [{}, {"code": "bbx"}]}, {"$or": [{}], "show": "bbx"}, {"_id": {"$exists": False}}):
+            _bulk.guard_filter(query)
+
+    def test_non_dict_filter_is_refused(self):
+        with self.assertRaises(TypeError):
+            _bulk.guard_filter([("code", "bbx")])
+
+    def test_operation_filter(self):
+        self.assertEqual(_bulk.operation_filter(UpdateMany({"show": "bbx"}, {"$set": {"tag": 1}})), {"show": "bbx"})
+        self.assertEqual(_bulk.operation_filter(DeleteOne({})), {})
+
+
+class ChunksTest(unittest.TestCase):
+
+    def test_chunks_keep_every_operation_in_order(self):
+        operations = [InsertOne({"index": index}) for index in range(10)]
+        chunks = list(_bulk.chunks(operations, 4))
+        self.assertEqual([offset for offset, _ in chunks], [0, 4, 8])
+        self.assertEqual([len(chunk) for _, chunk in chunks], [4, 4, 2])
+        self.assertEqual([operation for _, chunk in chunks for operation in chunk], operations)
+
+    def test_no_chunk_without_operations(self):
+        self.assertEqual(list(_bulk.chunks([], 4)), [])
+
+    def test_merge_result_shifts_indexes(self):
+        result = _bulk.new_result()
+        _bulk.merge_result(result, {"nInserted": 2, "upserted": [{"index": 1, "_id": "a"}]}, 0)
+        _bulk.merge_result(result, {"nInserted": 1, "writeErrors": [{"index": 0, "errmsg": "duplicate"}]}, 4)
+        self.assertEqual(result["nInserted"], 3)
+        self.assertEqual(result["batches"], 2)
+        self.assertEqual(result["upserted"], [{"index": 1, "_id": "a"}])
+        self.assertEqual(result["writeErrors"], [{"index": 4, "errmsg": "duplicate"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
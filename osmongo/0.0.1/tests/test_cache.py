@@ -0,0 +1,101 @@
+# import built-ins
+import unittest
+from unittest import mock
+
+# import osmongo
+from osmongo import MongoAPI
+from osmongo import _cache
+from osmongo._cache import QueryCache
+
+# import tests
+from .fakes import FakeCollection, FakeDatabase
+
+
+class QueryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.database = FakeDatabase("osvfx")
+        self.shows = self.database["shows"]
+        self.shots = self.database["shots"]
+        self.cache = QueryCache(max_size=2, ttl=30, collection_ttls={"osvfx.shots": 5})
+
+    def test_top_level_keys_are_normalized(self):
+        self.assertEqual(QueryCache.make_key(self.shows, {"a": 1, "b": 2}, None),
+                         QueryCache.make_key(self.shows, {"b": 2, "a": 1}, None))
+        self.assertNotEqual(QueryCache.make_key(self.shows, {"a": {"x": 1, "y": 2}}, None),
+                            QueryCache.make_key(self.shows, {"a": {"y": 2, "x": 1}}, None))
+
+    def test_entries_expire_with_their_collection_ttl(self):
+        show, shot = QueryCache.make_key(self.shows, {}, None), QueryCache.make_key(self.shots, {}, None)
+        with mock.patch.object(_cache.time, "monotonic", return_value=100):
+            self.cache.set(show, {"code": "bbx"})
+            self.cache.set(shot, None)
+        with mock.patch.object(_cache.time, "monotonic", return_value=110):
+            self.assertEqual(self.cache.get(show), (True, {"code": "bbx"}))
+            self.assertEqual(self.cache.get(shot), (False, None))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        keys = [QueryCache.make_key(self.shows, {"code": code}, None) for code in ("bbx", "pir", "kgf")]
+        self.cache.set(keys[0], {"code": "bbx"})
+        self.cache.set(keys[1], {"code": "pir"})
+        self.cache.get(keys[0])
+        self.cache.set(keys[2], {"code": "kgf"})
+        self.assertEqual([self.cache.get(key)[0] for key in keys], [True, False, True])
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_cached_documents_are_copies(self):
+        key = QueryCache.make_key(self.shows, {}, None)
+        document = {"code": "bbx"}
+        self.cache.set(key, document)
+        document["code"] = "pir"
+        self.cache.get(key)[1]["code"] = "kgf"
+        self.assertEqual(self.cache.get(key)[1], {"code": "bbx"})
+
+    def test_invalidation_is_per_collection(self):
+        show, shot = QueryCache.make_key(self.shows, {}, None), QueryCache.make_key(self.shots, {}, None)
+        self.cache.set(show, {"code": "bbx"})
+        self.cache.set(shot, {"code": "0780"})
+        self.cache.invalidate(self.shows)
+        self.assertEqual((self.cache.get(show)[0], self.cache.get(shot)[0]), (False, True))
+        self.cache.invalidate()
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_results_read_before_an_invalidation_are_dropped(self):
+        key = QueryCache.make_key(self.shows, {}, None)
+        generation = self.cache.generation(key)
+        self.cache.invalidate(self.shows)
+        self.cache.set(key, {"code": "stale"}, generation)
+        self.assertEqual(self.cache.get(key), (False, None))
+
+        generation = self.cache.generation(key)
+        self.cache.invalidate()
+        self.cache.set(key, {"code": "stale"}, generation)
+        self.assertEqual(self.cache.get(key), (False, None))
+
+
+class MongoAPICacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.collection = FakeCollection("shows", [{"_id": 1, "code": "bbx"}])
+        self.mongo = MongoAPI(cache=True)
+
+    def queries(self):
+        return [call for call in self.collection.calls if call[0] == "find_one"]
+
+    def test_find_one_is_served_from_the_cache_until_written(self):
+        self.assertEqual(self.mongo.find_one(self.collection, {"_id": 1})["code"], "bbx")
+        self.assertEqual(self.mongo.find_one(self.collection, {"_id": 1})["code"], "bbx")
+        self.assertEqual(len(self.queries()), 1)
+
+        self.mongo.update_one(self.collection, {"_id": 1}, {"$set": {"code": "pir"}})
+        self.assertEqual(self.mongo.find_one(self.collection, {"_id": 1})["code"], "pir")
+        self.assertEqual(len(self.queries()), 2)
+
+    def test_missing_documents_are_cached(self):
+        self.assertIsNone(self.mongo.find_one(self.collection, {"_id": 2}))
+        self.assertIsNone(self.mongo.find_one(self.collection, {"_id": 2}))
+        self.assertEqual(len(self.queries()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
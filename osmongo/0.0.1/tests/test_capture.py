@@ -0,0 +1,162 @@
+# import built-ins
+import io
+import os
+import asyncio
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+# import pymongo
+from pymongo import InsertOne, UpdateOne, DeleteOne, DeleteMany, ReplaceOne
+
+# import osmongo
+from osmongo import MongoAPI, replay
+from osmongo._capture import WorkloadRecorder, captured, encode_operations, decode_operations
+
+# import tests
+from .fakes import FakeCollection, FakeCursor, FakeDatabase
+
+
+class _Operations:
+    """
+    Captured operations on fake collections
+    """
+    workload = None
+
+    @captured
+    def find(self, collection, query={}):
+        return collection.find(query)
+
+    @captured
+    def iter_ids(self, collection, query={}):
+        for document in collection.find(query):
+            yield document["_id"]
+
+    @captured
+    def write_raw(self, collection, output, query={}):
+        return self.find(collection, query)
+
+    @captured
+    def bulk_write(self, collection, operations):
+        return len(operations)
+
+    @captured
+    def fail(self, collection):
+        raise KeyError("code")
+
+    @captured
+    async def find_one(self, collection, query):
+        await asyncio.sleep(0)
+        return collection.find_one(query)
+
+
+class CaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, "workload.ndjson")
+        self.operations = _Operations()
+        self.operations.workload = WorkloadRecorder(self.path)
+        self.collection = FakeDatabase("bbx")["publishes"]
+        for index in range(3):
+            self.collection.insert_one({"_id": index, "code": f"pub{index}"})
+
+    def captured_operations(self):
+        self.operations.workload.close()
+        return list(replay.read_workload(self.path))
+
+    def test_cursors_are_returned_as_is(self):
+        cursor = self.operations.find(self.collection, {"code": "pub1"})
+        self.assertIsInstance(cursor, FakeCursor)
+        operation, = self.captured_operations()
+        self.assertEqual((operation["op"], operation["database"], operation["collection"]), ("find", "bbx", "publishes"))
+        self.assertEqual(operation["arguments"], {"query": {"code": "pub1"}})
+        self.assertIsNone(operation["duration"])
+
+    def test_generators_are_written_once_exhausted(self):
+        ids = self.operations.iter_ids(self.collection)
+        self.assertEqual(self.operations.workload.recorded, 0)
+        self.assertEqual(list(ids), [0, 1, 2])
+        operation, = self.captured_operations()
+        self.assertEqual(operation["op"], "iter_ids")
+        self.assertGreaterEqual(operation["duration"], 0)
+
+    def test_nested_operations_and_uncaptured_arguments(self):
+        self.operations.write_raw(self.collection, io.BytesIO(), {"code": "pub2"})
+        operation, = self.captured_operations()
+        self.assertEqual(operation["op"], "write_raw")
+        self.assertEqual(operation["arguments"], {"query": {"code": "pub2"}})
+
+    def test_bulk_write_operations_are_encoded(self):
+        operations = [InsertOne({"code": "pub3"}), UpdateOne({"code": "pub0"}, {"$set": {"status": "ip"}}, upsert=True),
+                      ReplaceOne({"code": "pub1"}, {"code": "pub1"}), DeleteMany({"status": "na"})]
+        self.operations.bulk_write(self.collection, operations)
+        operation, = self.captured_operations()
+        self.assertEqual(decode_operations(operation["arguments"]["operations"]), operations)
+        self.assertEqual(encode_operations(decode_operations(operation["arguments"]["operations"])),
+                         operation["arguments"]["operations"])
+
+    def test_errors_and_skipped_operations(self):
+        with self.assertRaises(KeyError):
+            self.operations.fail(self.collection)
+        self.operations.find(self.collection, {"data": object()})
+        self.assertEqual(self.operations.workload.skipped, 1)
+        operation, = self.captured_operations()
+        self.assertEqual(operation["error"], "KeyError")
+
+    def test_coroutines_are_captured(self):
+        async def main():
+            return await asyncio.gather(*(self.operations.find_one(self.collection, {"_id": index}) for index in range(3)))
+
+        documents = asyncio.run(main())
+        self.assertEqual([document["_id"] for document in documents], [0, 1, 2])
+        operations = self.captured_operations()
+        self.assertEqual([operation["op"] for operation in operations], ["find_one"] * 3)
+
+
+class MongoAPICaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, "workload.ndjson")
+        self.addCleanup(MongoAPI.stop_capture)
+
+    def test_find_keeps_returning_a_cursor(self):
+        collection = FakeCollection("publishes", [{"_id": 1, "code": "pub1"}])
+        mongo = MongoAPI()
+        MongoAPI.start_capture(self.path)
+        cursor = mongo.find(collection, {"code": "pub1"}, sort=[("code", 1)]).limit(1)
+        self.assertEqual(list(cursor), [{"_id": 1, "code": "pub1"}])
+        MongoAPI.stop_capture()
+
+        operation, = replay.read_workload(self.path)
+        self.assertEqual(operation["arguments"]["sort"], [["code", 1]])
+
+    def test_replay_runs_the_captured_operations(self):
+        collection = FakeDatabase("bbx")["publishes"]
+        mongo = MongoAPI()
+        MongoAPI.start_capture(self.path)
+        mongo.insert_one(collection, {"_id": 1, "code": "pub1"})
+        mongo.update_one(collection, {"_id": 1}, {"$set": {"status": "ip"}})
+        mongo.find(collection, {"code": "pub1"})
+        MongoAPI.workload.write(0, "write_raw", collection, 0, None, '{"query": {}}')
+        MongoAPI.workload.write(0, "bulk_write", collection, 0, None,
+                                '{"operations": [{"model": "DeleteOne", "arguments": [{"_id": 1}]}]}')
+        MongoAPI.stop_capture()
+
+        replayed = mock.MagicMock()
+        replayed.database.client = {"bbx_replay": FakeDatabase("bbx_replay")}
+        with mock.patch.object(replay, "MongoAPI", return_value=replayed):
+            results = replay.replay(self.path, speed=0, database_map={"bbx": "bbx_replay"})
+
+        self.assertEqual(sorted(results["timings"]), ["bulk_write", "find", "insert_one", "update_one", "write_raw"])
+        self.assertEqual(replayed.find.call_args.kwargs["collection"].full_name, "bbx_replay.publishes")
+        self.assertEqual(replayed.bulk_write.call_args.kwargs["operations"], [DeleteOne({"_id": 1})])
+        self.assertEqual(replayed.write_raw.call_args.kwargs["output"].name, os.devnull)
+
+
+if __name__ == "__main__":
+    unittest.main()
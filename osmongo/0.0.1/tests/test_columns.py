@@ -0,0 +1,44 @@
+# import built-ins
+import unittest
+
+# import numpy
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# import tests
+from .fakes import FakeCollection
+
+
+@unittest.skipIf(numpy is None, "numpy is required by find_columns")
+class FindColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        from osmongo._columns import find_columns
+        self.find_columns = find_columns
+        self.collection = FakeCollection("render_stats", [
+            {"_id": 1, "frame": 1001, "stats": {"cpu": 1.5, "host": "r01"}},
+            {"_id": 2, "frame": 1002, "stats": {"cpu": "2.5", "host": "r02"}},
+            {"_id": 3, "frame": None, "stats": {"cpu": True}},
+            {"_id": 4, "frame": 1004.0},
+        ])
+
+    def test_only_numbers_fill_numeric_columns(self):
+        columns = self.find_columns(self.collection, {}, ["frame", "stats.cpu"], dtypes={"frame": "int32"})
+        self.assertEqual(columns["frame"].tolist(), [1001, 1002, None, 1004])
+        self.assertEqual(columns["stats.cpu"].tolist(), [1.5, None, 1.0, None])
+
+    def test_object_columns_keep_any_value(self):
+        columns = self.find_columns(self.collection, {}, ["stats.host"], dtypes={"stats.host": object})
+        self.assertEqual(columns["stats.host"].tolist(), ["r01", "r02", None, None])
+
+    def test_overlapping_fields_are_fetched_once(self):
+        columns = self.find_columns(self.collection, {}, ["stats.cpu", "stats", "frame"], dtypes={"stats": object})
+        self.assertEqual(self.collection.calls[-1][1][1], {"stats": 1, "frame": 1, "_id": 0})
+        self.assertEqual(columns["stats.cpu"].tolist(), [1.5, None, 1.0, None])
+        self.assertEqual(columns["stats"][0], {"cpu": 1.5, "host": "r01"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+# import built-ins
+import asyncio
+import unittest
+
+# import osmongo
+from osmongo import MongoAPI
+from osmongo._aio import AsyncMongoAPI
+
+# import tests
+from .fakes import FakeCollection
+from .test_aio import FakeAsyncCollection
+
+
+class CountTest(unittest.TestCase):
+
+    def setUp(self):
+        self.collection = FakeCollection("shots", [{"_id": 1, "code": "0780"}, {"_id": 2, "code": "0790"}])
+
+    def methods(self):
+        return [call[0] for call in self.collection.calls]
+
+    def test_counts_are_exact_by_default(self):
+        mongo = MongoAPI()
+        self.assertEqual(mongo.count(self.collection), 2)
+        self.assertEqual(mongo.count(self.collection, {"code": "0780"}), 1)
+        self.assertEqual(self.methods(), ["count_documents", "count_documents"])
+
+    def test_empty_queries_can_use_the_metadata_count(self):
+        self.assertEqual(MongoAPI().count(self.collection, exact=False), 2)
+        self.assertEqual(self.methods(), ["estimated_document_count"])
+
+    def test_async_counts_are_exact_by_default(self):
+        mongo = AsyncMongoAPI()
+        collection = FakeAsyncCollection(self.collection)
+        self.assertEqual(asyncio.run(mongo.count(collection)), 2)
+        self.assertEqual(asyncio.run(mongo.count(collection, exact=False)), 2)
+        self.assertEqual(self.methods(), ["count_documents", "estimated_document_count"])
+
+
+if __name__ == "__main__":
+    unittest.main()
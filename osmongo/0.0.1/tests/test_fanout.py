@@ -0,0 +1,63 @@
+# import built-ins
+import datetime
+import unittest
+
+# import pymongo
+from bson import MaxKey, MinKey, ObjectId
+
+# import osmongo
+from osmongo._fanout import fan_out, _bson_key
+
+# Module Constants
+DOCUMENTS = {
+    "bbx": [{"_id": 1, "frame": 1001}, {"_id": 2, "frame": 1004}],
+    "pir": [{"_id": 4}, {"_id": 3, "frame": 1002}, {"_id": 5, "frame": 1005}],
+    "kgf": [],
+}
+
+
+def _run(database_name):
+    if database_name == "down":
+        raise ConnectionError("connection refused")
+    return iter(DOCUMENTS[database_name])
+
+
+class BsonKeyTest(unittest.TestCase):
+
+    def test_values_sort_in_bson_order(self):
+        ordered = [MinKey(), None, 1, 2.5, "bbx", {"a": 1}, [1], b"x", ObjectId(), True,
+                   datetime.datetime(2024, 5, 1), MaxKey()]
+        self.assertEqual(sorted(reversed(ordered), key=_bson_key), ordered)
+
+
+class FanOutTest(unittest.TestCase):
+
+    def test_unordered_results_of_every_database(self):
+        results = list(fan_out(["bbx", "pir", "kgf"], _run, workers=2))
+        self.assertEqual(sorted(document["_id"] for _, document in results), [1, 2, 3, 4, 5])
+        self.assertEqual({database_name for database_name, _ in results}, {"bbx", "pir"})
+
+    def test_sorted_results_are_merged_in_bson_order(self):
+        results = fan_out(["bbx", "pir"], _run, sort=[("frame", 1)])
+        self.assertEqual([document["_id"] for _, document in results], [4, 1, 3, 2, 5])
+
+        def descending(database_name):
+            return reversed(list(_run(database_name)))
+        results = fan_out(["bbx", "pir"], descending, sort=[("frame", -1)])
+        self.assertEqual([document["_id"] for _, document in results], [5, 2, 3, 1, 4])
+
+    def test_failing_databases_are_skipped(self):
+        errors = {}
+        results = list(fan_out(["bbx", "down"], _run, errors=errors))
+        self.assertEqual(len(results), 2)
+        self.assertIsInstance(errors["down"], ConnectionError)
+
+    def test_results_can_be_closed_early(self):
+        results = fan_out(["bbx", "pir"], _run, sort=[("frame", 1)])
+        self.assertEqual(next(results)[1]["_id"], 4)
+        results.close()
+        self.assertEqual(list(results), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+# import built-ins
+import time
+import unittest
+from unittest import mock
+
+# import osmongo
+from osmongo import MongoAPI, MongoClientRegistry, HealthChecker, ServerUnavailableError
+from osmongo import osmongo as osmongo_module
+from osmongo import _pool
+
+
+class _Client:
+    """
+    MongoClient answering ping until 'down' is set
+    """
+    def __init__(self):
+        self.down = False
+        self.pings = 0
+        self.admin = self
+
+    def command(self, name):
+        self.pings += 1
+        if self.down:
+            raise ConnectionError("connection refused")
+        return {"ok": 1}
+
+    def close(self):
+        self.down = True
+
+
+class HealthCheckerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = _Client()
+        self.changes = []
+        self.health = HealthChecker(self.client, "mongodb://test", backoff=1.0, max_backoff=4.0, recheck=60,
+                                    on_change=lambda health: self.changes.append(health.available))
+
+    def test_availability_changes_are_reported(self):
+        self.assertTrue(self.health.check())
+        self.client.down = True
+        self.assertFalse(self.health.check())
+        self.assertFalse(self.health.check())
+        self.assertEqual(self.changes, [True, False])
+        self.assertEqual(self.health.failures, 2)
+
+    def test_backoff_is_capped(self):
+        self.client.down = True
+        for _ in range(10):
+            self.health.check()
+        self.assertTrue(2.0 <= self.health.next_delay() <= 6.0)
+
+    def test_fail_fast_until_recheck(self):
+        self.client.down = True
+        self.health.check()
+        with self.assertRaises(ServerUnavailableError):
+            self.health.raise_if_unavailable()
+        self.assertEqual(self.client.pings, 1)
+
+        self.client.down = False
+        self.health.last_check = time.time() - 120
+        self.health.raise_if_unavailable()
+        self.assertTrue(self.health.available)
+        self.assertEqual(self.client.pings, 2)
+
+
+class SharedHealthTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(_pool.pymongo, "MongoClient", side_effect=lambda *args, **kwargs: _Client())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(MongoClientRegistry.discard, "mongodb://shared", 10)
+
+    def test_one_checker_per_server(self):
+        health = MongoClientRegistry.shared_health("mongodb://shared", 10)
+        self.assertIs(MongoClientRegistry.shared_health("mongodb://shared", 10), health)
+        self.assertIs(MongoClientRegistry.health("mongodb://shared", 10), health)
+
+    def test_private_clients_share_the_checker(self):
+        with mock.patch.object(osmongo_module.pymongo, "MongoClient") as client_class:
+            first = MongoAPI("mongodb://shared", 10, pooled=False)
+            second = MongoAPI("mongodb://shared", 10, pooled=False)
+            first.database, second.database
+            self.assertIs(first.health, second.health)
+            self.assertIs(first.health, MongoClientRegistry.health("mongodb://shared", 10))
+
+            client = first._client
+            first.disconnect()
+            client.close.assert_called_once_with()
+            self.assertIsNone(first._client)
+            self.assertIsNone(first._database)
+            self.assertIsNone(first._pid)
+            self.assertIsNone(first._close)
+            self.assertIs(first._is_installed, False)
+
+            created = client_class.call_count
+            first.database
+            self.assertTrue(first._is_installed)
+            self.assertEqual(client_class.call_count, created + 1)
+            second.disconnect()
+            first.disconnect()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+# import built-ins
+import unittest
+
+# import osmongo
+from osmongo._indexes import (index_models, missing_indexes, query_shape, query_fields, suggest_index, plan_stages,
+                              QueryShapeRecorder, explain_shape)
+
+# import tests
+from .fakes import FakeCollection
+
+# Module Constants
+COLLSCAN_PLAN = {"queryPlanner": {"winningPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}}}
+COVERED_PLAN = {"queryPlanner": {"winningPlan": {"stage": "PROJECTION_COVERED", "inputStage": {"stage": "IXSCAN"}}}}
+
+
+def _collection(indexes, plan=None):
+    """
+    FakeCollection with 'indexes' (list of key lists) and cursors explaining to 'plan'
+    """
+    collection = FakeCollection("versions")
+    collection.index_information = lambda: {
+        "_".join(f"{key}_{direction}" for key, direction in keys): {"key": keys} for keys in [[("_id", 1)]] + indexes}
+    find = collection.find
+
+    def explained_find(*args, **kwargs):
+        cursor = find(*args, **kwargs)
+        cursor.explain = lambda: plan
+        return cursor
+    collection.find = explained_find
+    return collection
+
+
+class IndexSpecTest(unittest.TestCase):
+
+    def test_only_missing_indexes_are_returned(self):
+        models = index_models([{"keys": [["show", 1], ["shot", 1]], "unique": True}, {"keys": [["created_at", -1]]}])
+        self.assertEqual(models[0].document["unique"], True)
+        missing = missing_indexes(_collection([[("show", 1), ("shot", 1)]]), models)
+        self.assertEqual([model.document["name"] for model in missing], ["created_at_-1"])
+
+
+class QueryShapeTest(unittest.TestCase):
+
+    def test_values_are_replaced(self):
+        self.assertEqual(query_shape({"show": "bbx", "version": {"$gt": 3}, "$or": [{"a": 1}], "tags": ["x"]}),
+                         {"show": "?", "version": {"$gt": "?"}, "$or": [{"a": "?"}], "tags": "?"})
+
+    def test_fields_follow_the_equality_sort_range_rule(self):
+        query = {"version": {"$gte": 3}, "$and": [{"show": "bbx"}, {"shot": {"$in": ["0780"]}}], "$or": [{"a": 1}]}
+        self.assertEqual(query_fields(query), (["show", "shot"], ["version"]))
+        self.assertEqual(suggest_index(query, [("created_at", -1), ("show", 1)]),
+                         [("show", 1), ("shot", 1), ("created_at", -1), ("version", 1)])
+
+    def test_plan_stages(self):
+        plan = {"stage": "FETCH", "inputStage": {"stage": "OR", "inputStages": [{"stage": "IXSCAN"}, {"stage": "COLLSCAN"}]}}
+        self.assertEqual(plan_stages(plan), ["FETCH", "OR", "IXSCAN", "COLLSCAN"])
+
+
+class QueryShapeRecorderTest(unittest.TestCase):
+
+    def test_shapes_are_counted_and_bounded(self):
+        recorder = QueryShapeRecorder(max_shapes=2)
+        collection = FakeCollection("versions")
+        for code in ("bbx", "pir", "kgf"):
+            recorder.record(collection, {"show": code})
+        recorder.record(collection, {"version": 1})
+        recorder.record(collection, {"shot": "0780"})
+
+        shapes = recorder.shapes()
+        self.assertEqual([(shape["query"], shape["count"]) for shape in shapes], [({"show": "bbx"}, 3), ({"version": 1}, 1)])
+        recorder.clear()
+        self.assertEqual(recorder.shapes(), [])
+
+
+class ExplainShapeTest(unittest.TestCase):
+
+    def shape(self, collection):
+        return {"collection": collection, "query": {"show": "bbx"}, "projection": None, "sort": [("version", -1)],
+                "count": 4}
+
+    def test_collection_scans_get_a_suggested_index(self):
+        report = explain_shape(self.shape(_collection([], COLLSCAN_PLAN)))
+        self.assertEqual((report["collscan"], report["covered"]), (True, False))
+        self.assertEqual(report["suggested_index"], [("show", 1), ("version", -1)])
+
+    def test_existing_indexes_are_not_suggested_again(self):
+        report = explain_shape(self.shape(_collection([[("show", 1), ("version", -1)]], COLLSCAN_PLAN)))
+        self.assertIsNone(report["suggested_index"])
+
+    def test_covered_queries(self):
+        report = explain_shape(self.shape(_collection([], COVERED_PLAN)))
+        self.assertEqual((report["collscan"], report["covered"], report["suggested_index"]), (False, True, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# import built-ins
+import unittest
+from unittest import mock
+
+# import osmongo
+from osmongo import MongoAPI, ServerUnavailableError
+from osmongo._loader import DocumentLoader, key_values
+
+# import tests
+from .fakes import FakeCollection
+
+
+class KeyValuesTest(unittest.TestCase):
+
+    def test_dotted_keys_and_arrays(self):
+        self.assertEqual(key_values({"_id": 1}, "_id"), [1])
+        self.assertEqual(key_values({"asset": {"code": "tree"}}, "asset.code"), ["tree"])
+        self.assertEqual(key_values({"tags": ["a", "b"]}, "tags"), ["a", "b"])
+        self.assertEqual(key_values({"shots": [{"code": "0780"}, {"code": "0790"}, 3]}, "shots.code"), ["0780", "0790"])
+        self.assertEqual(key_values({"asset": None}, "asset.code"), [])
+
+
+class DocumentLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.collection = FakeCollection("assets", [
+            {"_id": 1, "code": "tree", "meta": {"sku": "A1"}, "tags": ["green", "tall"]},
+            {"_id": 2, "code": "rock", "meta": {"sku": "B2"}, "tags": ["grey"]},
+        ])
+
+    def queries(self):
+        return [call[1][0] for call in self.collection.calls if call[0] == "find"]
+
+    def test_lookups_are_coalesced(self):
+        loader = DocumentLoader(self.collection, window=60)
+        futures = [loader.load(key) for key in (1, 2, 1, 3)]
+        loader.dispatch()
+
+        self.assertEqual([future.result() and future.result()["code"] for future in futures], ["tree", "rock", "tree", None])
+        self.assertEqual(len(self.queries()), 1)
+        self.assertEqual(sorted(self.queries()[0]["_id"]["$in"]), [1, 2, 3])
+        self.assertEqual(loader.stats(), {"lookups": 4, "queries": 1, "saved": 3})
+
+    def test_max_batch_size_dispatches_immediately(self):
+        loader = DocumentLoader(self.collection, window=60, max_batch_size=2)
+        first, second = loader.load(1), loader.load(2)
+        self.assertTrue(first.done() and second.done())
+
+    def test_dotted_and_array_keys(self):
+        loader = DocumentLoader(self.collection, key="meta.sku", projection={"code": 1}, window=60)
+        self.assertEqual([document["code"] for document in loader.load_many(["B2", "A1"])], ["rock", "tree"])
+        self.assertEqual(self.collection.calls[-1][1][1], {"code": 1, "meta.sku": 1})
+
+        loader = DocumentLoader(self.collection, key="tags", window=60)
+        self.assertEqual([document["_id"] for document in loader.load_many(["tall", "green", "grey"])], [1, 1, 2])
+
+    def test_errors_fail_every_pending_lookup(self):
+        self.collection.find = mock.Mock(side_effect=RuntimeError("down"))
+        loader = DocumentLoader(self.collection, window=60)
+        futures = [loader.load(key) for key in (1, 2)]
+        loader.dispatch()
+        for future in futures:
+            self.assertIsInstance(future.exception(), RuntimeError)
+
+
+class MongoAPILoaderTest(unittest.TestCase):
+
+    def test_queries_go_through_find(self):
+        collection = FakeCollection("assets", [{"_id": 1, "code": "tree"}])
+        mongo = MongoAPI()
+        loader = mongo.loader(collection, window=60)
+        self.assertEqual(loader.load_many([1])[0]["code"], "tree")
+
+        mongo.health = mock.Mock()
+        mongo.health.raise_if_unavailable.side_effect = ServerUnavailableError("down")
+        future = loader.load(2)
+        loader.dispatch()
+        self.assertIsInstance(future.exception(), ServerUnavailableError)
+
+
+if __name__ == "__main__":
+    unittest.main()
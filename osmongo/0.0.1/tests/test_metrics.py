@@ -0,0 +1,60 @@
+# import built-ins
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+
+# import osmongo
+from osmongo._metrics import CommandMetrics, LATENCY_BUCKETS_MS
+
+
+def _event(command_name, command, request_id, duration_micros=0, reply=None):
+    """
+    Command event as passed to the pymongo command listeners
+    """
+    return SimpleNamespace(command_name=command_name, command=command, database_name="osvfx", connection_id=("db", 27017),
+                           request_id=request_id, duration_micros=duration_micros, reply=reply or {"ok": 1})
+
+
+class CommandMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = mock.Mock()
+        self.metrics = CommandMetrics(slow_query_ms=100, track_bytes=True, logger=self.logger)
+        self.command, self.pool = self.metrics.listeners()
+
+    def run_command(self, command_name, command, request_id, duration_ms, failed=False):
+        self.command.started(_event(command_name, command, request_id))
+        event = _event(command_name, command, request_id, duration_micros=duration_ms * 1000)
+        (self.command.failed if failed else self.command.succeeded)(event)
+
+    def test_commands_are_counted_per_name_and_collection(self):
+        self.run_command("find", {"find": "shows", "filter": {"code": "bbx"}}, 1, 3)
+        self.run_command("find", {"find": "shows", "filter": {"code": "pir"}}, 2, 7, failed=True)
+        self.run_command("getMore", {"getMore": 12, "collection": "shows"}, 3, 1)
+
+        snapshot = self.metrics.snapshot()
+        find = snapshot["commands"]["find"]
+        self.assertEqual((find["count"], find["failed"], find["mean_ms"], find["max_ms"]), (2, 1, 5.0, 7.0))
+        self.assertEqual(find["histogram"][LATENCY_BUCKETS_MS.index(5)], 1)
+        self.assertEqual(find["histogram"][LATENCY_BUCKETS_MS.index(10)], 1)
+        self.assertGreater(find["bytes_out"], 0)
+        self.assertEqual(snapshot["collections"], {"osvfx.shows": {"find": 2, "getMore": 1}})
+
+    def test_slow_queries_are_logged(self):
+        self.run_command("find", {"find": "shows", "filter": {"code": "bbx"}}, 1, 250)
+        self.assertEqual(self.metrics.snapshot()["slow_queries"], 1)
+        self.assertIn("{'code': 'bbx'}", self.logger.warning.call_args[0][0])
+
+    def test_pool_events_and_reset(self):
+        self.pool.connection_created(None)
+        self.pool.connection_checked_out(None)
+        self.pool.connection_checked_out(None)
+        self.assertEqual(self.metrics.snapshot()["pool"], {"connections_created": 1, "checked_out": 2})
+
+        self.metrics.reset()
+        snapshot = self.metrics.snapshot()
+        self.assertEqual((snapshot["commands"], snapshot["pool"], snapshot["slow_queries"]), ({}, {}, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
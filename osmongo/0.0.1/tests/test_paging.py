@@ -0,0 +1,78 @@
+# import built-ins
+import unittest
+
+# import pymongo
+from bson import ObjectId
+
+# import osmongo
+from osmongo import _paging
+
+
+class TokenTest(unittest.TestCase):
+
+    def test_token_round_trip(self):
+        document = {"_id": ObjectId(), "frame": 1001}
+        token = _paging.encode_token("frame", -1, document)
+        state = _paging.decode_token(token, "frame", -1)
+        self.assertEqual(state["id"], document["_id"])
+        self.assertEqual(state["v"], 1001)
+
+    def test_token_of_another_sort_is_refused(self):
+        token = _paging.encode_token("frame", 1, {"_id": 1, "frame": 1001})
+        with self.assertRaises(ValueError):
+            _paging.decode_token(token, "frame", -1)
+        with self.assertRaises(ValueError):
+            _paging.decode_token(token, "code", 1)
+
+    def test_token_of_a_dotted_sort_field(self):
+        token = _paging.encode_token("stats.cpu", 1, {"_id": 1, "stats": {"cpu": 0.5}})
+        self.assertEqual(_paging.decode_token(token, "stats.cpu", 1)["v"], 0.5)
+        token = _paging.encode_token("stats.cpu", 1, {"_id": 1, "stats": None})
+        self.assertIsNone(_paging.decode_token(token, "stats.cpu", 1)["v"])
+
+    def test_invalid_token_is_refused(self):
+        with self.assertRaises(ValueError):
+            _paging.decode_token("not a token", "_id", 1)
+
+
+class KeysetQueryTest(unittest.TestCase):
+
+    def test_id_sort(self):
+        state = {"id": 5}
+        self.assertEqual(_paging.keyset_query({}, "_id", 1, state), {"_id": {"$gt": 5}})
+        self.assertEqual(_paging.keyset_query({"show": "bbx"}, "_id", -1, state),
+                         {"$and": [{"show": "bbx"}, {"_id": {"$lt": 5}}]})
+
+    def test_field_sort_uses_id_tie_breaker(self):
+        query = _paging.keyset_query({}, "frame", 1, {"id": 5, "v": 1001})
+        self.assertEqual(query, {"$or": [{"frame": {"$gt": 1001}}, {"frame": 1001, "_id": {"$gt": 5}}]})
+
+    def test_descending_field_sort_ends_with_nulls(self):
+        query = _paging.keyset_query({}, "frame", -1, {"id": 5, "v": 1001})
+        self.assertIn({"frame": None}, query["$or"])
+
+    def test_null_sort_value(self):
+        ascending = _paging.keyset_query({}, "frame", 1, {"id": 5, "v": None})
+        self.assertEqual(ascending, {"$or": [{"frame": None, "_id": {"$gt": 5}},
+                                             {"frame": {"$exists": True, "$ne": None}}]})
+        descending = _paging.keyset_query({}, "frame", -1, {"id": 5, "v": None})
+        self.assertEqual(descending, {"$or": [{"frame": None, "_id": {"$lt": 5}}]})
+
+    def test_projection_keeps_the_sort_field(self):
+        self.assertEqual(_paging.keyset_projection({"code": 1, "_id": 0}, "frame"), {"code": 1, "frame": 1})
+        self.assertEqual(_paging.keyset_projection({"notes": 0}, "frame"), {"notes": 0})
+        self.assertIsNone(_paging.keyset_projection(None, "frame"))
+
+    def test_projection_exclusions_of_the_sort_field_are_dropped(self):
+        self.assertEqual(_paging.keyset_projection({"frame": 0, "notes": 0}, "frame"), {"notes": 0})
+        self.assertEqual(_paging.keyset_projection({"stats": 0, "_id": 0}, "stats.cpu"), None)
+        self.assertIsNone(_paging.keyset_projection({"_id": 0}, "_id"))
+
+    def test_projection_of_dotted_sort_fields(self):
+        self.assertEqual(_paging.keyset_projection({"stats": 1}, "stats.cpu"), {"stats": 1})
+        self.assertEqual(_paging.keyset_projection({"stats.gpu": 1}, "stats.cpu"), {"stats.gpu": 1, "stats.cpu": 1})
+        self.assertEqual(_paging.keyset_projection({"code": 1, "stats.cpu": 1}, "stats"), {"code": 1, "stats": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
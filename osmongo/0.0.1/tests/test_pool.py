@@ -0,0 +1,66 @@
+# import built-ins
+import unittest
+from unittest import mock
+
+# import osmongo
+from osmongo import MongoAPI, MongoClientRegistry
+from osmongo import _pool
+
+
+class MongoClientRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        patchers = [
+            mock.patch.object(_pool.pymongo, "MongoClient", side_effect=lambda *args, **kwargs: mock.MagicMock()),
+            mock.patch.object(MongoClientRegistry, "health_checker", side_effect=lambda client, name: mock.Mock()),
+            mock.patch.object(MongoClientRegistry, "_clients", {}),
+            mock.patch.object(MongoClientRegistry, "_health", {}),
+            mock.patch.object(MongoClientRegistry, "_pool_options", {}),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client_class = _pool.pymongo.MongoClient
+
+    def test_one_client_per_server_and_timeout(self):
+        client = MongoClientRegistry.get("mongodb://db", 1000)
+        self.assertIs(MongoClientRegistry.get("mongodb://db", 1000), client)
+        self.assertIsNot(MongoClientRegistry.get("mongodb://db", 5000), client)
+        self.assertEqual(self.client_class.call_count, 2)
+        self.assertIsNotNone(MongoClientRegistry.health("mongodb://db", 1000))
+
+    def test_pool_options_apply_to_new_clients(self):
+        MongoClientRegistry.configure(max_pool_size=50, max_idle_time=None)
+        MongoClientRegistry.get("mongodb://db", 1000)
+        self.client_class.assert_called_once_with("mongodb://db", serverSelectionTimeoutMS=1000, maxPoolSize=50)
+
+    def test_clients_of_a_parent_process_are_dropped_not_closed(self):
+        inherited = MongoClientRegistry.get("mongodb://db", 1000)
+        with mock.patch.object(MongoClientRegistry, "_pid", -1):
+            self.assertIsNot(MongoClientRegistry.get("mongodb://db", 1000), inherited)
+        inherited.close.assert_not_called()
+
+    def test_close_all_stops_checkers_and_closes_clients(self):
+        client = MongoClientRegistry.get("mongodb://db", 1000)
+        health = MongoClientRegistry.health("mongodb://db", 1000)
+        MongoClientRegistry.close_all()
+        client.close.assert_called_once_with()
+        health.stop.assert_called_once_with()
+        self.assertEqual(MongoClientRegistry.stats()["clients"], 0)
+
+    def test_pooled_instances_share_the_client_and_reconnect_after_fork(self):
+        first, second = MongoAPI("mongodb://db", 1000), MongoAPI("mongodb://db", 1000)
+        first._ensure_connected()
+        second._ensure_connected()
+        self.assertIs(first._client, second._client)
+
+        inherited = first._client
+        first._pid = -1
+        with mock.patch.object(MongoClientRegistry, "_pid", -1):
+            first._ensure_connected()
+        self.assertIsNot(first._client, inherited)
+        inherited.close.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
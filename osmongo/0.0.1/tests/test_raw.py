@@ -0,0 +1,42 @@
+# import built-ins
+import io
+import unittest
+
+# import pymongo
+import bson
+from bson.raw_bson import RawBSONDocument
+
+# import osmongo
+from osmongo import MongoAPI
+
+# import tests
+from .fakes import FakeCollection
+
+
+class RawReadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.collection = FakeCollection("publishes", [{"_id": index, "code": f"pub{index}"} for index in (2, 1, 3)])
+        self.mongo = MongoAPI(cache=True)
+
+    def test_find_returns_lazily_decoded_documents(self):
+        documents = list(self.mongo.find(self.collection, {}, raw=True))
+        self.assertTrue(all(isinstance(document, RawBSONDocument) for document in documents))
+        self.assertEqual([document["_id"] for document in documents], [1, 2, 3])
+        self.assertEqual(bson.decode(documents[0].raw), {"_id": 1, "code": "pub1"})
+
+    def test_raw_find_one_bypasses_the_cache(self):
+        for _ in range(2):
+            self.assertIsInstance(self.mongo.find_one(self.collection, {"_id": 1}, raw=True), RawBSONDocument)
+        self.assertEqual(len([call for call in self.collection.calls if call[0] == "find_one"]), 2)
+        self.assertEqual(self.mongo.cache.stats()["size"], 0)
+
+    def test_write_raw_streams_the_document_bytes(self):
+        output = io.BytesIO()
+        count, size = self.mongo.write_raw(self.collection, output, {"_id": {"$gte": 2}}, sort=[("_id", 1)])
+        self.assertEqual((count, size), (2, len(output.getvalue())))
+        self.assertEqual([document["code"] for document in bson.decode_all(output.getvalue())], ["pub2", "pub3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+# import built-ins
+import unittest
+from unittest import mock
+
+# import osmongo
+from osmongo import _validation
+from osmongo._validation import SchemaValidationError, compile_schema, validate_documents
+
+# Module Constants
+SCHEMA = {
+    "type": "object",
+    "properties": {"code": {"type": "string"}, "frame": {"type": "integer"}},
+    "required": ["code"],
+}
+
+
+class ValidateDocumentsTest(unittest.TestCase):
+
+    def test_schema_is_compiled_once(self):
+        self.assertIs(compile_schema(SCHEMA), compile_schema(dict(reversed(list(SCHEMA.items())))))
+
+    def test_every_failing_document_is_reported(self):
+        documents = [{"code": "bbx"}, {"frame": 1}, {"code": "pir", "frame": "x"}]
+        with self.assertRaises(SchemaValidationError) as context:
+            validate_documents(documents, schema=SCHEMA)
+        self.assertEqual([index for index, _ in context.exception.errors], [1, 2])
+
+    def test_valid_documents(self):
+        validate_documents([{"code": "bbx", "frame": index} for index in range(10)], schema=SCHEMA)
+
+    def test_parallel_validation_reports_batch_indexes(self):
+        documents = [{"code": "bbx"}] * 25
+        documents[3] = documents[21] = {"frame": 1}
+        with mock.patch.object(_validation, "PARALLEL_THRESHOLD", 10), mock.patch.object(_validation, "CHUNK_SIZE", 4):
+            with self.assertRaises(SchemaValidationError) as context:
+                validate_documents(documents, schema=SCHEMA, workers=2)
+        self.assertEqual([index for index, _ in context.exception.errors], [3, 21])
+
+
+class GetExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(_validation, "ProcessPoolExecutor", mock.MagicMock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        executors = mock.patch.object(_validation, "_executors", {})
+        executors.start()
+        self.addCleanup(executors.stop)
+
+    def test_pools_are_shared_per_worker_count_and_never_shut_down(self):
+        two = _validation._get_executor(2)
+        four = _validation._get_executor(4)
+        self.assertIs(_validation._get_executor(2), two)
+        self.assertIsNot(two, four)
+        two.shutdown.assert_not_called()
+
+    def test_pools_of_a_parent_process_are_dropped(self):
+        inherited = _validation._get_executor(2)
+        with mock.patch.object(_validation, "_executors_pid", -1):
+            self.assertIsNot(_validation._get_executor(2), inherited)
+        inherited.shutdown.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# import built-ins
+import gc
+import weakref
+import unittest
+
+# import pymongo
+from pymongo.errors import BulkWriteError, WriteError
+
+# import osmongo
+from osmongo import MongoAPI
+from osmongo._writebehind import WriteBehindQueue
+
+# import tests
+from .fakes import FakeCollection
+
+
+class _DuplicateCollection(FakeCollection):
+    """
+    Collection refusing the second document of every insert_many
+    """
+    def insert_many(self, documents, ordered=True, **kwargs):
+        self.calls.append(("insert_many", (documents, ordered)))
+        self.insert_one(documents[0])
+        for document in documents[2:]:
+            self.insert_one(document)
+        raise BulkWriteError({"writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate key"}]})
+
+
+class WriteBehindQueueTest(unittest.TestCase):
+
+    def test_documents_are_coalesced_into_one_insert_many(self):
+        collection = FakeCollection()
+        flushes = []
+        write_behind = WriteBehindQueue(max_batch_size=10, max_latency=5,
+                                        on_flush=lambda *args: flushes.append(args))
+        futures = [write_behind.submit(collection, {"_id": index}) for index in range(4)]
+        write_behind.close()
+
+        self.assertEqual([future.result() for future in futures], [0, 1, 2, 3])
+        self.assertEqual([call[0] for call in collection.calls].count("insert_many"), 1)
+        self.assertEqual(flushes, [(collection, 4, 0)])
+        with self.assertRaises(RuntimeError):
+            write_behind.submit(collection, {"_id": 4})
+
+    def test_batches_are_split_at_max_batch_size(self):
+        collection = FakeCollection()
+        write_behind = WriteBehindQueue(max_batch_size=2, max_latency=5)
+        for index in range(5):
+            write_behind.submit(collection, {"_id": index})
+        write_behind.close()
+        batches = [len(call[1][0]) for call in collection.calls if call[0] == "insert_many"]
+        self.assertEqual(sum(batches), 5)
+        self.assertTrue(max(batches) <= 2)
+
+    def test_write_errors_fail_their_own_future(self):
+        collection = _DuplicateCollection()
+        write_behind = WriteBehindQueue(max_latency=5)
+        futures = [write_behind.submit(collection, {"_id": index}) for index in range(3)]
+        write_behind.close()
+
+        self.assertEqual(futures[0].result(), 0)
+        self.assertIsInstance(futures[1].exception(), WriteError)
+        self.assertEqual(futures[2].result(), 2)
+
+    def test_cancelled_documents_are_not_inserted(self):
+        collection = FakeCollection()
+        write_behind = WriteBehindQueue(max_latency=5)
+        kept = write_behind.submit(collection, {"_id": 1})
+        cancelled = write_behind.submit(collection, {"_id": 2})
+        self.assertTrue(cancelled.cancel())
+        write_behind.close()
+
+        self.assertEqual(kept.result(), 1)
+        self.assertTrue(cancelled.cancelled())
+        self.assertEqual([document["_id"] for document in collection.documents], [1])
+
+    def test_garbage_collected_queue_is_flushed(self):
+        collection = FakeCollection()
+        write_behind = WriteBehindQueue(max_latency=5)
+        future = write_behind.submit(collection, {"_id": 1})
+        reference = weakref.ref(write_behind)
+        del write_behind
+        gc.collect()
+
+        self.assertIsNone(reference())
+        self.assertEqual(future.result(timeout=5), 1)
+
+
+class MongoAPIWriteBehindTest(unittest.TestCase):
+
+    def test_queue_is_created_again_after_disconnect(self):
+        collection = FakeCollection()
+        mongo = MongoAPI(pooled=False, write_behind={"max_latency": 0.01})
+        first = mongo.insert_one(collection, {"_id": 1})
+        mongo.disconnect()
+        self.assertIsNone(mongo.write_behind)
+        self.assertEqual(first.result(timeout=0), 1)
+
+        second = mongo.insert_one(collection, {"_id": 2})
+        self.assertEqual(second.result(timeout=5), 2)
+        mongo.disconnect()
+
+    def test_queue_does_not_keep_its_mongo_api_alive(self):
+        mongo = MongoAPI(pooled=False, write_behind=True)
+        mongo.insert_one(FakeCollection(), {"_id": 1}).result(timeout=5)
+        reference = weakref.ref(mongo)
+        del mongo
+        gc.collect()
+        self.assertIsNone(reference())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1 +1 @@
-from . import api, publish
\ No newline at end of file
+from . import api, cache, context, download, publish
\ No newline at end of file
@@ -10,18 +10,42 @@ import logging
 from dd.runtime import api
 
 # load packages using api
-api.load("pillow")
 api.load("sgtk_core")
 
-# import modules loaded by api
-from PIL import Image
-
 # import shotgun api
 from tank_vendor import shotgun_api3
 
+# import sg
+from .context import ContextCache
+from .download import AttachmentDownloader
+from .cache import AttachmentCache
+
 logger = logging.getLogger("dd.{}".format(__name__))
 logging.basicConfig()
 
+# Default fields of the context entities
+PROJECT_FIELDS = ["code", "name", "sg_status"]
+SEQUENCE_FIELDS = ["code", "sg_shots", "sg_status_list", "project"]
+SHOT_FIELDS = ["code", "sg_status_list", "sg_sequence"]
+TASK_FIELDS = ["content", "sg_status_list", "step", "task_assignees"]
+USER_FIELDS = ["name", "email", "login"]
+
+CONTEXT_FIELDS = {"Project": PROJECT_FIELDS, "Sequence": SEQUENCE_FIELDS, "Shot": SHOT_FIELDS, "Task": TASK_FIELDS}
+
+# Field holding the name of each context entity
+CONTEXT_NAME_FIELDS = {"Project": "code", "Sequence": "code", "Shot": "code", "Task": "content"}
+
+# Deep links from a context entity to the entities above it
+CONTEXT_LINKS = {
+    "Project": {},
+    "Sequence": {"Project": "project.Project."},
+    "Shot": {"Project": "project.Project.", "Sequence": "sg_sequence.Sequence."},
+    "Task": {"Project": "project.Project.", "Sequence": "entity.Shot.sg_sequence.Sequence.", "Shot": "entity.Shot."},
+}
+
+# Multi-entity fields can't be read through a deep link
+MULTI_ENTITY_FIELDS = ["sg_shots", "task_assignees"]
+
 
 class DDShotgunAPIError(object):
     def __init__(self, msg):
@@ -47,14 +71,25 @@ class DDShotgun(object):
 
     After using the set methods, we can retrieve data from shotgun using the get methods
 
+    Project, Sequence, Shot, Task and user lookups are memoized for the session, set methods only invalidate
+    the levels they change, Eg: set_task keeps the Project, Sequence and Shot. Use sg.get_cache_stats() to see
+    how many Shotgun requests were avoided.
+
+    Attachments of the shot's notes are downloaded in parallel with
+
+    sg.download_attachments("/dd/home/<user>/notes")
+
+    Attachments and thumbnails are cached on the workstation, see sg.cache.AttachmentCache
+
     use dir(sg) for all the available methods
 
     """
 
-    def __init__(self, username, password):
+    def __init__(self, username, password, shotgun=None):
         """
         param username: user's shotgun username
         param password: user's shotgun password
+        param shotgun: existing shotgun_api3.Shotgun connection to use instead of logging in
         """
 
         self.url = "http://shotgun.d2-india.com"
@@ -62,7 +97,10 @@ class DDShotgun(object):
         self.password = password
 
         # Create Shotgun Object for Internal use inside the class, hence "_sg".
-        self._sg = shotgun_api3.Shotgun(self.url, login=self.username, password=self.password)
+        if shotgun is not None:
+            self._sg = shotgun
+        else:
+            self._sg = shotgun_api3.Shotgun(self.url, login=self.username, password=self.password)
 
         # Initiate Instance Variables
         self.show = ""
@@ -70,6 +108,13 @@ class DDShotgun(object):
         self.shot = ""
         self.task = ""
 
+        # Memoized context entities
+        self.context_cache = ContextCache()
+
+        # Parallel attachment downloads, served from the workstation's attachment cache
+        self.attachment_cache = AttachmentCache()
+        self.downloader = AttachmentDownloader(self._sg, cache=self.attachment_cache)
+
     # CUSTOMIZING SHOTGUN API DEFAULT METHODS - START
     def _schema_entity_read(self):
         """
@@ -100,6 +145,16 @@ class DDShotgun(object):
         result = self._sg.find(entity, data, fields)
         return result
 
+    def _batch(self, requests):
+        """
+        override shotgun_api3.Shotgun.batch method, requests are run in a single transaction
+        """
+        assert isinstance(requests, list)
+        if not requests:
+            return []
+        result = self._sg.batch(requests)
+        return result
+
     def _get_attachment_download_url(self, attachment):
         if not attachment:
             raise shotgun_api3.shotgun.ShotgunError("<class-instance>._get_attachment_download_url.No Attachment Given")
@@ -140,6 +195,17 @@ class DDShotgun(object):
         result = self._sg.update(entity_type, _id, data)
         return result
 
+    def _cached_find_one(self, entity_type, key, data, fields):
+        """
+        find_one through the context cache, only found entities are cached
+        """
+        entity = self.context_cache.get(entity_type, key, fields)
+        if entity is None:
+            entity = self._find_one(entity_type, data, fields)
+            if entity is not None:
+                self.context_cache.set(entity_type, key, entity, fields)
+        return entity
+
     # DDShotgunAPI methods for accessing data from Shotgun
     def _project(self):
 
@@ -148,8 +214,8 @@ class DDShotgun(object):
             DDShotgunAPIError("Project not set, Please use <class_instance>.set_show(name)")
 
         data = [['code', 'is', show]]
-        fields = ["code", "name", "sg_status"]
-        project = self._find_one("Project", data, fields)
+        fields = list(PROJECT_FIELDS)
+        project = self._cached_find_one("Project", (show,), data, fields)
 
         if project is not None:
             return project
@@ -166,14 +232,14 @@ class DDShotgun(object):
         if sequence == "":
             DDShotgunAPIError("Sequence not set, Please use <class_instance>.set_sequence(name)")
 
-        seq_fields = ["code", "sg_shots", "sg_status_list", "project"]
+        seq_fields = list(SEQUENCE_FIELDS)
         seq_fields.extend(fields)
 
         data = [['project', 'is', {'type': 'Project', 'id': show['id']}]]
 
         if find_one:
             data.append(['code', 'is', sequence])
-            result = self._find_one("Sequence", data, seq_fields)
+            result = self._cached_find_one("Sequence", (self.show, sequence), data, seq_fields)
         else:
             result = self._find("Sequence", data, seq_fields)
 
@@ -187,23 +253,25 @@ class DDShotgun(object):
         if fields is None:
             fields = []
         show = self._project()
-        sequence = self._sequence()
         shot = self.shot
 
+        if self.sequence == "":
+            DDShotgunAPIError("Sequence not set, Please use <class_instance>.set_sequence(name)")
+
         if shot == "":
             DDShotgunAPIError("Shot not set, Please use <class_instance>.set_shot(name)")
 
-        shot_fields = ["code", "sg_status_list", "sg_sequence"]
+        shot_fields = list(SHOT_FIELDS)
         shot_fields.extend(fields)
 
         data = [
             ['project', 'is', {'type': 'Project', 'id': show['id']}],
-            ['sg_sequence', 'is', {'type': 'Sequence', 'id': sequence['id']}]
+            ['sg_sequence.Sequence.code', 'is', self.sequence]
         ]
 
         if find_one:
             data.append(['code', 'is', shot])
-            result = self._find_one("Shot", data, shot_fields)
+            result = self._cached_find_one("Shot", (self.show, self.sequence, shot), data, shot_fields)
         else:
             result = self._find("Shot", data, shot_fields)
 
@@ -217,14 +285,13 @@ class DDShotgun(object):
         if fields is None:
             fields = []
         show = self._project()
-        sequence = self._sequence()
         shot = self._shot()
         task = self.task
 
         if task == "":
             DDShotgunAPIError("Task not set, Please use <class_instance>.set_task(name)")
 
-        task_fields = ["content", "sg_status_list", "step", "task_assignees"]
+        task_fields = list(TASK_FIELDS)
         task_fields.extend(fields)
 
         data = [['project', 'is', {'type': 'Project', 'id': show['id']}],
@@ -232,7 +299,7 @@ class DDShotgun(object):
 
         if find_one:
             data.append(["content", "is", task])
-            result = self._find_one("Task", data, task_fields)
+            result = self._cached_find_one("Task", (self.show, self.sequence, self.shot, task), data, task_fields)
         else:
             result = self._find("Task", data, task_fields)
 
@@ -241,13 +308,64 @@ class DDShotgun(object):
         else:
             DDShotgunAPIError("Couldn't Find any Task: {}".format(task))
 
+    def _context(self, fields=None):
+        """
+        Resolve the Project, Sequence, Shot and Task that are set in a single Shotgun request,
+        the deepest set entity is queried with deep-linked filters and fields for the entities above it.
+
+        Resolved entities holding all their default fields are memoized, so get_project, get_shot etc
+        don't make requests afterwards. Sequences resolved through a Shot or Task lack 'sg_shots'.
+
+        param fields: dict extra fields per entity type, Eg: {"Shot": ["sg_cut_in", "sg_cut_out"]}
+        return: dict entity per entity type, Eg: {"Project": {...}, "Sequence": {...}, "Shot": {...}}
+        """
+        if fields is None:
+            fields = {}
+
+        names = [self.show, self.sequence, self.shot, self.task]
+        if names[0] == "":
+            DDShotgunAPIError("Project not set, Please use <class_instance>.set_show(name)")
+
+        levels = ["Project", "Sequence", "Shot", "Task"]
+        depth = names.index("") if "" in names else len(names)
+        names = dict(zip(levels[:depth], names[:depth]))
+        entity_type = levels[depth - 1]
+        links = CONTEXT_LINKS[entity_type]
+
+        data = [[CONTEXT_NAME_FIELDS[entity_type], "is", names[entity_type]]]
+        query_fields = CONTEXT_FIELDS[entity_type] + fields.get(entity_type, [])
+        for level, link in links.items():
+            data.append([link + CONTEXT_NAME_FIELDS[level], "is", names[level]])
+            level_fields = ["id"] + CONTEXT_FIELDS[level] + fields.get(level, [])
+            query_fields.extend(link + field for field in level_fields if field not in MULTI_ENTITY_FIELDS)
+
+        result = self._find_one(entity_type, data, query_fields)
+        if result is None:
+            DDShotgunAPIError("Couldn't Find any {}: {}".format(entity_type, " ".join(names[level] for level in levels[:depth])))
+
+        context = {entity_type: dict((key, value) for key, value in result.items() if "." not in key)}
+        for level, link in links.items():
+            entity = {"type": level}
+            for key, value in result.items():
+                if key.startswith(link) and "." not in key[len(link):]:
+                    entity[key[len(link):]] = value
+            context[level] = entity
+
+        for level, entity in context.items():
+            key = tuple(names[name] for name in levels[:levels.index(level) + 1])
+            for level_fields in (CONTEXT_FIELDS[level], CONTEXT_FIELDS[level] + fields.get(level, [])):
+                if all(field in entity for field in level_fields):
+                    self.context_cache.set(level, key, entity, level_fields)
+
+        return context
+
     def _user(self):
         current_user = getpass.getuser()
         person_data = [["login", "is", current_user]]
 
-        fields = ["name", "email", "login"]
+        fields = list(USER_FIELDS)
 
-        person = self._find_one("HumanUser", person_data, fields)
+        person = self._cached_find_one("HumanUser", (current_user,), person_data, fields)
 
         if person is not None:
             return person
@@ -284,7 +402,6 @@ class DDShotgun(object):
 
     def _data(self):
         show = self._project()
-        sequence = self._sequence()
         shot = self._shot()
 
         data = [
@@ -352,8 +469,8 @@ class DDShotgun(object):
             attachments = note["attachments"]
             all_attachments.extend(attachments)
 
-        for attachment in all_attachments:
-            attachment["url"] = self._get_attachment_download_url(attachment)
+        # Resolve the download urls
+        self.downloader.resolve_urls(all_attachments)
 
         if all_attachments is not None:
             return all_attachments
@@ -361,19 +478,53 @@ class DDShotgun(object):
             DDShotgunAPIError("Couldn't Find any attachments for : {}".format(self.shot))
 
     def _attachment_download(self, attachment, download_path):
+        if not attachment:
+            raise shotgun_api3.shotgun.ShotgunError("<class-instance>._attachment_download.No Attachment Given")
 
-        downloaded_file = self._download_attachment(attachment, download_path)
+        # Served from the attachment cache, misses are streamed to a part file and renamed,
+        # attachments without extension get one from their magic bytes
+        return self.downloader.get(attachment, download_path)
 
-        if not os.path.splitext(downloaded_file)[1]:
-            # Query the type of file
-            image = Image.open(downloaded_file)
-            extension = image.format.lower()
-            renamed_attachment = "{}.{}".format(downloaded_file, extension)
-            # Add Extension to Attachment
-            os.rename(downloaded_file, renamed_attachment)
-            return renamed_attachment
-        else:
-            return downloaded_file
+    def _cached_attachment(self, attachment, download=True):
+        """
+        Path of an attachment in the attachment cache, the check itself doesn't need Shotgun
+
+        param download: bool download the attachment on a miss, else return None
+        """
+        if not attachment:
+            raise shotgun_api3.shotgun.ShotgunError("<class-instance>._cached_attachment.No Attachment Given")
+
+        if not download:
+            return self.attachment_cache.get(attachment)
+        return self.attachment_cache.fetch(attachment, self.downloader)
+
+    def _cached_thumbnail(self, entity, download=True):
+        """
+        Path of the thumbnail of an entity in the attachment cache, the entity should be queried with
+        the "image" and "updated_at" fields so a new thumbnail is a new cache entry
+        """
+        if not entity.get("image"):
+            DDShotgunAPIError("No thumbnail for {} {}".format(entity["type"], entity["id"]))
+
+        thumbnail = {
+            "type": entity["type"],
+            "id": entity["id"],
+            "name": "{}_{}_thumbnail".format(entity["type"], entity["id"]),
+            "url": entity["image"],
+            "updated_at": entity.get("updated_at"),
+        }
+        return self._cached_attachment(thumbnail, download=download)
+
+    def _attachments_download(self, download_path, attachments=None):
+        if attachments is None:
+            attachments = self._attachments()
+
+        results = self.downloader.download(attachments, download_path)
+        failed = [result for result in results if result["error"]]
+        if failed:
+            logger.error("Couldn't download {} of {} attachment(s) for : {}".format(
+                len(failed), len(results), self.shot))
+        return results
 
     def _published_files(self, fields=None):
         if fields is None:
@@ -413,21 +564,37 @@ class DDShotgun(object):
 
     # Set Methods
     def set_show(self, show_name):
+        if show_name != self.show:
+            self.context_cache.invalidate("Project")
         self.show = show_name
 
     def set_sequence(self, sequence_name):
+        if sequence_name != self.sequence:
+            self.context_cache.invalidate("Sequence")
         self.sequence = sequence_name
 
     def set_shot(self, shot_number):
+        if shot_number != self.shot:
+            self.context_cache.invalidate("Shot")
         self.shot = shot_number
 
     def set_task(self, task_name):
+        if task_name != self.task:
+            self.context_cache.invalidate("Task")
         self.task = task_name
 
+    def clear_cache(self):
+        self.context_cache.clear()
+
     # Get Methods
     def get_project(self):
         return self._project()
 
+    def get_context(self, fields=None):
+        if fields is None:
+            fields = {}
+        return self._context(fields=fields)
+
     def get_sequence(self, fields=None):
         if fields is None:
             fields = []
@@ -498,6 +665,9 @@ class DDShotgun(object):
     def get_user(self):
         return self._user()
 
+    def get_cache_stats(self):
+        return self.context_cache.stats()
+
     def create(self, entity_type, data):
         return self._create(entity_type, data)
 
@@ -506,15 +676,32 @@ class DDShotgun(object):
             fields = []
         return self._find_one(entity, data, fields)
 
+    def find(self, entity, data, fields=None):
+        if fields is None:
+            fields = []
+        return self._find(entity, data, fields)
+
     def update(self, entity_type, _id, data):
         return self._update(entity_type, _id, data)
 
+    def batch(self, requests):
+        return self._batch(requests)
+
     def delete(self, entity_type, _id):
         return self._delete(entity_type, _id)
 
     def download_attachment(self, attachment, download_path):
         return self._attachment_download(attachment, download_path)
 
+    def download_attachments(self, download_path, attachments=None):
+        return self._attachments_download(download_path, attachments)
+
+    def get_cached_attachment(self, attachment, download=True):
+        return self._cached_attachment(attachment, download=download)
+
+    def get_cached_thumbnail(self, entity, download=True):
+        return self._cached_thumbnail(entity, download=download)
+
 
 def main():
     username = getpass.getuser()
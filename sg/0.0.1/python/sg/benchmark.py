@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+"""
+Benchmarks for the sg package against a stand-in Shotgun server replaying recorded request latencies.
+
+USAGE:
+
+python -m sg.benchmark --latency 0.08 context
+python -m sg.benchmark --recorded /dd/home/<user>/shotgun_latencies.json context
+python -m sg.benchmark --latency 0.08 publish --files 30
+
+The recorded latencies file is a json list of request durations in seconds, Eg: [0.071, 0.094, 0.088]
+"""
+
+# Import Built Modules
+import os
+import json
+import shutil
+import tempfile
+import time
+import getpass
+import argparse
+import itertools
+import threading
+
+# import sg
+from .api import DDShotgun
+from .context import ContextCache
+from .publish import SgPublish
+
+
+class RecordedLatencyShotgun(object):
+    """
+    In-memory stand-in for shotgun_api3.Shotgun, every request sleeps for the next recorded latency.
+
+    Supports find, find_one, create, update and batch with "is", "is_not" and "in" filters,
+    deep-linked filters and fields, Eg: "entity.Shot.sg_sequence.Sequence.code"
+    """
+
+    def __init__(self, entities, latencies):
+        """
+        param entities: dict list of entities per entity type, Eg: {"Shot": [{"id": 1, "code": "0780", ...}]}
+        param latencies: list request latencies in seconds, replayed in a loop
+        """
+        self.entities = dict((entity_type, dict((entity["id"], entity) for entity in items))
+                             for entity_type, items in entities.items())
+        self._latencies = itertools.cycle(latencies)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def _request(self):
+        with self._lock:
+            self.requests += 1
+            latency = next(self._latencies)
+        time.sleep(latency)
+
+    def _value(self, entity, path):
+        parts = path.split(".")
+        value = entity.get(parts[0])
+        for index in range(1, len(parts), 2):
+            if not value:
+                return None
+            linked = self.entities.get(parts[index], {}).get(value["id"], {})
+            value = linked.get(parts[index + 1])
+        return value
+
+    def _matches(self, entity, filters):
+        for path, operator, expected in filters:
+            value = self._value(entity, path)
+            if isinstance(value, dict):
+                value = (value["type"], value["id"])
+            if isinstance(expected, dict):
+                expected = (expected["type"], expected["id"])
+            if operator == "is" and value != expected:
+                return False
+            if operator == "is_not" and value == expected:
+                return False
+            if operator == "in" and value not in expected:
+                return False
+        return True
+
+    def _project(self, entity_type, entity, fields):
+        result = {"type": entity_type, "id": entity["id"]}
+        for field in fields or []:
+            result[field] = self._value(entity, field)
+        return result
+
+    def find(self, entity_type, filters, fields=None):
+        self._request()
+        return [self._project(entity_type, entity, fields)
+                for entity in self.entities.get(entity_type, {}).values() if self._matches(entity, filters)]
+
+    def find_one(self, entity_type, filters, fields=None):
+        self._request()
+        for entity in self.entities.get(entity_type, {}).values():
+            if self._matches(entity, filters):
+                return self._project(entity_type, entity, fields)
+
+    def _create(self, entity_type, data):
+        items = self.entities.setdefault(entity_type, {})
+        entity = dict(data, id=max(items or [0]) + 1)
+        items[entity["id"]] = entity
+        return dict(entity, type=entity_type)
+
+    def _update(self, entity_type, entity_id, data):
+        entity = self.entities[entity_type][entity_id]
+        entity.update(data)
+        return dict(entity, type=entity_type)
+
+    def create(self, entity_type, data):
+        self._request()
+        return self._create(entity_type, data)
+
+    def update(self, entity_type, entity_id, data):
+        self._request()
+        return self._update(entity_type, entity_id, data)
+
+    def batch(self, requests):
+        self._request()
+        results = []
+        for request in requests:
+            if request["request_type"] == "create":
+                results.append(self._create(request["entity_type"], request["data"]))
+            elif request["request_type"] == "update":
+                results.append(self._update(request["entity_type"], request["entity_id"], request["data"]))
+            else:
+                self.entities[request["entity_type"]].pop(request["entity_id"], None)
+                results.append(True)
+        return results
+
+
+def sample_entities(sequences=20, shots=50):
+    """
+    return: dict a show with 'sequences' sequences of 'shots' shots, each with comp and dmp tasks
+    """
+    entities = {
+        "Project": [{"id": 1, "code": "BEETLE", "name": "Beetle", "sg_status": "Active"}],
+        "HumanUser": [{"id": 1, "name": "Artist", "email": "artist@d2-india.com", "login": getpass.getuser()}],
+        "Sequence": [],
+        "Shot": [],
+        "Task": [],
+        "PublishedFile": [],
+        "PublishedFileType": [{"id": 1, "code": "Rendered Image"}, {"id": 2, "code": "Nuke Script"},
+                              {"id": 3, "code": "Photoshop Image"}],
+    }
+    project = {"type": "Project", "id": 1}
+    for sequence_index in range(sequences):
+        sequence = {"type": "Sequence", "id": sequence_index + 1}
+        sequence_shots = []
+        for shot_index in range(shots):
+            shot = {"type": "Shot", "id": len(entities["Shot"]) + 1}
+            sequence_shots.append(shot)
+            entities["Shot"].append(dict(shot, code="%04d" % ((shot_index + 1) * 10), sg_status_list="ip",
+                                         sg_sequence=sequence, project=project))
+            for task in ("comp", "dmp"):
+                entities["Task"].append({
+                    "id": len(entities["Task"]) + 1, "content": task, "sg_status_list": "ip",
+                    "step": {"type": "Step", "id": 1}, "task_assignees": [{"type": "HumanUser", "id": 1}],
+                    "project": project, "entity": shot,
+                })
+        entities["Sequence"].append(dict(sequence, code="SQ%02d" % sequence_index, sg_shots=sequence_shots,
+                                         sg_status_list="ip", project=project))
+    return entities
+
+
+class _NoCache(ContextCache):
+    """
+    Context cache that never hits, every lookup goes to Shotgun like before memoization
+    """
+
+    def get(self, entity_type, key, fields=None):
+        self.misses += 1
+
+    def set(self, entity_type, key, entity, fields=None):
+        pass
+
+
+def _report(name, requests, timings):
+    timings = sorted(timings)
+    print("{:<22} requests={:<4} mean={:.1f}ms  median={:.1f}ms  max={:.1f}ms".format(
+        name, requests, sum(timings) / len(timings) * 1000, timings[len(timings) // 2] * 1000, timings[-1] * 1000))
+
+
+def bench_context(latencies, iterations):
+    """
+    Cold SgPublish.connect followed by the task lookup of a publish: chained lookups without cache (before),
+    chained memoized lookups and the single deep-linked query (get_context)
+    """
+    entities = sample_entities()
+
+    def chained(sg_api):
+        sg_api.get_project()
+        sg_api.get_sequence()
+        sg_api.get_shot()
+        sg_api.get_user()
+
+    def deep_linked(sg_api):
+        sg_api.get_context()
+        sg_api.get_user()
+
+    for name, connect, cache in (("chained, no cache", chained, _NoCache),
+                                 ("chained, memoized", chained, ContextCache),
+                                 ("deep-linked", deep_linked, ContextCache)):
+        timings = []
+        requests = 0
+        for _ in range(iterations):
+            shotgun = RecordedLatencyShotgun(entities, latencies)
+            sg_api = DDShotgun(getpass.getuser(), None, shotgun=shotgun)
+            sg_api.context_cache = cache()
+
+            start = time.time()
+            sg_api.set_show("BEETLE")
+            sg_api.set_sequence("SQ07")
+            sg_api.set_shot("0250")
+            connect(sg_api)
+            sg_api.set_task("dmp")
+            sg_api.get_task()
+            timings.append(time.time() - start)
+            requests = shotgun.requests
+        _report(name, requests, timings)
+
+
+def _dmp_files(root, files):
+    """
+    return: list 'files' DMP publish files, two thirds EXR frames, the rest split between NK and PSD
+    """
+    paths = []
+    for directory in ("images", "scripts", "psd"):
+        os.makedirs(os.path.join(root, directory))
+    for index in range(files):
+        if index % 3 == 0 and index:
+            path = os.path.join(root, "scripts", "SQ07_0250_dmp_dmp-nuke_script%02d.v003.nk" % index)
+        elif index % 3 == 1 and index > 1:
+            path = os.path.join(root, "psd", "SQ07_0250_dmp_dmp-psd%02d.v003.psd" % index)
+        else:
+            path = os.path.join(root, "images", "SQ07_0250_dmp_dmp-main.v003.%04d.exr" % (1001 + index))
+        open(path, "w").close()
+        paths.append(path)
+    return paths
+
+
+def bench_publish(latencies, files):
+    """
+    DMP publish of 'files' files, one validate, Version create, PublishedFile create and update per file (before)
+    vs PublishBatcher (after)
+    """
+    root = tempfile.mkdtemp(prefix="sg_benchmark_")
+    try:
+        paths = _dmp_files(root, files)
+
+        for name in ("serialized", "batched"):
+            shotgun = RecordedLatencyShotgun(sample_entities(), latencies)
+            sg_pub = SgPublish()
+            sg_pub.sg_api = DDShotgun(getpass.getuser(), None, shotgun=shotgun)
+            sg_pub.sg_api.set_show("BEETLE")
+            sg_pub.sg_api.set_sequence("SQ07")
+            sg_pub.sg_api.set_shot("0250")
+            context = sg_pub.sg_api.get_context()
+            sg_pub.show, sg_pub.sequence, sg_pub.shot = context["Project"], context["Sequence"], context["Shot"]
+            sg_pub.user = sg_pub.sg_api.get_user()
+            shotgun.requests = 0
+
+            start = time.time()
+            if name == "serialized":
+                for path in paths:
+                    sg_pub.validate(os.path.basename(path))
+                    sg_pub.sg_api.set_task("dmp")
+                    task = sg_pub.sg_api.get_task()
+                    version = sg_pub.sg_version(path, 3, task, "benchmark")
+                    version_entity = {"type": "Version", "id": version["id"]} if version else None
+                    data = sg_pub.published_file_data(path, 3, task, "benchmark", version_entity, None)
+                    update = dict((field, data.pop(field)) for field in ("sg_path_to_source", "sg_status_list", "sg_output"))
+                    published_file = sg_pub.sg_api.create("PublishedFile", data)
+                    sg_pub.sg_api.update("PublishedFile", published_file["id"], update)
+            else:
+                batcher = sg_pub.batch()
+                batcher.validate([os.path.basename(path) for path in paths])
+                for path in paths:
+                    batcher.add(path, 3, "dmp", "benchmark")
+                batcher.submit()
+            elapsed = time.time() - start
+
+            print("{:<22} files={:<4} requests={:<4} total={:.1f}ms".format(name, files, shotgun.requests, elapsed * 1000))
+    finally:
+        shutil.rmtree(root)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="sg benchmarks against a recorded-latency stand-in server")
+    parser.add_argument("--latency", default=0.08, type=float, help="Latency of every request in seconds")
+    parser.add_argument("--recorded", help="json list of recorded request latencies in seconds")
+
+    subparsers = parser.add_subparsers(title="Benchmarks", dest="benchmark")
+
+    context_parser = subparsers.add_parser("context", help="Cold context resolution, chained vs deep-linked")
+    context_parser.add_argument("--iterations", default=20, type=int, help="Number of cold connects")
+    context_parser.set_defaults(func=bench_context)
+
+    publish_parser = subparsers.add_parser("publish", help="DMP publish, serialized requests vs PublishBatcher")
+    publish_parser.add_argument("--files", default=30, type=int, help="Number of files to publish")
+    publish_parser.set_defaults(func=bench_publish)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    if not args.benchmark:
+        print("Please choose a benchmark, use --help for the available benchmarks")
+        return
+
+    if args.recorded:
+        with open(args.recorded) as recorded:
+            latencies = json.load(recorded)
+    else:
+        latencies = [args.latency]
+
+    benchmark_args = vars(args)
+    benchmark_func = benchmark_args.pop("func")
+    for name in ("benchmark", "latency", "recorded"):
+        del benchmark_args[name]
+    benchmark_func(latencies, **benchmark_args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+
+# Import Built Modules
+import os
+import re
+import time
+import shutil
+import logging
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger("dd.{}".format(__name__))
+
+# Get Environment variables
+CACHE_PATH = os.getenv("DD_SG_ATTACHMENT_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "dd", "sg_attachments"))
+CACHE_SIZE_MB = int(os.getenv("DD_SG_ATTACHMENT_CACHE_SIZE", "2048"))
+
+KEY_REGEX = re.compile(r"[^\w.-]+")
+# Evict once this part of the cache size was added by the process, or when the last eviction is this old
+EVICT_RATIO = 0.1
+EVICT_INTERVAL = 600
+# Abandoned staging directories are removed after a day
+STAGING_TTL = 24 * 60 * 60
+
+
+class AttachmentCache(object):
+    """
+    Persistent on-disk cache of Shotgun attachments and thumbnails, shared by every process of the workstation.
+
+    Files are stored under '<root>/entries/<shard>/<type>-<id>-<version>/<file name>', a hit is an
+    existence check on local disk and never needs Shotgun. Entries are downloaded to '<root>/tmp/<key>' under
+    a lock per key and renamed into place, so other processes never see partial files and an interrupted
+    download is resumed from its part file. The modification time of an entry is its last use, once the cache
+    grows over 'max_size' the least recently used entries are evicted. Eviction walks the whole cache, it only
+    runs once enough was added or the last eviction is old, see EVICT_RATIO and EVICT_INTERVAL.
+
+    Cached files are shared, copy them rather than link or modify them.
+
+    The root defaults to $DD_SG_ATTACHMENT_CACHE or ~/.cache/dd/sg_attachments, the size to
+    $DD_SG_ATTACHMENT_CACHE_SIZE MB or 2 GB.
+
+    USAGE:
+
+    cache = AttachmentCache()
+    path = cache.get(attachment)
+    if path is None:
+        path = cache.fetch(attachment, downloader)
+    """
+
+    def __init__(self, root=None, max_size=None):
+        """
+        param root: str cache directory
+        param max_size: int maximum size of the cache in bytes
+        """
+        self.root = root or CACHE_PATH
+        self.max_size = max_size if max_size is not None else CACHE_SIZE_MB * 1024 * 1024
+        self.entries_path = os.path.join(self.root, "entries")
+        self.tmp_path = os.path.join(self.root, "tmp")
+        self.lock_path = os.path.join(self.root, "lock")
+        self.evicted_path = os.path.join(self.root, "evicted")
+        # Bytes added by this process since its last eviction
+        self._added = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(attachment, version=None):
+        """
+        return: str cache key of an attachment or thumbnail, Eg: "Attachment-1234-0"
+
+        The version defaults to the attachment's 'updated_at' when it was queried, a new version
+        is a new entry, old versions are evicted once unused.
+        """
+        if version is None:
+            version = attachment.get("updated_at") or 0
+        key = "{}-{}-{}".format(attachment.get("type", "Attachment"), attachment["id"], version)
+        return KEY_REGEX.sub("_", key)
+
+    def _entry_path(self, key):
+        shard = "%02d" % (sum(bytearray(key.encode("utf-8"))) % 100)
+        return os.path.join(self.entries_path, shard, key)
+
+    @contextmanager
+    def _lock(self, lock_path=None):
+        """
+        Exclusive lock shared by every process, on the whole cache by default
+        """
+        lock_path = lock_path or self.lock_path
+        if fcntl is None or not os.path.exists(os.path.dirname(lock_path)):
+            yield
+            return
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Locks unused for STAGING_TTL are removed
+            os.utime(lock_path, None)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _lookup(entry_path):
+        """
+        return: str path of the file of an entry, marked as just used, None if there is no such entry
+        """
+        try:
+            file_names = os.listdir(entry_path)
+            os.utime(entry_path, None)
+        except OSError:
+            # Not cached, or evicted meanwhile
+            return None
+        if file_names:
+            return os.path.join(entry_path, file_names[0])
+
+    def get(self, attachment, version=None):
+        """
+        Look up an attachment on local disk, without any Shotgun request.
+
+        Entries are moved out of the cache atomically when evicted, the returned file can still disappear
+        before it is read, callers fall back to downloading it.
+
+        return: str path of the cached file, None on a miss
+        """
+        path = self._lookup(self._entry_path(self.key(attachment, version)))
+        if path is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return path
+
+    def put(self, attachment, download, version=None):
+        """
+        Add an attachment to the cache, 'download(directory)' must write the file in 'directory' and
+        return its path. 'directory' is the same for every attempt, so a failed download leaves its part
+        file to be resumed by the next one. If another process cached the attachment meanwhile, its file is kept.
+
+        return: str path of the cached file
+        """
+        key = self.key(attachment, version)
+        entry_path = self._entry_path(key)
+        staging_path = os.path.join(self.tmp_path, key)
+
+        for path in (self.tmp_path, os.path.dirname(entry_path)):
+            if not os.path.exists(path):
+                try:
+                    os.makedirs(path)
+                except OSError:
+                    # Created by another process
+                    pass
+
+        # One download per key at a time, the others wait for it and find the entry
+        with self._lock(staging_path + ".lock"):
+            cached_path = self._lookup(entry_path)
+            if cached_path is not None:
+                return cached_path
+
+            if not os.path.exists(staging_path):
+                os.makedirs(staging_path)
+            file_path = download(staging_path)
+            size = os.path.getsize(file_path)
+            try:
+                os.rename(staging_path, entry_path)
+                # The staging directory is as old as the first attempt, mark the entry as just used
+                os.utime(entry_path, None)
+            except OSError:
+                # Another process cached it first, without file locks
+                if not os.path.isdir(entry_path):
+                    raise
+                shutil.rmtree(staging_path, ignore_errors=True)
+
+        self._added += size
+        if self._eviction_due():
+            self.evict(keep=entry_path)
+        return os.path.join(entry_path, os.path.basename(file_path))
+
+    def fetch(self, attachment, downloader, version=None):
+        """
+        return: str path of the cached attachment, downloaded with 'downloader' on a miss
+        """
+        path = self.get(attachment, version)
+        if path is None:
+            path = self.put(attachment, lambda directory: downloader.download_one(attachment, directory), version)
+        return path
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        """
+        return: list (last use, size in bytes, path) of every entry
+        """
+        entries = []
+        if not os.path.exists(self.entries_path):
+            return entries
+        for shard in os.listdir(self.entries_path):
+            shard_path = os.path.join(self.entries_path, shard)
+            for key in os.listdir(shard_path):
+                entry_path = os.path.join(shard_path, key)
+                try:
+                    size = sum(os.path.getsize(os.path.join(entry_path, name)) for name in os.listdir(entry_path))
+                    entries.append((os.path.getmtime(entry_path), size, entry_path))
+                except OSError:
+                    # Evicted by another process
+                    continue
+        return entries
+
+    def _eviction_due(self):
+        if self._added >= self.max_size * EVICT_RATIO:
+            return True
+        try:
+            return time.time() - os.path.getmtime(self.evicted_path) > EVICT_INTERVAL
+        except OSError:
+            # Never evicted
+            return True
+
+    def _remove_abandoned(self):
+        """
+        Remove the staging directories and locks of downloads abandoned for more than STAGING_TTL
+        """
+        if not os.path.exists(self.tmp_path):
+            return
+        for name in os.listdir(self.tmp_path):
+            path = os.path.join(self.tmp_path, name)
+            try:
+                if time.time() - os.path.getmtime(path) < STAGING_TTL:
+                    continue
+            except OSError:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used entries until the cache fits in 'max_size'
+
+        param keep: str path of an entry which mustn't be evicted, Eg: the entry just added
+        return: int number of evicted entries
+        """
+        evicted = 0
+        with self._lock():
+            self._remove_abandoned()
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry_path in entries:
+                if total <= self.max_size:
+                    break
+                if entry_path == keep:
+                    continue
+                # Move the entry out of the way first so it is never seen half deleted
+                trash_path = tempfile.mkdtemp(prefix="evicted.", dir=self.tmp_path)
+                try:
+                    os.rename(entry_path, os.path.join(trash_path, "entry"))
+                except OSError:
+                    shutil.rmtree(trash_path, ignore_errors=True)
+                    continue
+                shutil.rmtree(trash_path, ignore_errors=True)
+                total -= size
+                evicted += 1
+
+            self._added = 0
+            if os.path.exists(self.root):
+                with open(self.evicted_path, "a"):
+                    os.utime(self.evicted_path, None)
+
+        if evicted:
+            self.evictions += evicted
+            logger.info("Evicted {} attachment(s) from {}".format(evicted, self.root))
+        return evicted
+
+    def clear(self):
+        with self._lock():
+            if os.path.exists(self.entries_path):
+                shutil.rmtree(self.entries_path, ignore_errors=True)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+# Import Built Modules
+import copy
+import threading
+import logging
+
+logger = logging.getLogger("dd.{}".format(__name__))
+
+# Context levels, from the top, invalidating a level invalidates every level below it
+LEVELS = ("Project", "Sequence", "Shot", "Task")
+
+
+class ContextCache(object):
+    """
+    Memoize the context entities (Project, Sequence, Shot, Task and HumanUser) looked up by DDShotgun.
+
+    Entities are stored per entity type, context key and requested fields, eg:
+    ("Shot", ("BEETLE", "PIR", "0780"), ("code", "sg_status_list")), so an entity is only
+    returned for the context it was looked up in. Their ids never change during a session.
+    Entities are copied in and out of the cache, callers may modify the entities they get.
+
+    'hits' counts the Shotgun requests avoided, 'misses' the requests made.
+
+    USAGE:
+
+    cache = ContextCache()
+    shot = cache.get("Shot", ("BEETLE", "PIR", "0780"))
+    if shot is None:
+        shot = sg.find_one("Shot", filters, fields)
+        cache.set("Shot", ("BEETLE", "PIR", "0780"), shot)
+
+    cache.invalidate("Shot")    # drop Shot and Task entities
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(entity_type, key, fields):
+        return entity_type, tuple(key), tuple(sorted(fields or []))
+
+    def get(self, entity_type, key, fields=None):
+        """
+        param entity_type: str Shotgun entity type, Eg: Project, Shot, HumanUser
+        param key: tuple context the entity was looked up in, Eg: ("BEETLE", "PIR")
+        param fields: list extra fields the entity was looked up with
+
+        return: dict copy of the cached entity or None
+        """
+        with self._lock:
+            entity = self._entries.get(self._key(entity_type, key, fields))
+            if entity is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return copy.deepcopy(entity)
+
+    def set(self, entity_type, key, entity, fields=None):
+        entity = copy.deepcopy(entity)
+        with self._lock:
+            self._entries[self._key(entity_type, key, fields)] = entity
+
+    def invalidate(self, entity_type):
+        """
+        Drop the entities of 'entity_type' and of every context level below it,
+        Eg: invalidate("Sequence") drops Sequence, Shot and Task entities but keeps Projects and users
+        """
+        levels = LEVELS[LEVELS.index(entity_type):] if entity_type in LEVELS else (entity_type,)
+        with self._lock:
+            stale = [key for key in self._entries if key[0] in levels]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        return: dict cache counters, 'hits' is the number of Shotgun requests avoided
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+
+# Import Built Modules
+import os
+import re
+import ssl
+import shutil
+import logging
+import threading
+from multiprocessing.pool import ThreadPool
+
+try:
+    from urllib.request import Request, HTTPRedirectHandler, HTTPSHandler, build_opener
+    from urllib.error import HTTPError
+    from urllib.parse import urlparse
+except ImportError:
+    from urllib2 import Request, HTTPRedirectHandler, HTTPSHandler, HTTPError, build_opener
+    from urlparse import urlparse
+
+# import sg
+from .cache import AttachmentCache
+
+logger = logging.getLogger("dd.{}".format(__name__))
+
+# Size of the blocks streamed to disk
+BLOCK_SIZE = 1024 * 1024
+PART_EXTENSION = ".part"
+CONTENT_RANGE_REGEX = re.compile(r"bytes\s+(\d+)-")
+
+# File signatures, (offset, magic bytes, extension), checked in order
+MAGIC_BYTES = [
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"\xff\xd8\xff", "jpg"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (0, b"II*\x00", "tif"),
+    (0, b"MM\x00*", "tif"),
+    (0, b"v/1\x01", "exr"),
+    (0, b"SDPX", "dpx"),
+    (0, b"XPDS", "dpx"),
+    (0, b"8BPS", "psd"),
+    (0, b"%PDF", "pdf"),
+    (0, b"BM", "bmp"),
+    (0, b"PK\x03\x04", "zip"),
+    (8, b"WEBP", "webp"),
+    (4, b"ftypqt", "mov"),
+    (4, b"ftyp", "mp4"),
+]
+MAGIC_SIZE = 16
+
+
+class CookieStrippingRedirectHandler(HTTPRedirectHandler):
+    """
+    Follow redirects without sending the Shotgun session cookie to another host, Eg: a signed cloud storage url
+    """
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        request = HTTPRedirectHandler.redirect_request(self, req, fp, code, msg, headers, newurl)
+        if request is not None and urlparse(newurl).netloc != urlparse(req.get_full_url()).netloc:
+            request.headers.pop("Cookie", None)
+        return request
+
+
+def build_shotgun_opener(shotgun):
+    """
+    Url opener with the proxy and certificate settings of a shotgun_api3.Shotgun connection
+
+    return: urllib OpenerDirector
+    """
+    config = getattr(shotgun, "config", None)
+    handlers = [CookieStrippingRedirectHandler()]
+    if getattr(config, "proxy_handler", None):
+        handlers.append(config.proxy_handler)
+    if getattr(config, "no_ssl_validation", False):
+        handlers.append(HTTPSHandler(context=ssl._create_unverified_context()))
+    elif getattr(config, "ca_certs", None):
+        handlers.append(HTTPSHandler(context=ssl.create_default_context(cafile=config.ca_certs)))
+    return build_opener(*handlers)
+
+
+def detect_extension(path):
+    """
+    Guess the extension of a file from its first bytes, without decoding it
+
+    return: str extension without dot, Eg: "png", None if unknown
+    """
+    with open(path, "rb") as source:
+        header = source.read(MAGIC_SIZE)
+    for offset, magic, extension in MAGIC_BYTES:
+        if header[offset:offset + len(magic)] == magic:
+            return extension
+
+
+def content_range_start(response):
+    """
+    return: int first byte of a partial response from its Content-Range header, None if there is none
+    """
+    match = CONTENT_RANGE_REGEX.match(response.info().get("Content-Range") or "")
+    if match:
+        return int(match.group(1))
+
+
+class AttachmentDownloader(object):
+    """
+    Download Shotgun attachments in parallel on a bounded thread pool.
+
+    Requests go through the proxy and certificates of the Shotgun connection, the session cookie is only
+    sent to the Shotgun server. Each file is streamed to '<name>.<cache key>.part' next to its
+    destination, or in the cache staging directory when there is a cache, and renamed once complete,
+    so readers never see partial files. The part file is keyed like the cache, by attachment id and version,
+    so an interrupted download is only resumed, with an http Range request, for the same file.
+    Attachments without extension get one from their magic bytes.
+
+    USAGE:
+
+    downloader = AttachmentDownloader(sg._sg, workers=8)
+    for result in downloader.download(attachments, "/dd/home/<user>/notes"):
+        print(result["path"] or result["error"])
+    """
+
+    def __init__(self, shotgun, workers=8, cache=None):
+        """
+        param shotgun: shotgun_api3.Shotgun connection
+        param workers: int maximum number of concurrent requests
+        param cache: AttachmentCache attachments are served from, only misses are downloaded
+        """
+        assert workers > 0
+        self._sg = shotgun
+        self.workers = workers
+        self.cache = cache
+        self._opener = build_shotgun_opener(shotgun)
+        self._session_token = None
+        self._session_lock = threading.Lock()
+
+    def _headers(self, url):
+        """
+        Attachments stored on the Shotgun server need the session cookie, signed cloud urls don't
+        """
+        if not url.startswith(self._sg.base_url):
+            return {}
+        with self._session_lock:
+            if self._session_token is None:
+                self._session_token = self._sg.get_session_token()
+        return {"Cookie": "_session_id={}".format(self._session_token)}
+
+    def resolve_url(self, attachment):
+        if not attachment.get("url"):
+            attachment["url"] = self._sg.get_attachment_download_url(attachment)
+        return attachment["url"]
+
+    def resolve_urls(self, attachments):
+        """
+        Resolve the download url of every attachment, stored in attachment["url"].
+        The urls are built from the attachment data, no request is made
+        """
+        for attachment in attachments:
+            self.resolve_url(attachment)
+        return attachments
+
+    def _open(self, url, offset):
+        """
+        return: http response from 'offset', None if the server has no byte after 'offset'
+        """
+        headers = self._headers(url)
+        if offset:
+            headers["Range"] = "bytes={}-".format(offset)
+        try:
+            return self._opener.open(Request(url, headers=headers))
+        except HTTPError as e:
+            # 416, the part file already holds every byte
+            if e.code != 416:
+                raise
+
+    def download_one(self, attachment, download_path, file_name=None):
+        """
+        Stream one attachment to 'download_path', resuming its '.part' file if there is one
+
+        param file_name: str name of the downloaded file, defaults to the attachment name
+        return: str path of the downloaded file
+        """
+        file_name = file_name or attachment["name"].replace(" ", "_")
+        file_path = os.path.join(download_path, file_name)
+        part_path = "{}.{}{}".format(file_path, AttachmentCache.key(attachment), PART_EXTENSION)
+        url = self.resolve_url(attachment)
+
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        response = self._open(url, offset)
+
+        if response is not None and offset and response.getcode() == 206:
+            start = content_range_start(response)
+            if start != offset:
+                logger.warning("Restarting the download of {}, the server resumed it from byte {} instead of {}".format(
+                    file_name, start, offset))
+                response.close()
+                offset = 0
+                response = self._open(url, offset)
+
+        if response is not None:
+            try:
+                # Append to the part file only if the server honoured the Range, else start over
+                mode = "ab" if offset and response.getcode() == 206 else "wb"
+                with open(part_path, mode) as output:
+                    shutil.copyfileobj(response, output, BLOCK_SIZE)
+            finally:
+                response.close()
+
+        if not os.path.splitext(file_path)[1]:
+            extension = detect_extension(part_path)
+            if extension:
+                file_path = "{}.{}".format(file_path, extension)
+
+        os.rename(part_path, file_path)
+        return file_path
+
+    def get(self, attachment, download_path, file_name=None):
+        """
+        Get one attachment into 'download_path', from the cache if there is one, else from Shotgun.
+        Cached files are copied, a link would let the caller modify the file every process shares
+
+        return: str path of the file
+        """
+        if self.cache is None:
+            return self.download_one(attachment, download_path, file_name)
+
+        cached_path = self.cache.fetch(attachment, self)
+        file_name = file_name or attachment["name"].replace(" ", "_")
+        if not os.path.splitext(file_name)[1]:
+            file_name += os.path.splitext(cached_path)[1]
+        file_path = os.path.join(download_path, file_name)
+
+        try:
+            shutil.copy2(cached_path, file_path)
+        except (IOError, OSError):
+            # Evicted by another process meanwhile
+            if os.path.exists(cached_path):
+                raise
+            return self.download_one(attachment, download_path, file_name)
+        return file_path
+
+    def _download(self, attachment, download_path, file_name):
+        try:
+            path = self.get(attachment, download_path, file_name)
+            return {"attachment": attachment, "path": path, "error": None}
+        except Exception as e:
+            logger.error("Couldn't download attachment {}: {}".format(attachment.get("name"), e))
+            return {"attachment": attachment, "path": None, "error": str(e)}
+
+    def download(self, attachments, download_path):
+        """
+        Download 'attachments' to 'download_path' in parallel, cached attachments are copied from the cache.
+        Failed downloads keep their '.part' file, in the cache staging directory when there is a cache,
+        and are resumed by the next download
+
+        return: list dict per attachment with its 'path', or its 'error' if it failed, in input order
+        """
+        if not os.path.exists(download_path):
+            os.makedirs(download_path)
+        if not attachments:
+            return []
+
+        # Attachments sharing a name are prefixed with their id so they don't overwrite each other
+        names = [attachment["name"].replace(" ", "_") for attachment in attachments]
+        file_names = [name if names.count(name) == 1 else "{}_{}".format(attachment["id"], name)
+                      for name, attachment in zip(names, attachments)]
+
+        pool = ThreadPool(min(self.workers, len(attachments)))
+        try:
+            results = pool.map(lambda args: self._download(args[0], download_path, args[1]),
+                               list(zip(attachments, file_names)))
+        finally:
+            pool.close()
+            pool.join()
+        return results
@@ -2,11 +2,12 @@ import getpass
 import os
 import re
 import shutil
+import sys
 import time
 import logging
 import subprocess
 
-from api import DDShotgun, DDShotgunAPIError
+from .api import DDShotgun, DDShotgunAPIError
 
 # from dd.runtime import api
 #
@@ -22,6 +23,13 @@ SEQUENCE = os.getenv("DD_SEQ")
 SHOT = os.getenv("DD_SHOT")
 PATH_REGEX = re.compile(r"(\w+-\w+)\.([vV][0-9]{3})\.(\w+)")
 
+# Only Make a Shotgun version for Image File Types
+VERSION_EXTENSIONS = [".exr", ".jpg", ".jpeg", ".tif", ".tiff"]
+PUBLISHED_FILE_TYPES = {".exr": "Rendered Image", ".nk": "Nuke Script", ".psd": "Photoshop Image"}
+
+# Maximum number of requests per Shotgun batch() call
+BATCH_CHUNK_SIZE = 50
+
 logger = logging.getLogger("dd.{}".format(__name__))
 logging.basicConfig(level=logging.INFO)
 
@@ -111,10 +119,11 @@ class SgPublish(object):
             self.sg_api.set_sequence(SEQUENCE)
             self.sg_api.set_shot(SHOT)
 
-            # update class variables
-            self.show = self.sg_api.get_project()
-            self.sequence = self.sg_api.get_sequence()
-            self.shot = self.sg_api.get_shot()
+            # update class variables, the context is resolved in a single request
+            context = self.sg_api.get_context()
+            self.show = context["Project"]
+            self.sequence = context["Sequence"]
+            self.shot = context["Shot"]
             self.user = self.sg_api.get_user()
 
             self.is_connected = True
@@ -131,12 +140,11 @@ class SgPublish(object):
         else:
             print("\nSuccessfully Validated {}, Publishing...".format(publish_name))
 
-    def sg_version(self, source_path, version_number, task, description):
-        # Only Make a Shotgun version if it's an Image File Type
-        valid_version_extensions = [".exr", ".jpg", ".jpeg", ".tif", ".tiff"]
-
-        if os.path.splitext(source_path)[1] in valid_version_extensions:
-            print("\nCreating Version for {}".format(source_path))
+    def version_data(self, source_path, version_number, task, description):
+        """
+        return: dict data of the Shotgun Version of 'source_path', None if it isn't an image
+        """
+        if os.path.splitext(source_path)[1] in VERSION_EXTENSIONS:
             version_name = PATH_REGEX.search(source_path).group(1)
             version_code = "{}.{}".format(version_name, str(version_number).zfill(3))
 
@@ -163,13 +171,47 @@ class SgPublish(object):
             'sg_status_list': 'rev',
             'sg_task': {"type": "Task", "id": task["id"]}
             }
+            return version_data
+
+    def sg_version(self, source_path, version_number, task, description):
+        version_data = self.version_data(source_path, version_number, task, description)
 
+        if version_data:
+            print("\nCreating Version for {}".format(source_path))
             sg_version = self.sg_api.create("Version", version_data)
 
             if sg_version:
                 print("\nCreated Version on Shotgun for {}, Publishing...".format(sg_version["code"]))
                 return sg_version
 
+    def published_file_data(self, source_path, version_number, task, description, version_entity,
+                            published_file_type):
+        """
+        return: dict data of the Shotgun PublishedFile of 'source_path', with the fields publish
+        sets in a follow-up update
+        """
+        name = PATH_REGEX.search(source_path).group(1)
+        data = {
+            "project": {"type": "Project", "id": self.show['id']},
+            "entity": {"type": "Shot", "id": self.shot['id']},
+            "created_by": {"type": "HumanUser", "id": self.user["id"]},
+            "code": os.path.basename(source_path),
+            "name": name,
+            "path": {"local_path": source_path},
+            "version_number": int(version_number),
+            "description": description,
+            "published_file_type": published_file_type,
+            "version": version_entity,
+            "task": {"type": "Task", "id": task["id"]},
+            "sg_path_to_source": source_path,
+            "sg_status_list": "ip",
+            "sg_output": "main",
+        }
+        return data
+
+    def batch(self, chunk_size=BATCH_CHUNK_SIZE):
+        return PublishBatcher(self, chunk_size=chunk_size)
+
     def publish(self, source_path, version_number, task, description=""):
 
         self.sg_api.set_task(task)
@@ -188,13 +230,7 @@ class SgPublish(object):
         # tk = renamer.tk
         # context = tk.context_from_path(source_path)
 
-        published_file_type = None
-        if os.path.splitext(source_path)[1] == ".exr":
-            published_file_type = "Rendered Image"
-        elif os.path.splitext(source_path)[1] == ".nk":
-            published_file_type = "Nuke Script"
-        elif os.path.splitext(source_path)[1] == ".psd":
-            published_file_type = "Photoshop Image"
+        published_file_type = PUBLISHED_FILE_TYPES.get(os.path.splitext(source_path)[1])
 
         try:
             version_entity = {"type": "Version", "id": sg_version_entity['id']}
@@ -224,3 +260,213 @@ class SgPublish(object):
             print("\nCreated Published File on Shotgun for {}".format(published_file["code"]))
             self.sg_api.update("PublishedFile", _id, data)
             return published_file
+
+
+class PublishBatcher(object):
+    """
+    Collect the Version and PublishedFile creates of a publish session and submit them through
+    Shotgun batch() in chunks of 'chunk_size', instead of 3 serialized requests per file.
+
+    Versions are created first, then the PublishedFiles linked to them, with sg_path_to_source,
+    sg_status_list and sg_output set in the create instead of a follow-up update. A failed chunk is
+    retried one request at a time to report the error of each item, the other items are still published.
+
+    The PublishedFiles carry what sgtk.util.register_publish sets: created_by, the path_cache and
+    path_cache_storage of the LocalStorage holding the file, and missing PublishedFileTypes are created.
+    No thumbnail is uploaded, publish always called register_publish with an empty thumbnail_path,
+    which skips both the PublishedFile and the task thumbnail.
+
+    USAGE:
+
+    batcher = sg_pub.batch()
+    batcher.validate([os.path.basename(path) for path in paths])
+    for path in paths:
+        batcher.add(path, 3, "dmp", "DMP update")
+    for item in batcher.submit():
+        if item["error"]:
+            print(item["source_path"], item["error"])
+    """
+
+    def __init__(self, sg_publish, chunk_size=BATCH_CHUNK_SIZE):
+        assert chunk_size > 0
+        self.sg_publish = sg_publish
+        self.sg_api = sg_publish.sg_api
+        self.chunk_size = chunk_size
+        self.items = []
+        self.requests = 0
+
+    def validate(self, publish_names):
+        """
+        Check that none of 'publish_names' is published yet, in a single request
+
+        return: list conflicting publish names
+        """
+        shot = self.sg_publish.shot
+        data = [["entity", "is", {"type": "Shot", "id": shot['id']}], ["code", "in", list(publish_names)]]
+        self.requests += 1
+        conflicts = [published_file["code"] for published_file in self.sg_api.find("PublishedFile", data, ["code"])]
+        for conflict in conflicts:
+            logger.error("Found Conflicting Publish for '{}', Please Version up!".format(conflict))
+        return conflicts
+
+    def add(self, source_path, version_number, task, description=""):
+        """
+        Queue the publish of 'source_path', nothing is sent to Shotgun until submit
+
+        return: dict publish item, its 'version', 'published_file' and 'error' are set by submit
+        """
+        item = {
+            "source_path": source_path,
+            "version_number": version_number,
+            "task": task,
+            "description": description,
+            "version": None,
+            "published_file": None,
+            "error": None,
+        }
+        self.items.append(item)
+        return item
+
+    def _submit_requests(self, requests, items, key):
+        """
+        Run 'requests' in batches of 'chunk_size', the result of each request is stored in items[i][key]
+        """
+        for start in range(0, len(requests), self.chunk_size):
+            chunk_requests = requests[start:start + self.chunk_size]
+            chunk_items = items[start:start + self.chunk_size]
+            try:
+                self.requests += 1
+                results = self.sg_api.batch(chunk_requests)
+            except Exception as e:
+                logger.warning("Batch of {} request(s) failed, retrying one at a time: {}".format(len(chunk_requests), e))
+                results = []
+                for request, item in zip(chunk_requests, chunk_items):
+                    try:
+                        self.requests += 1
+                        results.extend(self.sg_api.batch([request]))
+                    except Exception as e:
+                        item["error"] = str(e)
+                        results.append(None)
+
+            for item, result in zip(chunk_items, results):
+                item[key] = result
+
+    def _published_file_types(self, items):
+        """
+        return: dict PublishedFileType entity of each published file type code of 'items', missing types are created
+        """
+        names = set(PUBLISHED_FILE_TYPES.get(os.path.splitext(item["source_path"])[1]) for item in items)
+        names.discard(None)
+        if not names:
+            return {}
+        self.requests += 1
+        types = self.sg_api.find("PublishedFileType", [["code", "in", sorted(names)]], ["code"])
+        types = dict((published_file_type["code"], {"type": "PublishedFileType", "id": published_file_type["id"]})
+                     for published_file_type in types)
+
+        missing = sorted(names - set(types))
+        if missing:
+            requests = [{"request_type": "create", "entity_type": "PublishedFileType", "data": {"code": code}}
+                        for code in missing]
+            try:
+                self.requests += 1
+                created = self.sg_api.batch(requests)
+            except Exception as e:
+                logger.warning("Couldn't create PublishedFileType(s) {}: {}".format(", ".join(missing), e))
+                created = []
+            for published_file_type in created:
+                types[published_file_type["code"]] = {"type": "PublishedFileType", "id": published_file_type["id"]}
+        return types
+
+    def _local_storages(self):
+        """
+        return: list (root path, LocalStorage entity) of this platform, longest root first
+        """
+        field = {"darwin": "mac_path", "win32": "windows_path"}.get(sys.platform, "linux_path")
+        self.requests += 1
+        storages = []
+        for storage in self.sg_api.find("LocalStorage", [], ["code", field]):
+            if storage.get(field):
+                root = os.path.normpath(storage[field])
+                storages.append((root, {"type": "LocalStorage", "id": storage["id"]}))
+        return sorted(storages, key=lambda storage: len(storage[0]), reverse=True)
+
+    @staticmethod
+    def path_cache(source_path, storages):
+        """
+        return: tuple (path_cache, path_cache_storage) of 'source_path' like register_publish computes them,
+        (None, None) if it isn't under any of 'storages'
+        """
+        path = os.path.normpath(source_path)
+        for root, storage in storages:
+            if path.startswith(root.rstrip(os.sep) + os.sep):
+                return path[len(root.rstrip(os.sep)) + 1:].replace(os.sep, "/"), storage
+        return None, None
+
+    def submit(self):
+        """
+        Create the Versions and PublishedFiles of every queued item
+
+        return: list publish items, items which failed have their 'error' set
+        """
+        items, self.items = self.items, []
+        published_file_types = self._published_file_types(items) if items else {}
+        storages = self._local_storages() if items else []
+
+        tasks = {}
+        for item in items:
+            try:
+                if item["task"] not in tasks:
+                    self.sg_api.set_task(item["task"])
+                    tasks[item["task"]] = self.sg_api.get_task()
+                item["sg_task"] = tasks[item["task"]]
+            except Exception as e:
+                item["error"] = str(e)
+
+        # Versions first, PublishedFiles link to them
+        version_items = []
+        version_requests = []
+        for item in items:
+            if item["error"]:
+                continue
+            try:
+                data = self.sg_publish.version_data(
+                    item["source_path"], item["version_number"], item["sg_task"], item["description"])
+            except Exception as e:
+                item["error"] = str(e)
+                continue
+            if data:
+                version_items.append(item)
+                version_requests.append({"request_type": "create", "entity_type": "Version", "data": data})
+        self._submit_requests(version_requests, version_items, "version")
+
+        published_file_items = []
+        published_file_requests = []
+        for item in items:
+            if item["error"]:
+                continue
+            version = item["version"]
+            version_entity = {"type": "Version", "id": version["id"]} if version else None
+            published_file_type = published_file_types.get(
+                PUBLISHED_FILE_TYPES.get(os.path.splitext(item["source_path"])[1]))
+            try:
+                data = self.sg_publish.published_file_data(
+                    item["source_path"], item["version_number"], item["sg_task"], item["description"],
+                    version_entity, published_file_type)
+            except Exception as e:
+                item["error"] = str(e)
+                continue
+            path_cache, path_cache_storage = self.path_cache(item["source_path"], storages)
+            if path_cache is not None:
+                data["path_cache"] = path_cache
+                data["path_cache_storage"] = path_cache_storage
+            published_file_items.append(item)
+            published_file_requests.append({"request_type": "create", "entity_type": "PublishedFile", "data": data})
+        self._submit_requests(published_file_requests, published_file_items, "published_file")
+
+        failed = [item for item in items if item["error"]]
+        logger.info("Published {} file(s) in {} request(s), {} failed".format(
+            len(items) - len(failed), self.requests, len(failed)))
+        for item in failed:
+            logger.error("Couldn't publish {}: {}".format(item["source_path"], item["error"]))
+        return items
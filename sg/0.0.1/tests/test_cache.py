@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+# Import Built Modules
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+# import sg
+from sg import cache as cache_module
+from sg.cache import AttachmentCache
+
+
+def _attachment(attachment_id, updated_at="2024-05-01"):
+    return {"type": "Attachment", "id": attachment_id, "name": "notes {}.pdf".format(attachment_id),
+            "updated_at": updated_at}
+
+
+class AttachmentCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = AttachmentCache(os.path.join(self.root, "cache"), max_size=25)
+        self.downloads = []
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _download(self, size=10, fail=False):
+        def download(directory):
+            self.downloads.append(directory)
+            path = os.path.join(directory, "notes.pdf")
+            with open(path, "ab") as output:
+                output.write(b"x" * size)
+            if fail:
+                raise IOError("connection reset")
+            return path
+        return download
+
+    def test_key_changes_with_the_version(self):
+        self.assertEqual(AttachmentCache.key(_attachment(1)), "Attachment-1-2024-05-01")
+        self.assertNotEqual(AttachmentCache.key(_attachment(1)), AttachmentCache.key(_attachment(1, "2024-06-01")))
+        self.assertEqual(AttachmentCache.key({"type": "Version", "id": 2}, version="thumb/1"), "Version-2-thumb_1")
+
+    def test_put_then_get(self):
+        self.assertIsNone(self.cache.get(_attachment(1)))
+        path = self.cache.put(_attachment(1), self._download())
+        self.assertEqual(self.cache.get(_attachment(1)), path)
+        self.assertEqual(self.cache.put(_attachment(1), self._download()), path)
+        self.assertEqual(len(self.downloads), 1)
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "evictions": 0})
+
+    def test_failed_downloads_are_resumed_in_the_same_directory(self):
+        with self.assertRaises(IOError):
+            self.cache.put(_attachment(1), self._download(fail=True))
+        path = self.cache.put(_attachment(1), self._download())
+        self.assertEqual(self.downloads[0], self.downloads[1])
+        self.assertEqual(os.path.getsize(path), 20)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        paths = [self.cache.put(_attachment(index), self._download()) for index in (1, 2)]
+        now = time.time()
+        os.utime(os.path.dirname(paths[0]), (now - 60, now - 60))
+        self.cache.put(_attachment(3), self._download())
+
+        self.assertIsNone(self.cache.get(_attachment(1)))
+        self.assertIsNotNone(self.cache.get(_attachment(2)))
+        self.assertIsNotNone(self.cache.get(_attachment(3)))
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_abandoned_staging_directories_are_removed(self):
+        with self.assertRaises(IOError):
+            self.cache.put(_attachment(1), self._download(fail=True))
+        staging_path = self.downloads[0]
+        old = time.time() - cache_module.STAGING_TTL - 1
+        os.utime(staging_path, (old, old))
+        self.cache.evict()
+        self.assertFalse(os.path.exists(staging_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
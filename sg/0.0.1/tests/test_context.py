@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+# Import Built Modules
+import unittest
+
+# import sg
+from sg.api import DDShotgun
+from sg.context import ContextCache
+
+
+class ContextCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ContextCache()
+        self.shot = {"type": "Shot", "id": 1, "code": "0780"}
+        self.cache.set("Project", ("BEETLE",), {"type": "Project", "id": 1})
+        self.cache.set("Shot", ("BEETLE", "PIR", "0780"), self.shot)
+        self.cache.set("Task", ("BEETLE", "PIR", "0780", "dmp"), {"type": "Task", "id": 1})
+
+    def test_hit_and_miss(self):
+        self.assertEqual(self.cache.get("Shot", ("BEETLE", "PIR", "0780")), self.shot)
+        self.assertIsNone(self.cache.get("Shot", ("BEETLE", "PIR", "0790")))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_fields_are_part_of_the_key(self):
+        self.assertIsNone(self.cache.get("Shot", ("BEETLE", "PIR", "0780"), ["sg_status_list"]))
+        self.cache.set("Shot", ("BEETLE", "PIR", "0780"), self.shot, ["sg_status_list", "code"])
+        self.assertEqual(self.cache.get("Shot", ("BEETLE", "PIR", "0780"), ["code", "sg_status_list"]), self.shot)
+
+    def test_entities_are_copied(self):
+        self.shot["code"] = "0790"
+        entity = self.cache.get("Shot", ("BEETLE", "PIR", "0780"))
+        self.assertEqual(entity["code"], "0780")
+        entity["code"] = "0800"
+        self.assertEqual(self.cache.get("Shot", ("BEETLE", "PIR", "0780"))["code"], "0780")
+
+    def test_invalidate_drops_the_levels_below(self):
+        self.cache.invalidate("Shot")
+        self.assertIsNone(self.cache.get("Shot", ("BEETLE", "PIR", "0780")))
+        self.assertIsNone(self.cache.get("Task", ("BEETLE", "PIR", "0780", "dmp")))
+        self.assertIsNotNone(self.cache.get("Project", ("BEETLE",)))
+        self.assertEqual(self.cache.stats()["invalidations"], 2)
+
+
+class FakeShotgun(object):
+    """
+    Stand-in for shotgun_api3.Shotgun recording find_one requests, every requested field gets a value
+    """
+    base_url = "http://shotgun.d2-india.com"
+
+    def __init__(self):
+        self.requests = []
+
+    def find_one(self, entity_type, filters, fields):
+        self.requests.append((entity_type, filters, fields))
+        result = {"type": entity_type, "id": 40}
+        for index, field in enumerate(fields):
+            result[field] = index if field.endswith("id") else "{}-value".format(field)
+        return result
+
+
+class DDShotgunContextTest(unittest.TestCase):
+
+    def setUp(self):
+        self.shotgun = FakeShotgun()
+        self.sg = DDShotgun("user", "password", shotgun=self.shotgun)
+        self.sg.set_show("BEETLE")
+        self.sg.set_sequence("PIR")
+        self.sg.set_shot("0780")
+        self.sg.set_task("dmp")
+
+    def test_context_is_resolved_in_one_request(self):
+        context = self.sg.get_context(fields={"Shot": ["sg_cut_in"]})
+        entity_type, filters, fields = self.shotgun.requests[0]
+
+        self.assertEqual(len(self.shotgun.requests), 1)
+        self.assertEqual(entity_type, "Task")
+        self.assertIn(["entity.Shot.sg_sequence.Sequence.code", "is", "PIR"], filters)
+        self.assertIn("entity.Shot.sg_cut_in", fields)
+        self.assertNotIn("entity.Shot.sg_sequence.Sequence.sg_shots", fields)
+
+        self.assertEqual(sorted(context), ["Project", "Sequence", "Shot", "Task"])
+        self.assertEqual(context["Shot"]["type"], "Shot")
+        self.assertEqual(context["Shot"]["sg_cut_in"], "entity.Shot.sg_cut_in-value")
+        self.assertEqual(context["Task"]["content"], "content-value")
+
+    def test_resolved_entities_seed_the_cache(self):
+        context = self.sg.get_context()
+        self.assertEqual(self.sg.get_shot(), context["Shot"])
+        self.assertEqual(self.sg.get_project(), context["Project"])
+        self.assertEqual(len(self.shotgun.requests), 1)
+
+        # Sequences resolved through a Task lack their multi-entity 'sg_shots'
+        self.sg.get_sequence()
+        self.assertEqual(len(self.shotgun.requests), 2)
+
+    def test_only_the_deepest_set_entity_is_queried(self):
+        self.sg.set_task("")
+        self.sg.set_shot("")
+        context = self.sg.get_context()
+        self.assertEqual(self.shotgun.requests[0][0], "Sequence")
+        self.assertEqual(sorted(context), ["Project", "Sequence"])
+
+
+if __name__ == "__main__":
+    unittest.main()
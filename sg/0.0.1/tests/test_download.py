@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+# Import Built Modules
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+# import sg
+from sg.cache import AttachmentCache
+from sg.download import detect_extension, CookieStrippingRedirectHandler, AttachmentDownloader
+
+try:
+    from urllib.request import Request
+except ImportError:
+    from urllib2 import Request
+
+
+class DetectExtensionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _file(self, content):
+        path = os.path.join(self.root, "attachment")
+        with open(path, "wb") as output:
+            output.write(content)
+        return path
+
+    def test_known_signatures(self):
+        for content, extension in ((b"\x89PNG\r\n\x1a\n" + b"\x00" * 8, "png"),
+                                   (b"\xff\xd8\xff\xe0", "jpg"),
+                                   (b"v/1\x01\x02\x00\x00\x00", "exr"),
+                                   (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "webp"),
+                                   (b"\x00\x00\x00\x14ftypqt  ", "mov"),
+                                   (b"\x00\x00\x00\x18ftypmp42", "mp4"),
+                                   (b"%PDF-1.7", "pdf")):
+            self.assertEqual(detect_extension(self._file(content)), extension)
+
+    def test_unknown_or_empty_file(self):
+        self.assertIsNone(detect_extension(self._file(b"plain text")))
+        self.assertIsNone(detect_extension(self._file(b"")))
+
+
+class CookieStrippingRedirectHandlerTest(unittest.TestCase):
+
+    def test_cookie_is_only_sent_to_the_same_host(self):
+        handler = CookieStrippingRedirectHandler()
+        request = Request("http://shotgun.d2-india.com/file_serve/attachment/1",
+                          headers={"Cookie": "_session_id=1", "Range": "bytes=10-"})
+
+        redirected = handler.redirect_request(request, None, 302, "Found", {}, "https://storage.example.com/1?sig=x")
+        self.assertNotIn("Cookie", redirected.headers)
+        self.assertEqual(redirected.headers["Range"], "bytes=10-")
+
+        redirected = handler.redirect_request(request, None, 302, "Found", {}, "http://shotgun.d2-india.com/files/1")
+        self.assertEqual(redirected.headers["Cookie"], "_session_id=1")
+
+
+class FakeResponse(io.BytesIO):
+
+    def __init__(self, content, code=200, headers=None):
+        io.BytesIO.__init__(self, content)
+        self.code = code
+        self.headers = headers or {}
+
+    def getcode(self):
+        return self.code
+
+    def info(self):
+        return self.headers
+
+
+class FakeOpener(object):
+    """
+    Serve 'content', honouring Range requests from 'served_from' instead of the requested byte if it is set
+    """
+
+    def __init__(self, content, served_from=None):
+        self.content = content
+        self.served_from = served_from
+        self.ranges = []
+
+    def open(self, request):
+        requested = request.get_header("Range")
+        self.ranges.append(requested)
+        if not requested:
+            return FakeResponse(self.content)
+        start = int(requested[len("bytes="):-1])
+        if self.served_from is not None:
+            start = self.served_from
+        headers = {"Content-Range": "bytes {}-{}/{}".format(start, len(self.content) - 1, len(self.content))}
+        return FakeResponse(self.content[start:], 206, headers)
+
+
+class FakeShotgun(object):
+    base_url = "https://shotgun.example.com"
+    config = None
+
+
+class DownloadOneTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.content = b"%PDF-1.7 notes of the review"
+        self.attachment = {"type": "Attachment", "id": 42, "name": "notes", "updated_at": "2024",
+                           "url": "https://storage.example.com/42"}
+        self.part_path = os.path.join(self.root, "notes.{}.part".format(AttachmentCache.key(self.attachment)))
+        self.downloader = AttachmentDownloader(FakeShotgun(), workers=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _download(self, opener, part=b""):
+        if part:
+            with open(self.part_path, "wb") as output:
+                output.write(part)
+        self.downloader._opener = opener
+        path = self.downloader.download_one(self.attachment, self.root)
+        with open(path, "rb") as source:
+            return path, source.read()
+
+    def test_part_files_are_keyed_by_attachment(self):
+        other = dict(self.attachment, id=43)
+        self.assertNotEqual(self.part_path, os.path.join(self.root, "notes.{}.part".format(AttachmentCache.key(other))))
+
+        path, content = self._download(FakeOpener(self.content))
+        self.assertEqual((path, content), (os.path.join(self.root, "notes.pdf"), self.content))
+        self.assertFalse(os.path.exists(self.part_path))
+
+    def test_download_is_resumed_from_the_part_file(self):
+        opener = FakeOpener(self.content)
+        self.assertEqual(self._download(opener, self.content[:10])[1], self.content)
+        self.assertEqual(opener.ranges, ["bytes=10-"])
+
+    def test_download_restarts_when_resumed_from_another_byte(self):
+        opener = FakeOpener(self.content, served_from=4)
+        self.assertEqual(self._download(opener, self.content[:10])[1], self.content)
+        self.assertEqual(opener.ranges, ["bytes=10-", None])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+# Import Built Modules
+import os
+import shutil
+import tempfile
+import unittest
+
+# import sg
+from sg.publish import SgPublish, PublishBatcher
+
+
+class FakeShotgun(object):
+    """
+    Stand-in for DDShotgun recording the batch() requests, entities get increasing ids
+    """
+
+    def __init__(self, storage_root, fail_codes=()):
+        self.storage_root = storage_root
+        self.fail_codes = set(fail_codes)
+        self.batches = []
+        self.task = None
+        self._id = 0
+
+    def set_task(self, task):
+        self.task = task
+
+    def get_task(self):
+        if self.task == "missing":
+            raise ValueError("No Task 'missing'")
+        return {"type": "Task", "id": 7}
+
+    def find(self, entity, data, fields=None):
+        if entity == "PublishedFileType":
+            return [{"type": "PublishedFileType", "id": 1, "code": "Rendered Image"}]
+        if entity == "LocalStorage":
+            return [{"type": "LocalStorage", "id": 2, "code": "primary", "linux_path": self.storage_root,
+                     "mac_path": self.storage_root, "windows_path": self.storage_root}]
+        return []
+
+    def batch(self, requests):
+        self.batches.append(requests)
+        results = []
+        for request in requests:
+            if request["data"].get("code") in self.fail_codes:
+                raise RuntimeError("create failed for {}".format(request["data"]["code"]))
+            self._id += 1
+            result = dict(request["data"], type=request["entity_type"], id=self._id)
+            results.append(result)
+        return results
+
+
+class PublishBatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.frames = os.path.join(self.root, "BEETLE", "PIR_0780", "images")
+        os.makedirs(self.frames)
+        self.exrs = []
+        for frame in (1001, 1002):
+            path = os.path.join(self.frames, "PIR-dmp.v003.{}.exr".format(frame))
+            open(path, "w").close()
+            self.exrs.append(path)
+        self.nk = os.path.join(self.root, "BEETLE", "PIR_0780", "PIR-dmp.v003.nk")
+
+        self.sg_api = FakeShotgun(self.root)
+        self.sg_pub = SgPublish()
+        self.sg_pub.sg_api = self.sg_api
+        self.sg_pub.show = {"type": "Project", "id": 1}
+        self.sg_pub.shot = {"type": "Shot", "id": 2}
+        self.sg_pub.user = {"type": "HumanUser", "id": 3}
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_versions_are_created_before_their_published_files(self):
+        batcher = PublishBatcher(self.sg_pub)
+        exr = batcher.add(self.exrs[0], 3, "dmp", "DMP update")
+        nk = batcher.add(self.nk, 3, "dmp")
+        batcher.submit()
+
+        versions, nk_type, published_files = None, None, None
+        for requests in self.sg_api.batches:
+            entity_type = requests[0]["entity_type"]
+            if entity_type == "Version":
+                versions = requests
+            elif entity_type == "PublishedFileType":
+                nk_type = requests
+            else:
+                published_files = requests
+
+        self.assertEqual(len(versions), 1)
+        self.assertEqual(versions[0]["data"]["frame_range"], "1001-1002")
+        self.assertEqual([request["data"]["code"] for request in nk_type], ["Nuke Script"])
+        self.assertEqual(len(published_files), 2)
+        self.assertEqual(exr["published_file"]["version"], {"type": "Version", "id": exr["version"]["id"]})
+        self.assertIsNone(nk["version"])
+        self.assertEqual(nk["published_file"]["published_file_type"]["type"], "PublishedFileType")
+
+    def test_published_files_carry_the_register_publish_fields(self):
+        batcher = PublishBatcher(self.sg_pub)
+        item = batcher.add(self.exrs[0], 3, "dmp")
+        batcher.submit()
+
+        published_file = item["published_file"]
+        self.assertEqual(published_file["created_by"], {"type": "HumanUser", "id": 3})
+        self.assertEqual(published_file["path_cache"], "BEETLE/PIR_0780/images/PIR-dmp.v003.1001.exr")
+        self.assertEqual(published_file["path_cache_storage"], {"type": "LocalStorage", "id": 2})
+        self.assertEqual(published_file["sg_status_list"], "ip")
+
+    def test_path_cache_outside_of_storages(self):
+        storages = [("/dd/shows", {"type": "LocalStorage", "id": 2})]
+        self.assertEqual(PublishBatcher.path_cache("/dd/showsX/file.exr", storages), (None, None))
+        self.assertEqual(PublishBatcher.path_cache("/dd/shows/BEETLE/file.exr", storages)[0], "BEETLE/file.exr")
+
+    def test_item_errors_do_not_stop_the_batch(self):
+        batcher = PublishBatcher(self.sg_pub)
+        bad_name = batcher.add(os.path.join(self.root, "untitled.exr"), 3, "dmp")
+        bad_task = batcher.add(self.exrs[1], 3, "missing")
+        good = batcher.add(self.nk, 3, "dmp")
+        batcher.submit()
+
+        self.assertTrue(bad_name["error"])
+        self.assertIn("missing", bad_task["error"])
+        self.assertIsNone(bad_name["published_file"])
+        self.assertIsNone(good["error"])
+        self.assertIsNotNone(good["published_file"])
+
+    def test_failed_chunk_is_retried_one_request_at_a_time(self):
+        self.sg_api.fail_codes = {"PIR-dmp.v003.nk"}
+        nk = os.path.join(self.root, "OTHER-dmp.v003.nk")
+        batcher = PublishBatcher(self.sg_pub, chunk_size=10)
+        failed = batcher.add(self.nk, 3, "dmp")
+        published = batcher.add(nk, 3, "dmp")
+        batcher.submit()
+
+        self.assertIn("create failed", failed["error"])
+        self.assertIsNone(failed["published_file"])
+        self.assertIsNone(published["error"])
+        self.assertEqual(published["published_file"]["code"], "OTHER-dmp.v003.nk")
+
+    def test_validate_returns_conflicts(self):
+        self.sg_api.find = lambda entity, data, fields=None: [{"code": "PIR-dmp.v003.nk"}]
+        batcher = PublishBatcher(self.sg_pub)
+        self.assertEqual(batcher.validate(["PIR-dmp.v003.nk"]), ["PIR-dmp.v003.nk"])
+
+
+if __name__ == "__main__":
+    unittest.main()